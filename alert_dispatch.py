@@ -0,0 +1,371 @@
+"""
+Non-blocking alert delivery to a bell, a webhook and a siren on a GPIO pin.
+
+    dispatcher = AlertDispatcher([BellChannel(), WebhookChannel("http://127.0.0.1:8099/alert")]).start()
+    dispatcher.dispatch('drone', "WARNING: DRONE", track_id=3, conf=0.82)   # never blocks
+
+    python3 alert_dispatch.py serve --port 8099          # stand-in webhook receiver
+    python3 alert_dispatch.py test --count 200 --targets 4 --delay 0.05
+
+dispatch() only updates a few dicts and puts the alert on each channel's
+bounded queue; every channel has its own worker thread(s), so a webhook
+stuck in HTTP timeouts never delays the bell or the siren. Per channel:
+  - bursts for the same target (camera source + track id) are coalesced:
+    an alert that is still queued absorbs later ones (their count is sent
+    along), and for coalesce_s after its delivery starts the same target is
+    not alerted again;
+  - a token bucket limits alerts per minute;
+  - webhooks keep one persistent HTTP connection per worker.
+Alerts that do not fit in the queue are dropped and counted, never waited for.
+"""
+import argparse
+import http.client
+import json
+import platform
+import queue
+import threading
+import time
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from evaluation import latency_summary
+from metrics import METRICS
+
+HISTORY = 10000  # delivery latencies kept per channel for the run summary
+
+
+class RateLimit:
+    """Token bucket: `per_minute` alerts on average, up to `burst` at once. per_minute=None is unlimited."""
+    def __init__(self, per_minute=None, burst=1):
+        self.per_minute = per_minute
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+
+    def take(self, now):
+        if self.per_minute is None:
+            return True
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.per_minute / 60.0)
+        self._last = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+class Channel:
+    """One alert output. send(alert) runs on a dispatcher worker and may block or raise."""
+    def __init__(self, name, rate_per_min=None, burst=1, coalesce_s=10.0):
+        self.name = name
+        self.limit = RateLimit(rate_per_min, burst)
+        self.coalesce_s = coalesce_s
+
+    def send(self, alert):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class BellChannel(Channel):
+    """Console bell (winsound beep on Windows), what the alert systems used to start a thread for."""
+    def __init__(self, name='bell', rate_per_min=None, burst=1, coalesce_s=2.0):
+        super().__init__(name, rate_per_min, burst, coalesce_s)
+
+    def send(self, alert):
+        if platform.system() == "Windows":
+            import winsound
+            winsound.Beep(1000, 500)
+        else:
+            print('\a', end='', flush=True)
+
+
+class WebhookChannel(Channel):
+    """
+    POSTs each alert as JSON to `url`. Every worker keeps its own keep-alive
+    connection and reconnects once when the server closed it in between.
+    """
+    def __init__(self, url, name='webhook', timeout=2.0, headers=None, rate_per_min=30, burst=5, coalesce_s=10.0):
+        super().__init__(name, rate_per_min, burst, coalesce_s)
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.headers = dict({'Content-Type': 'application/json', 'Connection': 'keep-alive'}, **(headers or {}))
+        self._conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+        self.connections = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._conn_class(self.host, self.port, timeout=self.timeout)
+            with self._lock:
+                self._all.append(conn)
+                self.connections += 1
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def send(self, alert):
+        body = json.dumps(alert).encode()
+        for attempt in range(2):
+            reused = getattr(self._local, 'conn', None) is not None
+            conn = self._connection()
+            try:
+                conn.request("POST", self.path, body, self.headers)
+                response = conn.getresponse()
+                response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._drop()
+                if reused and attempt == 0:
+                    continue  # keep-alive connection went stale, retry once on a fresh one
+                raise
+            except (OSError, http.client.HTTPException):
+                self._drop()
+                raise
+            if response.will_close:
+                self._drop()
+            if response.status >= 400:
+                raise OSError(f"HTTP {response.status} from {self.url}")
+            return
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+
+class GpioChannel(Channel):
+    """Switches a siren / relay on `pin` for on_seconds per alert (gpiozero, switched off in the background)."""
+    def __init__(self, pin, name='siren', on_seconds=3.0, rate_per_min=None, burst=1, coalesce_s=30.0):
+        super().__init__(name, rate_per_min, burst, coalesce_s)
+        from gpiozero import OutputDevice
+        self.on_seconds = on_seconds
+        self.device = OutputDevice(pin)
+
+    def send(self, alert):
+        self.device.blink(on_time=self.on_seconds, off_time=0, n=1, background=True)
+
+    def close(self):
+        self.device.close()
+
+
+class AlertDispatcher:
+    """Per channel a bounded queue plus `workers` delivery threads (see module docstring)."""
+    def __init__(self, channels, workers=1, max_queue=64):
+        self.channels = list(channels)
+        self.workers = workers
+        self._queues = {c.name: queue.Queue(maxsize=max_queue) for c in self.channels}
+        self._lock = threading.Lock()
+        self._pending = {}  # (channel name, source, track id) -> queued item
+        self._last = {}     # (channel name, source, track id) -> monotonic time its delivery started
+        self._threads = []
+        self._running = False
+        self.counters = {c.name: {'sent': 0, 'failed': 0, 'dropped': 0, 'rate_limited': 0, 'coalesced': 0}
+                         for c in self.channels}
+        self.latencies = {c.name: deque(maxlen=HISTORY) for c in self.channels}
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._work, args=(self._queues[c.name],), daemon=True)
+                         for c in self.channels for _ in range(self.workers)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def dispatch(self, kind, text, track_id=None, **details):
+        """Queue an alert on every channel. Never blocks; returns True if any channel took it as a new alert."""
+        now = time.monotonic()
+        alert = dict(details, kind=kind, text=text, track_id=track_id, ts=time.time())
+        accepted = False
+        with self._lock:
+            if len(self._last) > 1024:
+                horizon = now - max(c.coalesce_s for c in self.channels)
+                self._last = {k: t for k, t in self._last.items() if t >= horizon}
+            for channel in self.channels:
+                key = (channel.name, details.get('source'), track_id)
+                counters = self.counters[channel.name]
+                item = self._pending.get(key)
+                if item is not None:
+                    item['alert'] = alert  # still queued: send the newest one, with the burst count
+                    item['count'] += 1
+                    counters['coalesced'] += 1
+                    continue
+                if now - self._last.get(key, -1e9) < channel.coalesce_s:
+                    counters['coalesced'] += 1
+                    continue
+                if not channel.limit.take(now):
+                    counters['rate_limited'] += 1
+                    continue
+                item = {'channel': channel, 'key': key, 'alert': alert, 'count': 1, 'queued': now}
+                try:
+                    self._queues[channel.name].put_nowait(item)
+                except queue.Full:
+                    counters['dropped'] += 1
+                    METRICS.inc('alerts_dropped')
+                    continue
+                self._pending[key] = item
+                accepted = True
+        return accepted
+
+    def _work(self, items):
+        while self._running or not items.empty():
+            try:
+                item = items.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._pending.pop(item['key'], None)  # alerts from now on count against coalesce_s
+                self._last[item['key']] = time.monotonic()
+                payload = dict(item['alert'], count=item['count'])
+            channel = item['channel']
+            try:
+                channel.send(payload)
+                ok = True
+            except Exception as e:
+                ok = False
+                print(f"[WARN] Alert to {channel.name} failed: {e}")
+            latency = time.monotonic() - item['queued']
+            with self._lock:
+                self.counters[channel.name]['sent' if ok else 'failed'] += 1
+                if ok:
+                    self.latencies[channel.name].append(latency)
+            if ok:
+                METRICS.observe(f"alert_{channel.name}", latency)
+
+    def stop(self, timeout=3.0):
+        """Delivers what is queued (up to `timeout`), then closes the channels."""
+        self._running = False
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        for channel in self.channels:
+            channel.close()
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(self.counters[name], **latency_summary(self.latencies[name]))
+                    for name in self.counters}
+
+
+def print_stats(stats):
+    for name, s in stats.items():
+        print(f"[STATS] Alerts to {name}: {s['sent']} sent, {s['failed']} failed, {s['dropped']} dropped, "
+              f"{s['rate_limited']} rate-limited, {s['coalesced']} coalesced; "
+              f"delivery p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms")
+
+
+# --- LOCAL STAND-IN RECEIVER ---
+class StandInReceiver:
+    """
+    Local webhook endpoint for trying the dispatcher without the real one:
+    records every POSTed alert, counts TCP connections, and can answer slowly
+    (`delay`) or fail every Nth request (`fail_every`).
+    """
+    def __init__(self, port=8099, host="127.0.0.1", delay=0.0, fail_every=0, quiet=False):
+        self.port = port
+        self.host = host
+        self.delay = delay
+        self.fail_every = fail_every
+        self.quiet = quiet
+        self.received = []
+        self.connections = 0
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/alert"
+
+    def start(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                receiver.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if receiver.delay:
+                    time.sleep(receiver.delay)
+                receiver.received.append(json.loads(body or b"{}"))
+                fail = receiver.fail_every and len(receiver.received) % receiver.fail_every == 0
+                self.send_response(503 if fail else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                if not receiver.quiet:
+                    a = receiver.received[-1]
+                    print(f"[RECV] {a.get('kind')} track={a.get('track_id')} x{a.get('count')} {a.get('text')}")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run a stand-in webhook receiver")
+    serve.add_argument("--port", type=int, default=8099)
+    serve.add_argument("--delay", type=float, default=0.0, help="Seconds before answering each alert")
+    serve.add_argument("--fail-every", type=int, default=0, help="Answer every Nth alert with HTTP 503")
+    test = sub.add_parser("test", help="Fire alert bursts at a stand-in receiver and report delivery")
+    test.add_argument("--count", type=int, default=200, help="Alerts to dispatch")
+    test.add_argument("--targets", type=int, default=4, help="Distinct track ids they are spread over")
+    test.add_argument("--interval", type=float, default=0.005, help="Seconds between dispatches")
+    test.add_argument("--delay", type=float, default=0.05, help="Receiver response delay")
+    test.add_argument("--rate", type=float, default=30, help="Webhook alerts per minute")
+    test.add_argument("--workers", type=int, default=2, help="Delivery threads for the webhook")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        receiver = StandInReceiver(args.port, delay=args.delay, fail_every=args.fail_every).start()
+        print(f"[INFO] Stand-in alert receiver on {receiver.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            receiver.stop()
+        return
+
+    receiver = StandInReceiver(0, delay=args.delay, quiet=True).start()
+    webhook = WebhookChannel(receiver.url, rate_per_min=args.rate, burst=5, coalesce_s=1.0)
+    dispatcher = AlertDispatcher([webhook], workers=args.workers).start()
+    worst = 0.0
+    for i in range(args.count):
+        start = time.perf_counter()
+        dispatcher.dispatch('drone', "WARNING: DRONE", track_id=i % args.targets, conf=0.9)
+        worst = max(worst, time.perf_counter() - start)
+        time.sleep(args.interval)
+    dispatcher.stop(timeout=10.0)
+    receiver.stop()
+    print(f"[INFO] {args.count} dispatches, slowest dispatch() call {worst * 1e6:.0f}us")
+    print(f"[INFO] Receiver got {len(receiver.received)} alerts over {receiver.connections} connection(s)")
+    print_stats(dispatcher.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Offline analysis of recorded video as fast as the machine allows, with the
+same bird / aeroplane / screen logic main_pi.py applies live.
+
+    python3 analyze_video.py clips/day1.mp4 --out analysis/day1
+    python3 analyze_video.py clips/day1.mp4 --out analysis/day1 --workers 3 --segment-s 300 --format csv
+
+The file is cut into segments of --segment-s seconds that --workers processes
+(one model each) analyse in parallel. Inside a process a decode thread reads
+frames ahead into a bounded queue while the model runs on --batch frames per
+call. Every frame goes through screen-overlap check and tracker like a live
+inference result, so track IDs and the "aeroplane, not on a screen -> drone"
+rule match what the live loop would have shown. An alert interval is a stretch
+of video in which a drone was detected, with gaps no longer than the tracker
+keeps a lost target (1 s).
+
+Written to --out:
+  segments/NNNNN.jsonl|csv  detections of one segment, one record per target / screen per frame
+                            (kind: drone, bird, safe = target on a screen, screen)
+  segments/NNNNN.json       alert intervals and counters of that segment (marks it done)
+  detections.jsonl|csv      all segments in order
+  alerts.jsonl|csv          alert intervals, joined across segment boundaries
+  summary.json              frames, video time, wall time and FPS
+
+Interrupted runs resume: run the same command again and finished segments are
+skipped (--restart starts over).
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import main_pi
+from detector_backend import BACKENDS, cached_artifact, load_detector
+from event_store import CLASS_NAMES
+from multi_camera import detect_batch
+from postprocess import AEROPLANE, SCREEN_CLASSES, TARGET_CLASSES, process_detections
+from tracker import Tracker
+
+FIELDS = ('frame', 'time_s', 'kind', 'track_id', 'cls', 'label', 'conf', 'x1', 'y1', 'x2', 'y2', 'on_screen')
+ALERT_FIELDS = ('start_s', 'end_s', 'start_frame', 'end_frame', 'frames', 'max_conf', 'tracks')
+TRACK_ID_STRIDE = 1000000  # track IDs are segment * stride + ID, unique over the whole file
+READ_AHEAD = 4             # decoded batches queued ahead of the model
+
+_model = None  # per worker process, see _init_worker
+
+
+def probe(path):
+    """(frame count or 0 when the container does not say, fps) of a video file."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {path}")
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return max(frames, 0), fps if fps and fps > 0 else 30.0
+
+
+def plan_segments(frames, fps, segment_s):
+    """[(index, start frame, end frame or None = to the end of the file)]."""
+    if not frames or segment_s <= 0:
+        return [(0, 0, None)]
+    step = max(1, int(round(segment_s * fps)))
+    return [(i, start, min(start + step, frames)) for i, start in enumerate(range(0, frames, step))]
+
+
+def _init_worker(artifact, backend, imgsz, threads):
+    global _model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _model = load_detector(artifact, backend, imgsz, artifact=artifact)
+
+
+def _decode(cap, start, end, batch, out, stop):
+    # Decode thread: fills `out` with lists of (frame index, frame); None marks the end
+    index, frames = start, []
+    while not stop.is_set() and (end is None or index < end):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append((index, frame))
+        index += 1
+        if len(frames) == batch:
+            out.put(frames)
+            frames = []
+    if frames:
+        out.put(frames)
+    out.put(None)
+
+
+class AlertIntervals:
+    """Joins frames with a drone in them into [start, end] intervals, closing one after `gap` seconds without."""
+    def __init__(self, gap=1.0):
+        self.gap = gap
+        self.intervals = []
+        self._open = None
+
+    def add(self, frame, t, conf, track_id):
+        current = self._open
+        if current is not None and t - current['end_s'] > self.gap:
+            self.intervals.append(current)
+            current = None
+        if current is None:
+            current = {'start_s': t, 'end_s': t, 'start_frame': frame, 'end_frame': frame, 'frames': 0,
+                       'max_conf': 0.0, 'tracks': []}
+        if current['end_frame'] != frame or current['frames'] == 0:
+            current['frames'] += 1
+        current['end_s'], current['end_frame'] = t, frame
+        current['max_conf'] = max(current['max_conf'], round(conf, 3))
+        if track_id not in current['tracks']:
+            current['tracks'].append(track_id)
+        self._open = current
+
+    def close(self):
+        if self._open is not None:
+            self.intervals.append(self._open)
+            self._open = None
+        return self.intervals
+
+
+def merge_intervals(intervals, gap=1.0):
+    """Intervals of consecutive segments, joined where one ends less than `gap` seconds before the next starts."""
+    merged = []
+    for interval in sorted(intervals, key=lambda i: i['start_s']):
+        last = merged[-1] if merged else None
+        if last is not None and interval['start_s'] - last['end_s'] <= gap:
+            last['end_s'], last['end_frame'] = interval['end_s'], interval['end_frame']
+            last['frames'] += interval['frames']
+            last['max_conf'] = max(last['max_conf'], interval['max_conf'])
+            last['tracks'] += [t for t in interval['tracks'] if t not in last['tracks']]
+        else:
+            merged.append(dict(interval, tracks=list(interval['tracks'])))
+    return merged
+
+
+class RecordWriter:
+    """Rows of FIELDS-style dicts to a JSONL or CSV file."""
+    def __init__(self, f, fmt, fields, header=True):
+        self.f = f
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(f, fieldnames=fields)
+            if header:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow({k: ' '.join(map(str, v)) if isinstance(v, list) else v for k, v in row.items()})
+        else:
+            self.f.write(json.dumps(row) + "\n")
+
+
+def _replace_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def segment_paths(out_dir, index, fmt):
+    base = os.path.join(out_dir, "segments", f"{index:05d}")
+    return f"{base}.{fmt}", f"{base}.json"
+
+
+def analyze_segment(path, index, start, end, fps, settings, out_dir):
+    """Runs one segment start to finish in this process and writes its two files; returns its summary."""
+    fmt, batch = settings['format'], settings['batch']
+    data_path, summary_path = segment_paths(out_dir, index, fmt)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {path}")
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    frames_q = queue.Queue(maxsize=READ_AHEAD)
+    stop = threading.Event()
+    decoder = threading.Thread(target=_decode, args=(cap, start, end, batch, frames_q, stop), daemon=True)
+    tracker = Tracker()
+    alerts = AlertIntervals(gap=tracker.max_age)
+    frames = detections = 0
+    decode_wait = infer_s = 0.0
+    started = time.monotonic()
+    decoder.start()
+    try:
+        with open(data_path + ".part", "w", newline="") as f:
+            writer = RecordWriter(f, fmt, FIELDS)
+            while True:
+                wait_start = time.perf_counter()
+                chunk = frames_q.get()
+                decode_wait += time.perf_counter() - wait_start
+                if chunk is None:
+                    break
+                infer_start = time.perf_counter()
+                results = detect_batch(_model, [frame for _, frame in chunk], settings['imgsz'], settings['conf'])
+                infer_s += time.perf_counter() - infer_start
+
+                for (frame_index, _), data in zip(chunk, results):
+                    t = frame_index / fps
+                    targets, screens, on_screen = process_detections(data, target_classes=TARGET_CLASSES,
+                                                                     screen_classes=SCREEN_CLASSES)
+                    live = tracker.update(targets, on_screen, t)
+                    for track in live:
+                        if track.last_seen != t:
+                            continue  # carried over, not detected in this frame
+                        track_id = index * TRACK_ID_STRIDE + track.id
+                        drone = track.cls == AEROPLANE and not track.on_screen
+                        if drone:
+                            alerts.add(frame_index, round(t, 3), track.conf, track_id)
+                        writer.write({'frame': frame_index, 'time_s': round(t, 3),
+                                      'kind': 'drone' if drone else 'safe' if track.on_screen else 'bird',
+                                      'track_id': track_id, 'cls': track.cls,
+                                      'label': CLASS_NAMES.get(track.cls, str(track.cls)),
+                                      'conf': round(track.conf, 3),
+                                      **dict(zip(('x1', 'y1', 'x2', 'y2'), (round(float(v), 1) for v in track.box))),
+                                      'on_screen': track.on_screen})
+                        detections += 1
+                    for box in screens.tolist():
+                        writer.write({'frame': frame_index, 'time_s': round(t, 3), 'kind': 'screen', 'track_id': None,
+                                      'cls': None, 'label': 'screen', 'conf': None,
+                                      **dict(zip(('x1', 'y1', 'x2', 'y2'), box)), 'on_screen': None})
+                    frames += 1
+        os.replace(data_path + ".part", data_path)
+    finally:
+        stop.set()
+        while decoder.is_alive():  # unblock a decoder waiting on a full queue
+            try:
+                frames_q.get_nowait()
+            except queue.Empty:
+                decoder.join(0.1)
+        cap.release()
+
+    wall = time.monotonic() - started
+    summary = {'segment': index, 'start_frame': start, 'end_frame': start + frames, 'frames': frames,
+               'detections': detections, 'alerts': alerts.close(), 'wall_s': wall, 'fps': frames / max(wall, 1e-6),
+               'infer_s': infer_s, 'decode_wait_s': decode_wait, 'pid': os.getpid()}
+    _replace_json(summary_path, summary)  # written last: the segment is done
+    return summary
+
+
+def _run_segment(job):
+    return analyze_segment(*job)
+
+
+def load_done(out_dir, segments, fmt):
+    """Summaries of the segments a previous run already finished."""
+    done = {}
+    for index, _, _ in segments:
+        data_path, summary_path = segment_paths(out_dir, index, fmt)
+        if os.path.exists(summary_path) and os.path.exists(data_path):
+            try:
+                with open(summary_path) as f:
+                    done[index] = json.load(f)
+            except (OSError, ValueError):
+                pass  # half-written by an older version, redo it
+    return done
+
+
+def check_manifest(out_dir, manifest, restart):
+    """True if out_dir holds (or now holds) a run with these settings; finished segments stay valid."""
+    path = os.path.join(out_dir, "manifest.json")
+    if os.path.exists(path) and not restart:
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            changed = sorted(k for k in set(previous) | set(manifest) if previous.get(k) != manifest.get(k))
+            print(f"[ERROR] {out_dir} holds a run with other settings ({', '.join(changed)}); "
+                  f"use another --out or --restart")
+            return False
+        return True
+    shutil.rmtree(os.path.join(out_dir, "segments"), ignore_errors=True)
+    os.makedirs(os.path.join(out_dir, "segments"), exist_ok=True)
+    _replace_json(path, manifest)
+    return True
+
+
+def write_outputs(out_dir, segments, summaries, fmt, gap):
+    """Concatenates the segment files and joins the alert intervals; returns the merged intervals."""
+    with open(os.path.join(out_dir, f"detections.{fmt}"), "w", newline="") as out:
+        for index, _, _ in segments:
+            with open(segment_paths(out_dir, index, fmt)[0], newline="") as f:
+                if fmt == 'csv' and index > 0:
+                    f.readline()  # one header
+                shutil.copyfileobj(f, out)
+    intervals = merge_intervals([a for s in summaries for a in s['alerts']], gap)
+    with open(os.path.join(out_dir, f"alerts.{fmt}"), "w", newline="") as f:
+        writer = RecordWriter(f, fmt, ALERT_FIELDS)
+        for interval in intervals:
+            writer.write(interval)
+    return intervals
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="Recorded video file")
+    parser.add_argument("--out", help="Output directory (default: analysis/<video name>)")
+    parser.add_argument("--format", choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 4) // 2),
+                        help="Processes, each with its own model, working on different segments")
+    parser.add_argument("--segment-s", type=float, default=300,
+                        help="Segment length in seconds of video (0 = one segment)")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="Frames per model call (default: 8; 1 for exported static-batch models)")
+    parser.add_argument("--imgsz", type=int, default=main_pi.INFERENCE_SIZE)
+    parser.add_argument("--conf", type=float, default=main_pi.CONF_THRESHOLD)
+    parser.add_argument("--backend", default=main_pi.BACKEND, choices=sorted(BACKENDS))
+    parser.add_argument("--restart", action="store_true", help="Discard finished segments of an earlier run")
+    args = parser.parse_args(argv)
+    if not args.out:
+        args.out = os.path.join("analysis", os.path.splitext(os.path.basename(args.video))[0])
+    if args.batch <= 0:
+        args.batch = 8 if args.backend == 'torch' else 1
+    args.workers = max(1, args.workers)
+    return args
+
+
+def main(args):
+    if not os.path.exists(args.video):
+        print(f"[ERROR] Video file not found: {args.video}")
+        return 1
+    frame_count, fps = probe(args.video)
+    segments = plan_segments(frame_count, fps, args.segment_s)
+    settings = {'format': args.format, 'batch': args.batch, 'imgsz': args.imgsz, 'conf': args.conf}
+    manifest = {'video': os.path.abspath(args.video), 'size': os.path.getsize(args.video), 'frames': frame_count,
+                'fps': fps, 'segments': len(segments), 'model': main_pi.MODEL_NAME, 'backend': args.backend,
+                'imgsz': args.imgsz, 'conf': args.conf, 'format': args.format}
+    if not check_manifest(args.out, manifest, args.restart):
+        return 1
+
+    summaries = load_done(args.out, segments, args.format)
+    pending = [s for s in segments if s[0] not in summaries]
+    print(f"[INFO] {args.video}: {frame_count or 'unknown'} frames at {fps:.1f} FPS, {len(segments)} segment(s)"
+          + (f", {len(summaries)} already done" if summaries else ""))
+
+    workers = min(args.workers, len(pending)) or 1
+    threads = max(1, (os.cpu_count() or 4) // workers)
+    jobs = [(args.video, index, start, end, fps, settings, args.out) for index, start, end in pending]
+    started = time.monotonic()
+    frames = 0
+    pool = None
+    interrupted = False
+    try:
+        if not jobs:
+            results = []
+        elif workers == 1:
+            artifact = cached_artifact(main_pi.MODEL_NAME, args.backend, args.imgsz)
+            _init_worker(artifact, args.backend, args.imgsz, threads)
+            results = (_run_segment(job) for job in jobs)
+        else:
+            # Export (if needed) once here, not concurrently in every worker
+            artifact = cached_artifact(main_pi.MODEL_NAME, args.backend, args.imgsz)
+            pool = ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn'), initializer=_init_worker,
+                                       initargs=(artifact, args.backend, args.imgsz, threads))
+            print(f"[INIT] {workers} worker processes, {threads} threads each, batch {args.batch}")
+            results = (future.result() for future in as_completed([pool.submit(_run_segment, job) for job in jobs]))
+        for summary in results:
+            summaries[summary['segment']] = summary
+            frames += summary['frames']
+            print(f"[INFO] Segment {len(summaries)}/{len(segments)} done: {summary['frames']} frames at "
+                  f"{summary['fps']:.1f} FPS, {len(summary['alerts'])} alert interval(s)")
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+    elapsed = time.monotonic() - started
+    if interrupted or len(summaries) < len(segments):
+        print(f"[INFO] Stopped with {len(summaries)}/{len(segments)} segments done; run the same command to resume")
+        return 1
+
+    ordered = [summaries[index] for index, _, _ in segments]
+    intervals = write_outputs(args.out, segments, ordered, args.format, Tracker().max_age)
+    total = sum(s['frames'] for s in ordered)
+    report = {'video': args.video, 'frames': total, 'video_s': total / fps, 'segments': len(segments),
+              'workers': workers, 'batch': args.batch, 'backend': args.backend, 'imgsz': args.imgsz,
+              'detections': sum(s['detections'] for s in ordered), 'alert_intervals': len(intervals),
+              'this_run': {'frames': frames, 'wall_s': elapsed, 'fps': frames / max(elapsed, 1e-6)},
+              'segment_fps': [round(s['fps'], 2) for s in ordered]}
+    _replace_json(os.path.join(args.out, "summary.json"), report)
+
+    print("------------------------------------------------")
+    print(f"[STATS] Analysed {total} frames ({report['video_s'] / 60:.1f} min of video) in {len(segments)} segment(s)")
+    print(f"[STATS] This run: {frames} frames in {elapsed:.1f}s = {report['this_run']['fps']:.1f} FPS "
+          f"({frames / fps / max(elapsed, 1e-6):.1f}x real time) with {workers} worker(s), batch {args.batch}")
+    print(f"[STATS] Detections: {report['detections']}, alert intervals: {len(intervals)}")
+    for interval in intervals:
+        print(f"[STATS]   {interval['start_s']:9.1f}s - {interval['end_s']:9.1f}s  "
+              f"max conf {interval['max_conf']:.2f}, {len(interval['tracks'])} track(s)")
+    print(f"[INFO] Results in {args.out}/ (detections.{args.format}, alerts.{args.format}, summary.json)")
+    print("------------------------------------------------")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
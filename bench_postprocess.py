@@ -0,0 +1,134 @@
+"""
+Micro-benchmark: per-box Python loop (old main_pi / main.py parsing) vs postprocess.py.
+
+    python3 bench_postprocess.py [--repeat 200]
+
+Uses torch tensors when torch is installed (as on the Pi, via ultralytics),
+so the old loop pays the same per-box .cpu().numpy() cost it does in production.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from postprocess import SCREEN_CLASSES, TARGET_CLASSES, process_results
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+# --- FAKE ULTRALYTICS RESULTS ---
+class _HostTensor(np.ndarray):
+    # numpy stand-in for a CPU torch tensor when torch is not installed
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+def _tensor(a):
+    return torch.from_numpy(a) if torch is not None else a.view(_HostTensor)
+
+
+class _Box:
+    def __init__(self, row):
+        self.xyxy = _tensor(row[None, :4])
+        self.conf = _tensor(row[None, 4])
+        self.cls = _tensor(row[None, 5])
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = _tensor(data)
+        self._rows = [_Box(row) for row in data]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = _Boxes(data)
+
+
+def make_results(n, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    # Whole-pixel boxes so the old int-cast path and the float path agree exactly
+    xy = np.round(rng.uniform([0, 0], [width - 60, height - 60], size=(n, 2)))
+    wh = np.round(rng.uniform(10, 200, size=(n, 2)))
+    classes = rng.choice(list(TARGET_CLASSES) + list(SCREEN_CLASSES) + [0, 2], size=n)
+    data = np.column_stack([xy, xy + wh, rng.uniform(0.5, 1.0, n), classes]).astype(np.float32)
+    return [_Result(data)]
+
+
+# --- OLD CODE PATH (copied from main_pi.inference_loop before the rewrite) ---
+def is_overlap(box1, box2):
+    x1_min, y1_min, x1_max, y1_max = box1
+    x2_min, y2_min, x2_max, y2_max = box2
+    inter_x_min = max(x1_min, x2_min)
+    inter_y_min = max(y1_min, y2_min)
+    inter_x_max = min(x1_max, x2_max)
+    inter_y_max = min(y1_max, y2_max)
+    if inter_x_max < inter_x_min or inter_y_max < inter_y_min:
+        return False
+    return True
+
+
+def legacy_postprocess(results):
+    parsed_targets = []
+    parsed_screens = []
+    for r in results:
+        for box in r.boxes:
+            cls_id = int(box.cls[0])
+            conf = float(box.conf[0])
+            xyxy = box.xyxy[0].cpu().numpy().astype(int)
+            if cls_id in SCREEN_CLASSES:
+                parsed_screens.append(xyxy)
+            elif cls_id in TARGET_CLASSES:
+                parsed_targets.append({'box': xyxy, 'conf': conf, 'id': cls_id})
+
+    flags = []
+    for target in parsed_targets:
+        on_screen = False
+        for s_box in parsed_screens:
+            if is_overlap(target['box'], s_box):
+                on_screen = True
+                break
+        flags.append(on_screen)
+    return parsed_targets, parsed_screens, flags
+
+
+def time_it(fn, arg, repeat):
+    fn(arg)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"[INFO] tensors: {'torch' if torch is not None else 'numpy stand-in'}")
+    print(f"{'boxes':>6} {'loop us':>12} {'vector us':>12} {'speedup':>8}")
+    for n in (10, 100, 1000):
+        results = make_results(n)
+        repeat = max(5, args.repeat // (n // 10))
+
+        old_flags = legacy_postprocess(results)[2]
+        new_flags = process_results(results)[2].tolist()
+        if old_flags != new_flags:
+            print(f"[WARN] on-screen flags differ at n={n}")
+
+        loop_us = time_it(legacy_postprocess, results, repeat)
+        vec_us = time_it(process_results, results, repeat)
+        print(f"{n:>6} {loop_us:>12.1f} {vec_us:>12.1f} {loop_us / vec_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
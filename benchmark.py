@@ -0,0 +1,170 @@
+"""
+End-to-end benchmark: runs the real main_pi pipeline (capture -> inference ->
+post-process -> alert -> overlay) headless on recorded clips and writes one JSON report.
+
+    python3 benchmark.py --clips clips/drone_pass.mp4 clips/empty_sky.mp4 --out bench.json
+    python3 benchmark.py --clips synthetic:3 --duration 60 --imgsz 256 --backend ncnn
+
+Clips replay at their original frame rate by default, so latency and dropped
+frames look like they would on a live camera; --fast decodes as fast as
+possible to measure peak throughput instead. Compare two runs with:
+
+    python3 benchmark.py --compare before.json after.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import threading
+
+import psutil
+
+import main_pi
+
+
+class ResourceSampler:
+    """Samples CPU % and RSS of this process and its children (inference workers) in the background."""
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._stop = threading.Event()
+        self._proc = psutil.Process()
+
+    def _sample(self):
+        procs = [self._proc] + self._proc.children(recursive=True)
+        cpu = rss = 0.0
+        for p in procs:
+            try:
+                cpu += p.cpu_percent(None)
+                rss += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return cpu, rss
+
+    def _run(self):
+        self._sample()  # first cpu_percent() call only primes the counters
+        while not self._stop.wait(self.interval):
+            cpu, rss = self._sample()
+            self.cpu.append(cpu)
+            self.rss.append(rss)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        mb = [r / 1e6 for r in self.rss]
+        return {
+            'cpu_percent_mean': sum(self.cpu) / len(self.cpu) if self.cpu else 0.0,
+            'cpu_percent_max': max(self.cpu) if self.cpu else 0.0,
+            'rss_mb_mean': sum(mb) / len(mb) if mb else 0.0,
+            'rss_mb_max': max(mb) if mb else 0.0,
+            'cpu_count': psutil.cpu_count(),
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_clip(clip, pipeline_args):
+    argv = ["--source", clip, "--headless"] + pipeline_args
+    with ResourceSampler() as sampler:
+        report = main_pi.main(main_pi.parse_args(argv))
+    report['resources'] = sampler.summary()
+    report['clip'] = clip
+    return report
+
+
+def compare_reports(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before['revision']} {before['config']}")
+    print(f"after:  {after['revision']} {after['config']}")
+    keys = [('inference_fps', None), ('frames_dropped', None), ('capture_to_result', 'p95_ms'),
+            ('capture_to_alert', 'p95_ms'), ('overlay', 'p95_ms'), ('resources', 'cpu_percent_mean'),
+            ('resources', 'rss_mb_max')]
+    for b, a in zip(before['runs'], after['runs']):
+        print(f"--- {b['clip']}")
+        for key, sub in keys:
+            if key not in b or key not in a:
+                continue  # report from before the metric existed
+            vb = b[key][sub] if sub else b[key]
+            va = a[key][sub] if sub else a[key]
+            name = f"{key}.{sub}" if sub else key
+            print(f"  {name:<30} {vb:>10.2f} -> {va:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", nargs="+", help="Video files or 'synthetic[:N]'")
+    parser.add_argument("--out", default="bench_output.json", help="JSON report path")
+    parser.add_argument("--fast", action="store_true", help="Decode clips as fast as possible")
+    parser.add_argument("--duration", type=float, default=0, help="Cap each clip at N seconds (required for synthetic)")
+    parser.add_argument("--imgsz", type=int, default=main_pi.INFERENCE_SIZE)
+    parser.add_argument("--conf", type=float, default=main_pi.CONF_THRESHOLD)
+    parser.add_argument("--backend", default=main_pi.BACKEND)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--tiles", action="store_true")
+    parser.add_argument("--no-motion-gate", action="store_true")
+    parser.add_argument("--governor", action="store_true")
+    parser.add_argument("--no-render", action="store_true", help="Skip overlay drawing, like an unwatched headless unit")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two JSON reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+    if not args.clips:
+        parser.error("--clips is required")
+
+    config = {'imgsz': args.imgsz, 'conf': args.conf, 'backend': args.backend, 'workers': args.workers,
+              'tiles': args.tiles, 'governor': args.governor, 'render': not args.no_render, 'motion_gate': not args.no_motion_gate, 'fast': args.fast,
+              'model': main_pi.MODEL_NAME}
+    pipeline_args = ["--imgsz", str(args.imgsz), "--conf", str(args.conf), "--backend", args.backend,
+                     "--workers", str(args.workers), "--metrics-port", "0", "--stream-port", "0", "--no-events",
+                     "--exclusion-map", "",  # learn screen zones per clip, never load or save the live map
+                     "--webhook", ""]
+    if args.fast:
+        pipeline_args.append("--fast")
+    if args.duration:
+        pipeline_args += ["--duration", str(args.duration)]
+    if args.tiles:
+        pipeline_args.append("--tiles")
+    if args.no_motion_gate:
+        pipeline_args.append("--no-motion-gate")
+    if args.governor:
+        pipeline_args.append("--governor")
+    if not args.no_render:
+        pipeline_args.append("--render")
+
+    runs = [run_clip(clip, pipeline_args) for clip in args.clips]
+    result = {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'host': {'machine': platform.machine(), 'system': platform.platform(), 'python': platform.python_version()},
+        'config': config,
+        'runs': runs,
+    }
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"[INFO] Benchmark report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
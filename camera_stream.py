@@ -1,94 +1,92 @@
-import cv2
 import threading
 import time
-import numpy as np
-import platform
 
-# Check if running on RPi to import picamzero
-try:
-    from picamzero import Camera
-    HAS_PICAMZERO = True
-except ImportError:
-    HAS_PICAMZERO = False
-    print("[WARN] 'picamzero' not found. Will try standard OpenCV VideoCapture (Webcam mode).")
+from frame_ring import FrameRing
+from frame_source import FrameSource, HAS_PICAMZERO, open_source
+from metrics import METRICS
+
 
 class CameraStream:
-    def __init__(self, src=0):
+    """
+    Threaded reader around a FrameSource.
+
+    `src` keeps the old meaning (camera index), but may also be a video path or
+    "synthetic[:N]"; pass `source=` to hand in an already built FrameSource.
+    lores_size=(w, h) requests a low-resolution inference stream from Pi
+    cameras; it arrives as FrameRef.lores next to the full frame.
+
+    Frames land in a FrameRing. Consumers that only look at pixels should use
+    wait_frame()/release() (no copy, blocks until a new frame); read() returns a
+    private copy that is safe to draw on.
+    """
+    def __init__(self, src=0, source=None, realtime=True, loop=False, ring_slots=4, lores_size=None):
         self.stopped = False
-        self.frame = None
         self.grabbed = False
-        self.cam = None
-        self.stream = None
-        self.use_picam = False
-
-        if HAS_PICAMZERO and platform.system() != 'Windows':
-            try:
-                print("[INIT] Initializing Picamzero...")
-                self.cam = Camera()
-                self.cam.start_preview() # Optional: might show HDMI preview
-                self.use_picam = True
-                print("[INIT] Picamzero started successfully.")
-            except Exception as e:
-                print(f"[ERROR] Picamzero init failed: {e}. Falling back to OpenCV.")
-                self.use_picam = False
-
-        if not self.use_picam:
-            # Fallback for Windows or standard USB webcams
-            if platform.system() == 'Windows':
-                self.stream = cv2.VideoCapture(src, cv2.CAP_DSHOW)
-            else:
-                self.stream = cv2.VideoCapture(src)
-            
-            self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            (self.grabbed, self.frame) = self.stream.read()
+        self.ring = FrameRing(ring_slots)
+
+        if source is None:
+            source = open_source(src, realtime=realtime, loop=loop, lores_size=lores_size)
+        self.source = source
+        self.use_picam = source.name == "picamzero"
+
+        if not self.use_picam and self.source.is_opened():
+            # Prime the first frame so read() is valid immediately, like before
+            self._grab()
+
+    @property
+    def frame_count(self):
+        return self.ring.latest_seq
+
+    @property
+    def timestamp(self):
+        ref = self.ring.latest()
+        self.ring.release(ref)
+        return ref.timestamp if ref is not None else None
 
     def start(self):
         threading.Thread(target=self.update, args=(), daemon=True).start()
         return self
 
+    def _grab(self):
+        slot, buf = self.ring.claim(timeout=1.0)
+        if slot is None:
+            return False
+        start = time.perf_counter()
+        grabbed, frame, ts = self.source.read(out=buf)
+        if grabbed:
+            METRICS.observe('capture', time.perf_counter() - start)
+            METRICS.inc('frames_captured')
+            self.ring.commit(slot, frame, ts, lores=self.source.lores)
+            self.grabbed = True
+        else:
+            self.ring.abandon(slot)
+        return grabbed
+
     def update(self):
         while not self.stopped:
-            if self.use_picam:
-                # PICAMZERO MODE
-                try:
-                    # Capture frame as numpy array (RGB)
-                    # Note: picamzero capture_array usually returns RGB. 
-                    # OpenCV needs BGR.
-                    image = self.cam.capture_array()
-                    if image is not None:
-                        # Convert RGB to BGR for OpenCV
-                        self.frame = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                        self.grabbed = True
-                    else:
-                        time.sleep(0.01)
-                except Exception as e:
-                    print(f"[ERROR] Picam capture error: {e}")
-                    time.sleep(0.1)
-            else:
-                # OPENCV/WEBCAM MODE
-                if self.stream is None or not self.stream.isOpened():
-                    self.stop()
-                    continue
-                
-                (grabbed, frame) = self.stream.read()
-                if grabbed:
-                    self.grabbed = grabbed
-                    self.frame = frame
-                else:
-                    self.stop()
+            if not self._grab() and self.source.exhausted:
+                self.stop()
+
+    def wait_frame(self, after_seq=0, timeout=None):
+        """Borrowed FrameRef newer than after_seq (or None on timeout/stop). Do not draw on it."""
+        return self.ring.wait(after_seq, timeout)
+
+    def release(self, ref):
+        self.ring.release(ref)
 
     def read(self):
-        return self.frame
+        ref = self.ring.latest()
+        if ref is None:
+            return None
+        try:
+            return ref.frame.copy()
+        finally:
+            self.ring.release(ref)
+
+    def is_opened(self):
+        return self.source.is_opened()
 
     def stop(self):
         self.stopped = True
-        if self.use_picam and self.cam:
-            try:
-                self.cam.stop_preview()
-                self.cam.close()
-            except:
-                pass
-        if self.stream:
-            self.stream.release()
-
+        self.ring.close()
+        self.source.release()
@@ -0,0 +1,216 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from event_store import wall_time
+from metrics import METRICS
+
+
+class _Clip:
+    def __init__(self, path, start, end, max_queue):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.alerts = 1
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.queued = 0
+        self.dropped = 0
+
+    def put(self, item):
+        try:
+            self.frames.put_nowait(item)
+            self.queued += 1
+        except queue.Full:
+            self.dropped += 1  # writer (SD card) fell behind
+
+
+class ClipRecorder:
+    """
+    Keeps the last pre_seconds of CameraStream frames as JPEGs in memory and,
+    on trigger(), writes pre-roll + post_seconds of post-roll to a video file.
+
+    - Its own thread borrows frames from the camera ring (no copy), keeps at
+      most `fps` per second and JPEG-encodes them. The ring is capped at
+      max_bytes as well as pre_seconds, so RAM use is bounded whatever the
+      scene compresses to (a busy scene just gets a shorter pre-roll).
+    - A trigger while a clip is still recording extends that clip instead of
+      starting a new one, so overlapping alerts end up in one file.
+    - A writer thread decodes and writes clips; frames it cannot keep up with
+      are dropped and counted, never buffered without bound.
+
+    stats() reports ring size, encode cost and the measured write throughput.
+    """
+    def __init__(self, cam, out_dir, pre_seconds=5.0, post_seconds=5.0, fps=10.0, quality=80,
+                 max_bytes=32 * 1024 * 1024, max_queue=300, fourcc='MJPG', ext='.avi'):
+        self.cam = cam
+        self.out_dir = out_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self.fourcc = fourcc
+        self.ext = ext
+
+        self._ring = deque()  # (timestamp, jpeg bytes)
+        self._ring_bytes = 0
+        self._clip = None
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = False
+        self._threads = []
+        self.encoded = 0
+        self.evicted_for_memory = 0
+        self.merged = 0
+        self.clips = []
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._running = True
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                         threading.Thread(target=self._write_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    # --- capture side ---
+    def _capture_loop(self):
+        last_seq = 0
+        last_kept = 0.0
+        interval = 1.0 / self.fps
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while self._running:
+            ref = self.cam.wait_frame(last_seq, timeout=0.5)
+            if ref is None:
+                self._check_clip_end(time.monotonic())
+                continue
+            last_seq = ref.seq
+            ts = ref.timestamp
+            if ts - last_kept < interval:
+                self.cam.release(ref)
+                continue
+            last_kept = ts
+            start = time.perf_counter()
+            try:
+                ok, buf = cv2.imencode(".jpg", ref.frame, params)
+            finally:
+                self.cam.release(ref)
+            METRICS.observe('clip_encode', time.perf_counter() - start)
+            if ok:
+                self.encoded += 1
+                self._store(ts, buf.tobytes())
+
+    def _store(self, ts, jpeg):
+        with self._lock:
+            self._ring.append((ts, jpeg))
+            self._ring_bytes += len(jpeg)
+            while len(self._ring) > 1 and (self._ring_bytes > self.max_bytes
+                                           or self._ring[0][0] < ts - self.pre_seconds):
+                if self._ring_bytes > self.max_bytes:
+                    self.evicted_for_memory += 1
+                self._ring_bytes -= len(self._ring.popleft()[1])
+            METRICS.set_gauge('clip_ring_bytes', self._ring_bytes)
+            if self._clip is not None and ts <= self._clip.end:
+                self._clip.put((ts, jpeg))
+        self._check_clip_end(ts)
+
+    def _check_clip_end(self, now):
+        with self._lock:
+            clip = self._clip
+            if clip is None or now <= clip.end:
+                return
+            self._clip = None
+        # Blocking (the end marker must not be dropped), but outside the lock: a writer still busy
+        # with the previous clip must not stall trigger() on the alert path
+        clip.frames.put(None)
+
+    # --- alert side ---
+    def trigger(self, ts=None):
+        """Start (or extend) a clip around capture time `ts` (monotonic). Returns the clip path."""
+        ts = time.monotonic() if ts is None else ts
+        with self._lock:
+            if self._clip is not None:
+                self._clip.end = max(self._clip.end, ts + self.post_seconds)
+                self._clip.alerts += 1
+                self.merged += 1
+                return self._clip.path
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(wall_time(ts)))
+            path = os.path.join(self.out_dir, f"clip-{stamp}{self.ext}")
+            clip = _Clip(path, ts - self.pre_seconds, ts + self.post_seconds, self.max_queue)
+            for item in self._ring:
+                if item[0] >= clip.start:
+                    clip.put(item)
+            self._clip = clip
+        self._jobs.put(clip)
+        print(f"[REC] Recording {path} ({self.pre_seconds:.0f}s pre-roll)")
+        return path
+
+    # --- writer ---
+    def _write_loop(self):
+        while self._running or not self._jobs.empty():
+            try:
+                clip = self._jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._write_clip(clip)
+
+    def _write_clip(self, clip):
+        writer = None
+        frames = 0
+        first_ts = last_ts = None
+        busy = 0.0
+        while True:
+            item = clip.frames.get()
+            if item is None:
+                break
+            ts, jpeg = item
+            start = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(clip.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (w, h))
+                first_ts = ts
+            writer.write(frame)
+            busy += time.perf_counter() - start
+            frames += 1
+            last_ts = ts
+        if writer is None:
+            return
+        start = time.perf_counter()
+        writer.release()
+        busy += time.perf_counter() - start
+        size = os.path.getsize(clip.path) if os.path.exists(clip.path) else 0
+        info = {'path': clip.path, 'frames': frames, 'dropped': clip.dropped, 'alerts': clip.alerts,
+                'seconds': last_ts - first_ts, 'bytes': size, 'write_s': busy,
+                'write_mb_s': size / 1e6 / busy if busy > 0 else 0.0}
+        self.clips.append(info)
+        METRICS.observe('clip_write', busy)
+        print(f"[REC] Saved {clip.path}: {frames} frames / {info['seconds']:.1f}s, {size / 1e6:.1f} MB "
+              f"in {busy:.2f}s ({info['write_mb_s']:.1f} MB/s), {clip.dropped} dropped")
+
+    def stop(self, timeout=10.0):
+        """Finishes the clip being recorded (post-roll cut short) and waits for the writer."""
+        with self._lock:
+            clip, self._clip = self._clip, None
+        if clip is not None:
+            clip.frames.put(None)
+        self._running = False
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            span = self._ring[-1][0] - self._ring[0][0] if len(self._ring) > 1 else 0.0
+            ring = {'frames': len(self._ring), 'bytes': self._ring_bytes, 'seconds': span}
+        written = sum(c['bytes'] for c in self.clips)
+        busy = sum(c['write_s'] for c in self.clips)
+        return {'ring': ring, 'max_bytes': self.max_bytes, 'encoded': self.encoded,
+                'evicted_for_memory': self.evicted_for_memory, 'clips': len(self.clips), 'merged_alerts': self.merged,
+                'frames_dropped': sum(c['dropped'] for c in self.clips), 'bytes_written': written,
+                'write_mb_s': written / 1e6 / busy if busy > 0 else 0.0}
@@ -0,0 +1,125 @@
+"""
+Per-backend latency and agreement with the PyTorch reference on a recorded clip.
+
+    python3 compare_backends.py --clip clips/sky.mp4 --backends torch onnx openvino ncnn
+    python3 compare_backends.py --clip clips/sky.mp4 --json report.json
+
+Agreement counts same-class detections with IoU >= 0.5 against what the
+PyTorch model finds on the same frame (recall = reference boxes recovered,
+precision = backend boxes that the reference also has).
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from detector_backend import BACKENDS, CACHE_DIR, cached_artifact, load_detector
+from evaluation import latency_summary, match_detections
+from frame_source import VideoFileSource
+from postprocess import AEROPLANE, BIRD, TARGET_CLASSES, SCREEN_CLASSES, boxes_from_results
+
+MODEL_NAME = 'yolov8n.pt'
+
+
+def read_clip(path, max_frames):
+    source = VideoFileSource(path, realtime=False)
+    frames = []
+    while len(frames) < max_frames:
+        grabbed, frame, _ = source.read()
+        if not grabbed:
+            break
+        frames.append(frame)
+    source.release()
+    return frames
+
+
+def run_backend(model, frames, imgsz, conf):
+    detections, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        results = model(frame, imgsz=imgsz, conf=conf, verbose=False, iou=0.45)
+        data = boxes_from_results(results)
+        latencies.append(time.perf_counter() - start)
+        detections.append(data)
+    return detections, latencies
+
+
+def agreement(reference, detections, classes):
+    tp = fp = fn = 0
+    ious = []
+    for ref, det in zip(reference, detections):
+        t, f, n, matched = match_detections(ref, det, 0.5, classes)
+        tp, fp, fn = tp + t, fp + f, fn + n
+        ious.extend(matched)
+    return {
+        'recall': tp / (tp + fn) if tp + fn else 1.0,
+        'precision': tp / (tp + fp) if tp + fp else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'reference_boxes': tp + fn,
+    }
+
+
+def compare(clip, backends, model_name=MODEL_NAME, imgsz=320, conf=0.5, max_frames=300,
+            cache_dir=CACHE_DIR, artifacts=None):
+    """Returns {backend: report}. `artifacts` maps extra report names to model files (e.g. INT8 exports)."""
+    frames = read_clip(clip, max_frames)
+    if not frames:
+        raise ValueError(f"No frames decoded from {clip}")
+    print(f"[INFO] {len(frames)} frames from {clip}")
+
+    # PyTorch always runs first: it is the reference the others are compared with
+    runs = [('torch', 'torch', None)] + [(b, b, None) for b in backends if b != 'torch']
+    runs += [(name, backend, path) for name, (backend, path) in (artifacts or {}).items()]
+
+    classes = list(TARGET_CLASSES) + list(SCREEN_CLASSES)
+    report, reference = {}, None
+    for name, backend, path in runs:
+        start = time.monotonic()
+        path = path or cached_artifact(model_name, backend, imgsz, cache_dir)
+        model = load_detector(model_name, backend, imgsz, cache_dir, artifact=path)
+        load_s = time.monotonic() - start
+
+        detections, latencies = run_backend(model, frames, imgsz, conf)
+        if name == 'torch':
+            reference = detections
+        entry = {'backend': backend, 'artifact': path, 'load_s': load_s, 'latency': latency_summary(latencies),
+                 'fps': len(frames) / sum(latencies)}
+        entry['agreement'] = agreement(reference, detections, classes)
+        entry['agreement_targets'] = agreement(reference, detections, list(TARGET_CLASSES))
+        entry['agreement_by_class'] = {label: agreement(reference, detections, [cls])
+                                       for label, cls in (('aeroplane', AEROPLANE), ('bird', BIRD))}
+        report[name] = entry
+    return report
+
+
+def print_report(report):
+    print(f"{'backend':<14} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'FPS':>6} {'recall':>7} {'prec':>6} {'mIoU':>5}")
+    for name, r in report.items():
+        lat, agr = r['latency'], r['agreement']
+        print(f"{name:<14} {r['load_s']:>7.1f} {lat['p50_ms']:>8.1f} {lat['p95_ms']:>8.1f} {r['fps']:>6.1f} "
+              f"{agr['recall']:>7.3f} {agr['precision']:>6.3f} {agr['mean_iou']:>5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clip", required=True, help="Recorded video to evaluate on")
+    exportable = [b for b in sorted(BACKENDS) if b == 'torch' or BACKENDS[b]]
+    parser.add_argument("--backends", nargs="+", default=exportable, choices=sorted(BACKENDS))
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--conf", type=float, default=0.5)
+    parser.add_argument("--frames", type=int, default=300, help="Max frames to evaluate")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = compare(args.clip, args.backends, args.model, args.imgsz, args.conf, args.frames)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from detector_backend import load_detector
+from metrics import METRICS
+from postprocess import AEROPLANE
+
+# Classifier class names -> the kinds the alert logic knows about
+KIND_ALIASES = {'drone': 'drone', 'uav': 'drone', 'quadcopter': 'drone', 'bird': 'bird',
+                'plane': 'plane', 'aeroplane': 'plane', 'airplane': 'plane', 'aircraft': 'plane'}
+
+
+def load_classifier(model_name, backend='torch', imgsz=128):
+    """A YOLO classification model (e.g. yolov8n-cls fine-tuned on drone / bird / plane crops)."""
+    return load_detector(model_name, backend, imgsz, task='classify')
+
+
+def square_crop(frame, box, pad=0.2, min_side=32):
+    """Square crop around `box` with `pad` context on each side, clipped to the frame."""
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = box[:4]
+    side = int(max(x2 - x1, y2 - y1) * (1 + 2 * pad))
+    side = min(max(side, min_side), w, h)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    x0 = int(min(max(cx - side / 2, 0), w - side))
+    y0 = int(min(max(cy - side / 2, 0), h - side))
+    return frame[y0:y0 + side, x0:x0 + side]
+
+
+def appearance(crop, size=16):
+    """Tiny normalised grayscale thumbnail; mean abs difference between two is the appearance change."""
+    gray = cv2.cvtColor(cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    gray = gray.astype(np.float32)
+    return (gray - gray.mean()) / (gray.std() + 1e-3)
+
+
+class CropCascade:
+    """
+    Second stage behind the full-frame detector: a small classifier decides
+    drone / bird / plane on a crop of each target, so the detector can stay
+    tiny and its aeroplane-vs-bird confusion no longer decides alerts.
+
+    Runs on its own thread against the newest camera frame, so neither
+    capture nor the detector wait for it. A track is classified once when it
+    appears and again only when its crop looks different (appearance change
+    above `change`, at most every min_interval seconds); in between the
+    verdict cached on the track (track.verdict) is reused. New tracks are
+    batched into one classifier call.
+
+    kind(track) is what the alert logic uses: the verdict when it is
+    confident, 'pending' while a new track waits for its first verdict (at
+    most max_wait seconds), and the detector's class otherwise.
+    """
+    def __init__(self, classifier, cam, tracks_at, min_conf=0.6, change=0.6, min_interval=1.0, max_wait=1.0,
+                 pad=0.2, rate=10.0, max_batch=None):
+        self.classifier = classifier
+        self.cam = cam
+        self.tracks_at = tracks_at  # timestamp -> [(track, box)], e.g. Tracker.predict under its lock
+        self.min_conf = min_conf
+        self.change = change
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self.pad = pad
+        self.rate = rate
+        self.max_batch = max_batch  # exported models with a static batch dimension need 1
+        self._cache = {}  # track id -> (appearance, classified_at)
+        self._running = False
+        self._thread = None
+        self.classified = 0
+        self.reused = 0
+        self.overridden = 0
+        self.calls = 0
+        self.busy_s = 0.0
+        self.verdicts = {}
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def kind(self, track, now=None):
+        """'drone', 'bird', 'plane' or 'pending' for one track."""
+        verdict = track.verdict
+        if verdict is not None and verdict[0] in ('drone', 'bird', 'plane') and verdict[1] >= self.min_conf:
+            return verdict[0]
+        now = time.monotonic() if now is None else now
+        if verdict is None and now - track.first_seen < self.max_wait:
+            return 'pending'
+        return 'drone' if track.cls == AEROPLANE else 'bird'
+
+    def _run(self):
+        last_seq = 0
+        period = 1.0 / self.rate
+        while self._running:
+            started = time.monotonic()
+            ref = self.cam.wait_frame(last_seq, timeout=0.5)
+            if ref is None:
+                continue
+            last_seq = ref.seq
+            try:
+                self._step(ref.frame, ref.timestamp)
+            finally:
+                self.cam.release(ref)
+            wait = period - (time.monotonic() - started)
+            if wait > 0:
+                time.sleep(wait)
+
+    def _step(self, frame, ts):
+        tracks = self.tracks_at(ts)
+        live = {track.id for track, _ in tracks}
+        for track_id in [i for i in self._cache if i not in live]:
+            del self._cache[track_id]  # track ended
+
+        due = []
+        for track, box in tracks:
+            crop = square_crop(frame, box, self.pad)
+            if crop.size == 0:
+                continue
+            look = appearance(crop)
+            cached = self._cache.get(track.id)
+            if cached is not None:
+                if ts - cached[1] < self.min_interval or np.abs(look - cached[0]).mean() < self.change:
+                    self.reused += 1
+                    continue
+            due.append((track, crop, look))
+        if not due:
+            return
+
+        start = time.perf_counter()
+        crops = [crop for _, crop, _ in due]
+        step = self.max_batch or len(crops)
+        results = []
+        for i in range(0, len(crops), step):
+            results.extend(self.classifier(crops[i:i + step], verbose=False))
+        elapsed = time.perf_counter() - start
+        METRICS.observe('classify', elapsed)
+        self.calls += 1
+        self.busy_s += elapsed
+
+        for (track, _, look), r in zip(due, results):
+            name = str(r.names[int(r.probs.top1)]).lower()
+            verdict = (KIND_ALIASES.get(name, name), float(r.probs.top1conf))
+            detector_kind = 'drone' if track.cls == AEROPLANE else 'bird'
+            if verdict[1] >= self.min_conf and verdict[0] != detector_kind:
+                self.overridden += 1
+            track.verdict = verdict
+            self._cache[track.id] = (look, ts)
+            self.classified += 1
+            self.verdicts[verdict[0]] = self.verdicts.get(verdict[0], 0) + 1
+
+    def stats(self):
+        mean_ms = 1000 * self.busy_s / self.calls if self.calls else 0.0
+        return {'classified': self.classified, 'reused': self.reused, 'overridden': self.overridden,
+                'calls': self.calls, 'mean_ms': mean_ms, 'verdicts': dict(self.verdicts)}
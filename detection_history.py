@@ -0,0 +1,181 @@
+"""
+In-memory history of recent detections, for questions like "how many drones in
+the last minute" or "where was track 7 ten seconds ago".
+
+    history = DetectionHistory(max_bytes=2 * 1024 * 1024)
+    history.append_tracks(seen_tracks, frame_ts)          # inference thread only
+    rows = history.query(start=now - 30, cls=AEROPLANE)   # any thread, RECORD array
+    history.rate(60.0, cls=AEROPLANE)                     # detections (rows) per minute
+    history.distinct_tracks(now - 60, now, cls=AEROPLANE) # targets seen in the last minute
+
+Rows live in preallocated column arrays used as one ring (the oldest rows are
+overwritten), so memory never grows past max_bytes and an append is a few
+slice assignments. Timestamps never go backwards, so a time range is two
+binary searches per column slice rather than a scan.
+
+There is one writer and no lock. The writer fills rows first and publishes
+them by bumping `count`; readers only look at rows below the count they saw
+and keep `guard` rows clear of the writer. A read the writer overtook anyway
+(it appended more than guard / 2 rows meanwhile) is simply done again.
+"""
+import numpy as np
+
+from postprocess import CLS, CONF
+
+# (name, dtype, shape per row); one array per column so a query touches only what it reads
+COLUMNS = (('ts', np.float64, ()), ('cls', np.int16, ()), ('conf', np.float32, ()), ('box', np.float32, (4,)),
+           ('track', np.int32, ()), ('on_screen', np.bool_, ()))
+RECORD = np.dtype([(name, dtype, shape) for name, dtype, shape in COLUMNS])
+ROW_BYTES = RECORD.itemsize  # 35
+
+
+class DetectionHistory:
+    """
+    Fixed-capacity ring of (ts, cls, conf, box, track, on_screen) rows, at most
+    max_bytes of column data. ts is whatever clock the writer uses (main_pi:
+    time.monotonic() of the frame capture); track is -1 for untracked rows.
+    """
+    def __init__(self, max_bytes=2 * 1024 * 1024):
+        self.capacity = max(256, int(max_bytes) // ROW_BYTES)
+        self.guard = max(8, self.capacity // 16)  # rows readers leave to an in-flight append
+        self.max_append = self.guard // 2
+        self.columns = {name: np.zeros((self.capacity,) + shape, dtype=dtype) for name, dtype, shape in COLUMNS}
+        self.count = 0  # rows ever appended; rows below it are complete
+        self.truncated = 0
+        self.retries = 0
+        self._last_ts = float('-inf')
+
+    # --- writer (one thread) ---
+    def append(self, ts, rows, track_ids=None, on_screen=None):
+        """Adds the (N, 6) detection rows of one result taken at `ts`."""
+        n = len(rows)
+        if n == 0:
+            return
+        if n > self.max_append:
+            self.truncated += n - self.max_append
+            n = self.max_append
+        ts = self._last_ts = max(ts, self._last_ts)  # keep the ts column sorted
+        c = self.columns
+        start = self.count % self.capacity
+        first = min(n, self.capacity - start)
+        for src, lo, hi in ((slice(0, first), start, start + first), (slice(first, n), 0, n - first)):
+            if hi <= lo:
+                continue
+            c['ts'][lo:hi] = ts
+            c['cls'][lo:hi] = rows[src, CLS]
+            c['conf'][lo:hi] = rows[src, CONF]
+            c['box'][lo:hi] = rows[src, :4]
+            c['track'][lo:hi] = -1 if track_ids is None else track_ids[src]
+            c['on_screen'][lo:hi] = False if on_screen is None else on_screen[src]
+        self.count += n  # publish
+
+    def append_tracks(self, tracks, ts):
+        """Adds tracker.Track objects detected in the result taken at `ts`."""
+        if not tracks:
+            return
+        rows = np.empty((len(tracks), 6), dtype=np.float32)
+        rows[:, :4] = [t.box for t in tracks]
+        rows[:, CONF] = [t.conf for t in tracks]
+        rows[:, CLS] = [t.cls for t in tracks]
+        self.append(ts, rows, np.array([t.id for t in tracks], dtype=np.int32),
+                    np.array([t.on_screen for t in tracks], dtype=bool))
+
+    # --- readers (any thread) ---
+    def _spans(self, count):
+        """Physical (lo, hi) index ranges of the readable rows, oldest first."""
+        first = max(0, count - self.capacity + self.guard)
+        lo = first % self.capacity
+        end = lo + count - first
+        if end <= self.capacity:
+            return [(lo, end)] if end > lo else []
+        return [(lo, self.capacity), (0, end - self.capacity)]
+
+    def _read(self, start, end, fn):
+        """[fn(lo, hi)] over the index ranges with start <= ts <= end; fn must copy what it keeps."""
+        while True:
+            count = self.count
+            out = []
+            for lo, hi in self._spans(count):
+                ts = self.columns['ts'][lo:hi]
+                a = lo + (int(np.searchsorted(ts, start, 'left')) if start is not None else 0)
+                b = lo + (int(np.searchsorted(ts, end, 'right')) if end is not None else hi - lo)
+                if b > a:
+                    out.append(fn(a, b))
+            if self.count - count <= self.max_append:
+                return out
+            self.retries += 1  # the writer reached rows we were reading
+
+    def _mask(self, a, b, cls, track, min_conf, on_screen):
+        c = self.columns
+        mask = None
+        for column, value, test in (('cls', cls, np.isin), ('track', track, np.equal),
+                                    ('conf', min_conf, np.greater_equal), ('on_screen', on_screen, np.equal)):
+            if value is None:
+                continue
+            if column == 'cls' and np.isscalar(value):
+                value = [value]
+            m = test(c[column][a:b], value)
+            mask = m if mask is None else mask & m
+        return mask
+
+    def query(self, start=None, end=None, cls=None, track=None, min_conf=None, on_screen=None):
+        """
+        Rows with start <= ts <= end, oldest first, as a RECORD structured array.
+        cls is one class id or a list; track / on_screen match exactly; min_conf is inclusive.
+        """
+        def rows(a, b):
+            mask = self._mask(a, b, cls, track, min_conf, on_screen)
+            if mask is None:
+                return {name: col[a:b].copy() for name, col in self.columns.items()}
+            return {name: col[a:b][mask] for name, col in self.columns.items()}
+
+        parts = self._read(start, end, rows)
+        out = np.empty(sum(len(p['ts']) for p in parts), dtype=RECORD)
+        i = 0
+        for p in parts:
+            n = len(p['ts'])
+            for name in self.columns:
+                out[name][i:i + n] = p[name]
+            i += n
+        return out
+
+    def count_between(self, start=None, end=None, cls=None, on_screen=None):
+        def count(a, b):
+            mask = self._mask(a, b, cls, None, None, on_screen)
+            return b - a if mask is None else int(mask.sum())
+        return sum(self._read(start, end, count))
+
+    def rate(self, window=60.0, now=None, cls=None, on_screen=None):
+        """Detections per minute over the last `window` seconds (up to `now`, default the newest row)."""
+        now = self._last_ts if now is None else now
+        return self.count_between(now - window, now, cls, on_screen) * 60.0 / window
+
+    def distinct_tracks(self, start=None, end=None, cls=None, on_screen=None):
+        """Number of different tracks between start and end (a target seen in many results counts once)."""
+        def tracks(a, b):
+            ids = self.columns['track'][a:b]
+            mask = self._mask(a, b, cls, None, None, on_screen)
+            return ids.copy() if mask is None else ids[mask]
+        ids = np.concatenate(self._read(start, end, tracks) or [np.zeros(0, dtype=np.int32)])
+        return len(np.unique(ids[ids >= 0]))
+
+    def per_bucket(self, start, end, bucket=60.0, cls=None, on_screen=None):
+        """Detection counts per `bucket` seconds from start to end, e.g. detections for each minute."""
+        ts = self.query(start, end, cls=cls, on_screen=on_screen)['ts']
+        bins = max(1, int(np.ceil((end - start) / bucket)))
+        index = np.minimum(((ts - start) // bucket).astype(np.int64), bins - 1)
+        return np.bincount(index, minlength=bins)
+
+    def by_class(self, start=None, end=None):
+        """{class id: detections} between start and end."""
+        classes = np.concatenate(self._read(start, end, lambda a, b: self.columns['cls'][a:b].copy()) or [[]])
+        ids, counts = np.unique(classes.astype(np.int16), return_counts=True)
+        return {int(i): int(n) for i, n in zip(ids, counts)}
+
+    def stats(self):
+        rows = self.query()
+        span = float(rows['ts'][-1] - rows['ts'][0]) if len(rows) else 0.0
+        peak = int(self.per_bucket(rows['ts'][0], rows['ts'][-1] + 1e-6).max()) if len(rows) else 0
+        return {'appended': self.count, 'rows': len(rows), 'capacity': self.capacity,
+                'bytes': self.capacity * ROW_BYTES, 'span_s': span, 'per_minute_peak': peak,
+                'by_class': self.by_class(), 'truncated': self.truncated, 'read_retries': self.retries}
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+
+# backend name -> ultralytics export format. 'torch' runs the .pt file directly.
+BACKENDS = {
+    'torch': None,
+    'onnx': 'onnx',          # ONNX Runtime (CPU)
+    'openvino': 'openvino',  # Intel OpenVINO (also runs on ARM CPUs)
+    'ncnn': 'ncnn',          # Tencent NCNN, usually fastest on the Pi
+    'onnx-int8': None,       # ONNX Runtime, statically quantized by quantize.py (not exported here)
+}
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cache")
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def cache_key(model_path, imgsz, backend):
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return f"{stem}-{file_hash(model_path)}-{imgsz}-{backend}"
+
+
+def _resolve_weights(model_name):
+    # Local file, else the copy in the ultralytics weights dir, else download it (what YOLO('yolov8n.pt')
+    # does on first use) - without building the model just to find the file for hashing.
+    if os.path.exists(model_name):
+        return model_name
+    from ultralytics.utils.downloads import attempt_download_asset
+    return str(attempt_download_asset(model_name))
+
+
+def cache_dir_for(model_name, backend, imgsz, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, cache_key(_resolve_weights(model_name), imgsz, backend))
+
+
+def cached_artifact(model_name, backend, imgsz, cache_dir=CACHE_DIR, export_kwargs=None):
+    """
+    Path of the exported model for (weights hash, imgsz, backend), exporting it
+    on the first call. The export is moved under cache_dir/<key>/ so later
+    starts only load it.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', choose from {sorted(BACKENDS)}")
+    weights = _resolve_weights(model_name)
+    if backend == 'torch':
+        return weights
+
+    key_dir = os.path.join(cache_dir, cache_key(weights, imgsz, backend))
+    if os.path.isdir(key_dir):
+        entries = [e for e in os.listdir(key_dir) if not e.startswith(".")]
+        if entries:
+            return os.path.join(key_dir, entries[0])
+    if BACKENDS[backend] is None:
+        raise FileNotFoundError(f"No {backend} model for {os.path.basename(weights)} at imgsz={imgsz}. "
+                                f"Create it first: python3 quantize.py --clips <recorded footage>")
+
+    from ultralytics import YOLO
+    print(f"[INIT] Exporting {os.path.basename(weights)} to {backend} (imgsz={imgsz}), first run only...")
+    start = time.monotonic()
+    exported = YOLO(weights).export(format=BACKENDS[backend], imgsz=imgsz, **(export_kwargs or {}))
+    exported = str(exported)
+
+    # Ultralytics picks the runtime from the file suffix / directory name
+    # (e.g. *_ncnn_model), so keep the basename and only change the parent.
+    staging = key_dir + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    shutil.move(exported, os.path.join(staging, os.path.basename(exported.rstrip(os.sep))))
+    os.replace(staging, key_dir)
+    print(f"[INIT] Export done in {time.monotonic() - start:.1f}s -> {key_dir}")
+    return os.path.join(key_dir, os.listdir(key_dir)[0])
+
+
+def load_detector(model_name, backend='torch', imgsz=320, cache_dir=CACHE_DIR, warmup=True, artifact=None,
+                  task='detect'):
+    """
+    A callable YOLO model for the requested backend, loaded from the on-disk
+    cache and warmed up with a dummy inference so the first real frame does not
+    pay for lazy initialisation. Call it exactly like YOLO(...)(frame, ...).
+    task='classify' loads a classification model the same way.
+    """
+    from ultralytics import YOLO
+    path = artifact or cached_artifact(model_name, backend, imgsz, cache_dir)
+    start = time.monotonic()
+    model = YOLO(path, task=task)
+    if warmup:
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+    print(f"[INIT] {backend} {'detector' if task == 'detect' else task + ' model'} ready in {time.monotonic() - start:.1f}s ({path})")
+    return model
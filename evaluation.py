@@ -0,0 +1,50 @@
+import numpy as np
+
+from postprocess import CLS
+from tracker import iou_matrix
+
+
+def percentile(values, pct):
+    if not len(values):
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def latency_summary(seconds):
+    """mean / p50 / p95 / p99 / max in milliseconds for a list of durations in seconds."""
+    ms = [s * 1000.0 for s in seconds]
+    return {
+        'count': len(ms),
+        'mean_ms': sum(ms) / len(ms) if ms else 0.0,
+        'p50_ms': percentile(ms, 50),
+        'p95_ms': percentile(ms, 95),
+        'p99_ms': percentile(ms, 99),
+        'max_ms': max(ms) if ms else 0.0,
+    }
+
+
+def match_detections(reference, test, iou_threshold=0.5, classes=None):
+    """
+    Greedy same-class matching of (N, 6) test detections against (M, 6) reference
+    detections. Returns (true_positives, false_positives, false_negatives, [matched IoUs]).
+    """
+    if classes is not None:
+        reference = reference[np.isin(reference[:, CLS].astype(int), classes)]
+        test = test[np.isin(test[:, CLS].astype(int), classes)]
+    if not len(reference) or not len(test):
+        return 0, len(test), len(reference), []
+
+    iou = iou_matrix(reference, test)
+    iou[reference[:, CLS][:, None] != test[:, CLS][None, :]] = -1
+    ious = []
+    while True:
+        ri, ti = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[ri, ti] < 0 or iou[ri, ti] < iou_threshold:
+            break
+        ious.append(float(iou[ri, ti]))
+        iou[ri, :] = -1
+        iou[:, ti] = -1
+    tp = len(ious)
+    return tp, len(test) - tp, len(reference) - tp, ious
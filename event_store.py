@@ -0,0 +1,277 @@
+"""
+Durable record of detections and alerts.
+
+    store = EventStore("events/events.db", snapshot_dir="events/snapshots").start()
+    store.record('alert', cls, conf, box, track_id=3, frame=frame)   # never blocks
+    store.query(start=time.time() - 3600, cls='aeroplane', min_conf=0.6)
+
+    python3 event_store.py events/events.db --since 3600 --class aeroplane
+
+The hot loop only appends to a deque (atomic in CPython, no lock). A writer
+thread drains it and commits in batches, to SQLite (*.db) or to rotating
+JSON-lines files (*.jsonl). Alert snapshots are JPEG-encoded and written by a
+separate thread, so neither encoding nor disk I/O ever runs in the caller.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from postprocess import AEROPLANE, BIRD
+
+CLASS_NAMES = {AEROPLANE: 'aeroplane', BIRD: 'bird'}
+CLASS_IDS = {name: cls for cls, name in CLASS_NAMES.items()}
+FIELDS = ('ts', 'kind', 'cls', 'label', 'conf', 'x1', 'y1', 'x2', 'y2', 'track_id', 'on_screen', 'snapshot',
+          'source')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    cls INTEGER,
+    label TEXT,
+    conf REAL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+    track_id INTEGER,
+    on_screen INTEGER,
+    snapshot TEXT,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_cls_ts ON events (cls, ts);
+"""
+
+
+def wall_time(monotonic_ts):
+    """Wall-clock time of a time.monotonic() capture timestamp."""
+    return time.time() - (time.monotonic() - monotonic_ts)
+
+
+class EventStore:
+    """
+    Batched, asynchronous event writer. record() is safe to call from any
+    thread; events reach disk within flush_interval seconds (or as soon as
+    batch_size are waiting). If disk I/O stalls, up to max_pending events
+    are kept and the oldest are dropped beyond that (counted in .dropped).
+    """
+    def __init__(self, path, snapshot_dir=None, batch_size=64, flush_interval=1.0, rotate_bytes=16 * 1024 * 1024,
+                 snapshot_quality=85, max_pending=10000, max_pending_snapshots=16):
+        self.path = path
+        self.backend = 'jsonl' if path.endswith('.jsonl') else 'sqlite'
+        self.snapshot_dir = snapshot_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.snapshot_quality = snapshot_quality
+
+        self._events = deque(maxlen=max_pending)
+        self._snapshots = deque(maxlen=max_pending_snapshots)
+        self._wake = threading.Event()
+        self._wake_snapshots = threading.Event()
+        self._running = False
+        self._threads = []
+        self._file = None
+        self.written = 0
+        self.snapshots_written = 0
+        self.dropped = 0
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.snapshot_dir:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        if self.backend == 'sqlite':
+            with sqlite3.connect(self.path) as db:
+                db.executescript(SCHEMA)
+                columns = [row[1] for row in db.execute("PRAGMA table_info(events)")]
+                if 'source' not in columns:  # log written before multi-camera support
+                    db.execute("ALTER TABLE events ADD COLUMN source TEXT")
+        self._running = True
+        self._threads = [threading.Thread(target=self._write_loop, daemon=True),
+                         threading.Thread(target=self._snapshot_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+        print(f"[INFO] Recording events to {self.path} ({self.backend})")
+        return self
+
+    # --- hot path ---
+    def record(self, kind, cls, conf, box, track_id=None, on_screen=False, ts=None, frame=None, source=None):
+        """
+        Queue one event. `frame` (alerts) is JPEG-encoded in the background and
+        must not be modified by the caller afterwards. `source` names the camera.
+        """
+        ts = time.time() if ts is None else ts
+        snapshot = None
+        if frame is not None and self.snapshot_dir:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(ts))
+            # The source may be a file path or URL; keep only a safe name so the JPEG stays in snapshot_dir
+            prefix = re.sub(r'[^\w.-]', '_', os.path.basename(str(source).rstrip('/\\'))) + "-" if source else ""
+            snapshot = os.path.join(self.snapshot_dir,
+                                    f"{prefix}{stamp}-{int(ts * 1000) % 1000:03d}-{kind}-{track_id}.jpg")
+            if len(self._snapshots) == self._snapshots.maxlen:
+                self.dropped += 1
+            self._snapshots.append((snapshot, frame))
+            self._wake_snapshots.set()
+        x1, y1, x2, y2 = (int(v) for v in box)
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append((ts, kind, int(cls), CLASS_NAMES.get(int(cls), str(int(cls))), float(conf),
+                             x1, y1, x2, y2, track_id, int(bool(on_screen)), snapshot, source))
+        if len(self._events) >= self.batch_size:
+            self._wake.set()
+
+    # --- writer threads ---
+    def _drain(self):
+        batch = []
+        while self._events:
+            try:
+                batch.append(self._events.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def _write_loop(self):
+        db = sqlite3.connect(self.path) if self.backend == 'sqlite' else None
+        if db is not None:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                batch = self._drain()
+                if batch:
+                    try:
+                        if db is not None:
+                            db.executemany(f"INSERT INTO events ({', '.join(FIELDS)}) VALUES "
+                                           f"({', '.join('?' * len(FIELDS))})", batch)
+                            db.commit()
+                        else:
+                            self._write_jsonl(batch)
+                        self.written += len(batch)
+                    except (OSError, sqlite3.Error) as e:
+                        self.dropped += len(batch)
+                        print(f"[WARN] Could not write {len(batch)} events: {e}")
+                if not self._running and not self._events:
+                    break
+        finally:
+            if db is not None:
+                db.close()
+            if self._file is not None:
+                self._file.close()
+
+    def _write_jsonl(self, batch):
+        if self._file is None or self._file.tell() >= self.rotate_bytes:
+            if self._file is not None:
+                self._file.close()
+                # Keep the newest file at `path`; older ones get a timestamp suffix
+                os.replace(self.path, f"{self.path[:-len('.jsonl')]}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+            self._file = open(self.path, "a")
+        self._file.write("".join(json.dumps(dict(zip(FIELDS, row))) + "\n" for row in batch))
+        self._file.flush()
+
+    def _snapshot_loop(self):
+        while self._running or self._snapshots:
+            self._wake_snapshots.wait(0.5)
+            self._wake_snapshots.clear()
+            while self._snapshots:
+                path, frame = self._snapshots.popleft()
+                try:
+                    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.snapshot_quality])
+                    if ok:
+                        with open(path, "wb") as f:
+                            f.write(buf.tobytes())
+                        self.snapshots_written += 1
+                except (OSError, cv2.error) as e:
+                    print(f"[WARN] Could not save snapshot {path}: {e}")
+
+    def stop(self, timeout=5.0):
+        """Flushes what is queued and stops the writer threads."""
+        self._running = False
+        self._wake.set()
+        self._wake_snapshots.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self):
+        return {'path': self.path, 'written': self.written, 'snapshots': self.snapshots_written,
+                'dropped': self.dropped}
+
+    def query(self, start=None, end=None, cls=None, min_conf=0.0, kind=None, limit=None, source=None):
+        return query_events(self.path, start, end, cls, min_conf, kind, limit, source)
+
+
+# --- QUERIES ---
+def query_events(path, start=None, end=None, cls=None, min_conf=0.0, kind=None, limit=None, source=None):
+    """
+    Events with start <= ts < end (wall-clock seconds), of class `cls` (id or
+    name, e.g. 'aeroplane'), conf >= min_conf and optionally one kind
+    ('detection' / 'alert') and camera `source`, oldest first, as dicts.
+    """
+    if isinstance(cls, str):
+        cls = CLASS_IDS[cls] if cls in CLASS_IDS else int(cls)
+    if path.endswith('.jsonl'):
+        return _query_jsonl(path, start, end, cls, min_conf, kind, limit, source)
+
+    where, params = ["conf >= ?"], [min_conf]
+    for clause, value in (("ts >= ?", start), ("ts < ?", end), ("cls = ?", cls), ("kind = ?", kind),
+                          ("source = ?", source)):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    sql = f"SELECT {', '.join(FIELDS)} FROM events WHERE {' AND '.join(where)} ORDER BY ts"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    with sqlite3.connect(path) as db:
+        return [dict(zip(FIELDS, row)) for row in db.execute(sql, params)]
+
+
+def _query_jsonl(path, start, end, cls, min_conf, kind, limit, source):
+    base = path[:-len('.jsonl')]
+    files = sorted(glob.glob(f"{base}-*.jsonl")) + ([path] if os.path.exists(path) else [])
+    out = []
+    for name in files:
+        with open(name) as f:
+            for line in f:
+                e = json.loads(line)
+                if (start is not None and e['ts'] < start) or (end is not None and e['ts'] >= end):
+                    continue
+                if (cls is not None and e['cls'] != cls) or e['conf'] < min_conf:
+                    continue
+                if (kind is not None and e['kind'] != kind) or (source is not None and e.get('source') != source):
+                    continue
+                out.append(e)
+    out.sort(key=lambda e: e['ts'])
+    return out[:limit] if limit else out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="events .db or .jsonl file")
+    parser.add_argument("--since", type=float, help="Only the last N seconds")
+    parser.add_argument("--class", dest="cls", help="Class name (aeroplane, bird) or id")
+    parser.add_argument("--min-conf", type=float, default=0.0)
+    parser.add_argument("--kind", choices=['detection', 'alert'])
+    parser.add_argument("--source", help="Only events from this camera (multi_camera.py stream name)")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    start = time.time() - args.since if args.since else None
+    for e in query_events(args.path, start, None, args.cls, args.min_conf, args.kind, args.limit,
+                          args.source):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e['ts']))
+        print(f"{stamp} {e.get('source') or '-':<8} {e['kind']:<9} {e['label']:<9} {e['conf']:.2f} track={e['track_id']} "
+              f"box=({e['x1']},{e['y1']},{e['x2']},{e['y2']}){' ' + e['snapshot'] if e['snapshot'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class ExclusionMap:
+    """
+    Screen zones learned from screen detections and kept between runs.
+
+    The frame is divided into cell x cell pixel cells. Every screen detection
+    adds evidence to the cells it touches; evidence decays slowly on full-frame
+    runs, so a screen that was moved fades out, and a cell is excluded once
+    its evidence reaches min_hits. Screens found in the latest result are
+    excluded straight away, before they have been learned. Every save_interval
+    seconds a copy of the evidence is written out on a background thread, so
+    the inference thread never waits on the disk.
+
+    Lookups use a summed-area table of the mask, so "does this box touch an
+    excluded cell" or "is this tile fully excluded" costs the same for any
+    box size and any number of screens.
+    """
+    def __init__(self, frame_shape, path=None, cell=16, min_hits=3, decay=0.999, save_interval=60.0):
+        self.height, self.width = frame_shape[:2]
+        self.path = path
+        self.cell = cell
+        self.min_hits = min_hits
+        self.decay = decay
+        self.save_interval = save_interval
+        self.rows = -(-self.height // cell)
+        self.cols = -(-self.width // cell)
+        self.evidence = np.zeros((self.rows, self.cols), dtype=np.float32)
+        self._current = np.zeros((self.rows, self.cols), dtype=bool)
+        self.mask = None
+        self._zones = None
+        self._last_save = time.monotonic()
+        self._saver = None
+        self.observations = 0
+        if path and os.path.exists(path):
+            self.load()
+        self._rebuild()
+
+    # --- persistence ---
+    def load(self):
+        try:
+            with np.load(self.path) as saved:
+                if tuple(saved['shape']) != (self.height, self.width) or int(saved['cell']) != self.cell:
+                    print(f"[WARN] Exclusion map {self.path} is for another frame size, learning a new one")
+                    return
+                self.evidence = saved['evidence'].astype(np.float32)
+                self.observations = int(saved['observations'])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[WARN] Could not load exclusion map {self.path}: {e}")
+            return
+        print(f"[INFO] Loaded exclusion map {self.path}: {int((self.evidence >= self.min_hits).sum())} excluded cells")
+
+    def save(self):
+        """Writes the map now (shutdown), after any background save still in progress."""
+        if not self.path:
+            return
+        if self._saver is not None:
+            self._saver.join()
+        self._write(self.evidence, self.observations)
+
+    def _save_in_background(self):
+        if self._saver is not None and self._saver.is_alive():
+            return
+        self._last_save = time.monotonic()
+        self._saver = threading.Thread(target=self._write, args=(self.evidence.copy(), self.observations),
+                                       daemon=True)
+        self._saver.start()
+
+    def _write(self, evidence, observations):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, evidence=evidence, shape=np.array([self.height, self.width]), cell=self.cell,
+                         observations=observations)
+            os.replace(tmp, self.path)  # never leave a half-written map behind
+        except OSError as e:
+            print(f"[WARN] Could not save exclusion map {self.path}: {e}")
+
+    # --- learning ---
+    def _cells(self, boxes):
+        """Cell ranges (r1, c1, r2, c2), end exclusive, touched by each (x1, y1, x2, y2) box."""
+        b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        c1, r1 = np.floor(b[:, 0] / self.cell), np.floor(b[:, 1] / self.cell)
+        # An edge on a cell boundary does not reach into the next cell; a zero-size box still touches one
+        c2 = np.maximum(np.ceil(b[:, 2] / self.cell), c1 + 1)
+        r2 = np.maximum(np.ceil(b[:, 3] / self.cell), r1 + 1)
+        r1, r2 = np.clip(r1, 0, self.rows).astype(np.int32), np.clip(r2, 0, self.rows).astype(np.int32)
+        c1, c2 = np.clip(c1, 0, self.cols).astype(np.int32), np.clip(c2, 0, self.cols).astype(np.int32)
+        return r1, c1, np.maximum(r2, r1), np.maximum(c2, c1)
+
+    def observe(self, screens, full_frame=True):
+        """
+        Learn from the (M, 4) screens of one inference result. full_frame=False
+        (tiles that may have skipped excluded areas) adds evidence without decay.
+        """
+        if full_frame:
+            self.evidence *= self.decay
+        self._current[:] = False
+        for r1, c1, r2, c2 in zip(*self._cells(screens)):
+            self.evidence[r1:r2, c1:c2] += 1.0
+            self._current[r1:r2, c1:c2] = True
+        self.observations += 1
+        self._rebuild()
+        if self.path and time.monotonic() - self._last_save > self.save_interval:
+            self._save_in_background()
+
+    def _rebuild(self):
+        mask = (self.evidence >= self.min_hits) | self._current
+        sat = np.zeros((self.rows + 1, self.cols + 1), dtype=np.int32)
+        sat[1:, 1:] = mask.cumsum(0).cumsum(1)
+        changed = self.mask is None or not np.array_equal(mask, self.mask)
+        self.mask, self._sat = mask, sat
+        if changed:
+            self._zones = None
+
+    # --- lookups ---
+    def _count(self, r1, c1, r2, c2):
+        s = self._sat
+        return s[r2, c2] - s[r1, c2] - s[r2, c1] + s[r1, c1]
+
+    def on_screen(self, targets):
+        """(N,) bool: the target box touches an excluded cell."""
+        if not len(targets):
+            return np.zeros(0, dtype=bool)
+        return self._count(*self._cells(np.asarray(targets)[:, :4])) > 0
+
+    def covers(self, region):
+        """True if every cell of (x1, y1, x2, y2) is excluded, i.e. nothing there needs inference."""
+        r1, c1, r2, c2 = (int(v[0]) for v in self._cells([region]))
+        cells = (r2 - r1) * (c2 - c1)
+        return cells > 0 and self._count(r1, c1, r2, c2) == cells
+
+    def zones(self):
+        """Bounding boxes [(x1, y1, x2, y2)] of the excluded areas in frame pixels, for drawing."""
+        zones = self._zones
+        if zones is None:
+            contours, _ = cv2.findContours(self.mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            zones = []
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                zones.append((x * self.cell, y * self.cell,
+                              min((x + w) * self.cell, self.width), min((y + h) * self.cell, self.height)))
+            self._zones = zones
+        return zones
+
+    def stats(self):
+        return {'excluded_cells': int((self.evidence >= self.min_hits).sum()), 'cells': self.rows * self.cols,
+                'observations': self.observations, 'zones': len(self.zones())}
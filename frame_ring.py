@@ -0,0 +1,124 @@
+import threading
+from contextlib import contextmanager
+
+
+class FrameRef:
+    """A borrowed, read-only view of one ring slot. Hand it back with FrameRing.release()."""
+    __slots__ = ("seq", "timestamp", "frame", "slot", "lores")
+
+    def __init__(self, seq, timestamp, frame, slot, lores=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+        self.slot = slot
+        self.lores = lores  # low-resolution inference frame captured with `frame`, if the source has one
+
+
+class FrameRing:
+    """
+    Fixed set of frame buffers shared between the capture thread and consumers.
+
+    The writer claims a free slot, the source decodes straight into it and the
+    slot is committed with the next sequence number. Consumers block in wait()
+    until a frame newer than the one they last saw exists and get it pinned,
+    without a copy. The writer never reuses a pinned slot or the newest one, so
+    a borrowed frame cannot change underneath its reader.
+
+    Size it as 2 + number of consumers that may hold a frame at the same time.
+    """
+    def __init__(self, slots=4):
+        if slots < 3:
+            raise ValueError("FrameRing needs at least 3 slots")
+        self.slots = slots
+        self._buffers = [None] * slots
+        self._lores = [None] * slots
+        self._seq = [0] * slots
+        self._ts = [0.0] * slots
+        self._pins = [0] * slots
+        self._writing = -1
+        self._latest = -1
+        self._next = 0
+        self.latest_seq = 0
+        self.closed = False
+        self.overwritten = 0  # frames replaced before anyone borrowed them
+        self._read_seq = 0
+        self._cond = threading.Condition()
+
+    # --- writer side ---
+    def claim(self, timeout=None):
+        """Returns (slot, buffer) to capture into. buffer is None until the slot was first filled."""
+        with self._cond:
+            while True:
+                for i in range(self.slots):
+                    slot = (self._next + i) % self.slots
+                    if slot != self._latest and self._pins[slot] == 0:
+                        self._next = (slot + 1) % self.slots
+                        self._writing = slot
+                        return slot, self._buffers[slot]
+                if not self._cond.wait(timeout) or self.closed:
+                    return None, None
+
+    def commit(self, slot, frame, timestamp, lores=None):
+        """Publishes `frame` in `slot`. If the source did not decode in place the array is adopted as the slot buffer."""
+        with self._cond:
+            self._buffers[slot] = frame
+            self._lores[slot] = lores
+            self.latest_seq += 1
+            if self._latest >= 0 and self._seq[self._latest] > self._read_seq:
+                self.overwritten += 1
+            self._seq[slot] = self.latest_seq
+            self._ts[slot] = timestamp
+            self._latest = slot
+            self._writing = -1
+            self._cond.notify_all()
+
+    def abandon(self, slot):
+        with self._cond:
+            self._writing = -1
+
+    # --- reader side ---
+    def wait(self, after_seq=0, timeout=None):
+        """
+        Blocks until a frame with seq > after_seq is available and returns it pinned,
+        or None on timeout / close. Always the newest frame; older ones are skipped.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.closed or self.latest_seq > after_seq, timeout):
+                return None
+            if self.latest_seq <= after_seq:
+                return None
+            return self._pin_latest()
+
+    def latest(self):
+        """Non-blocking variant of wait(): the newest frame pinned, or None before the first frame."""
+        with self._cond:
+            if self._latest < 0:
+                return None
+            return self._pin_latest()
+
+    def _pin_latest(self):
+        slot = self._latest
+        self._pins[slot] += 1
+        self._read_seq = max(self._read_seq, self._seq[slot])
+        return FrameRef(self._seq[slot], self._ts[slot], self._buffers[slot], slot, self._lores[slot])
+
+    def release(self, ref):
+        if ref is None:
+            return
+        with self._cond:
+            self._pins[ref.slot] -= 1
+            if self._pins[ref.slot] == 0:
+                self._cond.notify_all()
+
+    @contextmanager
+    def borrow(self, after_seq=0, timeout=None):
+        ref = self.wait(after_seq, timeout)
+        try:
+            yield ref
+        finally:
+            self.release(ref)
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
@@ -0,0 +1,430 @@
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+from metrics import METRICS
+
+# Check if running on RPi to import picamzero
+try:
+    from picamzero import Camera
+    HAS_PICAMZERO = True
+except ImportError:
+    HAS_PICAMZERO = False
+    print("[WARN] 'picamzero' not found. Will try standard OpenCV VideoCapture (Webcam mode).")
+
+# picamzero is built on picamera2; used directly for native-format capture
+try:
+    from picamera2 import Picamera2
+    HAS_PICAMERA2 = True
+except ImportError:
+    HAS_PICAMERA2 = False
+
+VIDEO_WIDTH = 640
+VIDEO_HEIGHT = 480
+
+
+# --- BASE INTERFACE ---
+class FrameSource:
+    """
+    A producer of BGR frames for CameraStream.
+
+    read() returns (grabbed, frame, timestamp) where timestamp is the
+    time.monotonic() capture time. A source that can never deliver another
+    frame (end of file, unplugged webcam) sets self.exhausted = True.
+
+    read(out=buf) lets the source decode into a reused buffer (see FrameRing);
+    the returned frame is `buf` when that worked and a new array otherwise.
+
+    Sources with a second, low-resolution stream for inference set self.lores
+    to the array captured together with the frame read() just returned.
+    """
+    name = "source"
+    is_live = True
+    lores = None
+
+    def __init__(self):
+        self.exhausted = False
+
+    def read(self, out=None):
+        raise NotImplementedError
+
+    def is_opened(self):
+        return not self.exhausted
+
+    def release(self):
+        pass
+
+
+# --- LIVE CAMERAS ---
+class PicamSource(FrameSource):
+    name = "picamzero"
+
+    def __init__(self, preview=True):
+        super().__init__()
+        print("[INIT] Initializing Picamzero...")
+        self.cam = Camera()
+        if preview:
+            self.cam.start_preview()  # Optional: might show HDMI preview
+        self.preview = preview
+        print("[INIT] Picamzero started successfully.")
+
+    def read(self, out=None):
+        try:
+            # picamzero capture_array returns RGB, OpenCV needs BGR.
+            image = self.cam.capture_array()
+        except Exception as e:
+            print(f"[ERROR] Picam capture error: {e}")
+            time.sleep(0.1)
+            return False, None, time.monotonic()
+
+        ts = time.monotonic()
+        if image is None:
+            time.sleep(0.01)
+            return False, None, ts
+        with METRICS.time('convert'):
+            if out is not None and out.shape == image.shape:
+                frame = cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=out)
+            else:
+                frame = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        return True, frame, ts
+
+    def release(self):
+        try:
+            if self.preview:
+                self.cam.stop_preview()
+            self.cam.close()
+        except Exception:
+            pass
+
+
+class Picamera2Source(FrameSource):
+    """
+    Native-format Pi camera capture through picamera2.
+
+    The main stream is requested as RGB888, which libcamera stores as B, G, R
+    bytes - already OpenCV order, so no cvtColor runs per frame. With
+    lores_size=(w, h) a low-resolution YUV420 stream is captured from the same
+    request and exposed as self.lores, so the detector letterboxes that instead
+    of resizing the full frame (see preprocess.LetterboxDetector).
+
+    `camera` may be any object with the Picamera2 calls used here
+    (create_video_configuration, configure, start, capture_arrays, stop,
+    close), e.g. FakePicamera2.
+    """
+    name = "picamera2"
+
+    def __init__(self, width=VIDEO_WIDTH, height=VIDEO_HEIGHT, lores_size=None, camera=None):
+        super().__init__()
+        print("[INIT] Initializing picamera2 (native BGR main stream"
+              f"{f', {lores_size[0]}x{lores_size[1]} lores' if lores_size else ''})...")
+        self.cam = camera if camera is not None else Picamera2()
+        streams = {'main': {'size': (width, height), 'format': 'RGB888'}}
+        if lores_size:
+            streams['lores'] = {'size': tuple(lores_size), 'format': 'YUV420'}
+        self.cam.configure(self.cam.create_video_configuration(**streams))
+        self.cam.start()
+        self._names = list(streams)
+
+    def read(self, out=None):
+        try:
+            arrays, _ = self.cam.capture_arrays(self._names)
+        except Exception as e:
+            print(f"[ERROR] Picamera2 capture error: {e}")
+            time.sleep(0.1)
+            return False, None, time.monotonic()
+        # Fresh arrays from picamera2: the ring adopts them instead of copying into `out`
+        self.lores = arrays[1] if len(arrays) > 1 else None
+        return True, arrays[0], time.monotonic()
+
+    def release(self):
+        try:
+            self.cam.stop()
+            self.cam.close()
+        except Exception:
+            pass
+
+
+class FakePicamera2:
+    """
+    Stand-in for picamera2.Picamera2 driven by SyntheticSource, with the same
+    calls and array layouts (main: BGR 'RGB888'; lores: planar YUV420 of shape
+    (h * 3 / 2, w)). Exercises Picamera2Source without a Pi: --source fakepicam.
+    """
+    def __init__(self, realtime=True, num_targets=1):
+        self.realtime = realtime
+        self.num_targets = num_targets
+        self.config = None
+        self.started = False
+        self._scene = None
+
+    def create_video_configuration(self, main=None, lores=None, **kwargs):
+        return {'main': main or {'size': (VIDEO_WIDTH, VIDEO_HEIGHT), 'format': 'RGB888'}, 'lores': lores}
+
+    def configure(self, config):
+        self.config = config
+        width, height = config['main']['size']
+        self._scene = SyntheticSource(width, height, num_targets=self.num_targets, realtime=self.realtime)
+
+    def start(self):
+        self.started = True
+
+    def capture_arrays(self, names):
+        if not self.started:
+            raise RuntimeError("camera not started")
+        grabbed, frame, _ = self._scene.read()
+        if not grabbed:
+            raise RuntimeError("synthetic scene exhausted")
+        arrays = []
+        for name in names:
+            if name == 'lores':
+                size = tuple(self.config['lores']['size'])
+                small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                arrays.append(cv2.cvtColor(small, cv2.COLOR_BGR2YUV_I420))
+            else:
+                arrays.append(frame)
+        return arrays, {'SensorTimestamp': time.monotonic_ns()}
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        pass
+
+
+class OpenCVSource(FrameSource):
+    name = "opencv"
+
+    def __init__(self, src=0, width=VIDEO_WIDTH, height=VIDEO_HEIGHT):
+        super().__init__()
+        # Fallback for Windows or standard USB webcams
+        if platform.system() == 'Windows':
+            self.stream = cv2.VideoCapture(src, cv2.CAP_DSHOW)
+        else:
+            self.stream = cv2.VideoCapture(src)
+
+        self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if not self.stream.isOpened():
+            self.exhausted = True
+
+    def read(self, out=None):
+        if self.exhausted:
+            return False, None, time.monotonic()
+
+        grabbed, frame = self.stream.read(out) if out is not None else self.stream.read()
+        ts = time.monotonic()
+        if not grabbed:
+            self.exhausted = True
+        return grabbed, frame, ts
+
+    def is_opened(self):
+        return not self.exhausted and self.stream.isOpened()
+
+    def release(self):
+        self.stream.release()
+
+
+# --- RECORDED FOOTAGE ---
+class VideoFileSource(FrameSource):
+    """
+    Replays a recorded clip.
+
+    realtime=True sleeps so frames come out at their original timestamps
+    (scaled by speed), like a live camera would deliver them.
+    realtime=False delivers frames as fast as they decode, for throughput runs.
+    """
+    name = "file"
+    is_live = False
+
+    def __init__(self, path, realtime=True, speed=1.0, loop=False):
+        super().__init__()
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Video file not found: {path}")
+
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.stream = cv2.VideoCapture(path)
+        if not self.stream.isOpened():
+            raise IOError(f"Could not open video file: {path}")
+
+        fps = self.stream.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.frame_index = 0
+        self.media_time = 0.0
+        self._clock_start = None
+        self._media_start = 0.0
+
+    def _media_timestamp(self):
+        # CAP_PROP_POS_MSEC is the timestamp of the *next* frame on most backends,
+        # so fall back to the nominal frame rate when the container has none.
+        pos_ms = self.stream.get(cv2.CAP_PROP_POS_MSEC)
+        if pos_ms and pos_ms > 0:
+            return pos_ms / 1000.0
+        return self.frame_index / self.fps
+
+    def _rewind(self):
+        self.stream.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.frame_index = 0
+        self._clock_start = None
+
+    def _decode(self, out):
+        return self.stream.read(out) if out is not None else self.stream.read()
+
+    def read(self, out=None):
+        if self.exhausted:
+            return False, None, time.monotonic()
+
+        grabbed, frame = self._decode(out)
+        if not grabbed and self.loop and self.frame_index > 0:
+            self._rewind()
+            grabbed, frame = self._decode(out)
+        if not grabbed:
+            self.exhausted = True
+            return False, None, time.monotonic()
+
+        self.media_time = self._media_timestamp()
+        self.frame_index += 1
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._clock_start is None:
+                self._clock_start = now
+                self._media_start = self.media_time
+            due = self._clock_start + (self.media_time - self._media_start) / self.speed
+            if due > now:
+                time.sleep(due - now)
+
+        return True, frame, time.monotonic()
+
+    def release(self):
+        self.stream.release()
+
+
+# --- SYNTHETIC SCENE ---
+class SyntheticSource(FrameSource):
+    """
+    Deterministic sky with small dark targets bouncing around.
+
+    Needs no camera and no footage, so a pipeline change can be measured the same
+    way on any Linux box. Ground truth boxes of the last frame are in self.targets.
+    """
+    name = "synthetic"
+    is_live = False
+
+    def __init__(self, width=VIDEO_WIDTH, height=VIDEO_HEIGHT, fps=30.0, num_targets=1,
+                 target_size=24, noise=4, realtime=True, max_frames=None, seed=0):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.realtime = realtime
+        self.max_frames = max_frames
+        self.noise = noise
+        self.frame_index = 0
+        self.targets = np.zeros((0, 4), dtype=np.int32)
+        self._next_due = None
+
+        rng = np.random.default_rng(seed)
+        self._rng = rng
+        size = np.full(num_targets, target_size, dtype=np.float32)
+        self._size = size
+        self._pos = rng.uniform([0, 0], [width - target_size, height - target_size],
+                                size=(num_targets, 2)).astype(np.float32)
+        self._vel = rng.uniform(-4.0, 4.0, size=(num_targets, 2)).astype(np.float32)
+
+        # Vertical sky gradient, light at the horizon
+        column = np.linspace(200, 140, height, dtype=np.float32)
+        sky = np.empty((height, width, 3), dtype=np.uint8)
+        sky[:, :, 0] = column[:, None] + 40  # B
+        sky[:, :, 1] = column[:, None] + 10  # G
+        sky[:, :, 2] = column[:, None] - 20  # R
+        self._background = sky
+
+    def _step(self):
+        self._pos += self._vel
+        limit = np.stack([self.width - self._size, self.height - self._size], axis=1)
+        bounce = (self._pos < 0) | (self._pos > limit)
+        self._vel[bounce] *= -1
+        np.clip(self._pos, 0, limit, out=self._pos)
+
+    def read(self, out=None):
+        if self.max_frames is not None and self.frame_index >= self.max_frames:
+            self.exhausted = True
+        if self.exhausted:
+            return False, None, time.monotonic()
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_due is None:
+                self._next_due = now
+            if self._next_due > now:
+                time.sleep(self._next_due - now)
+            self._next_due += 1.0 / self.fps
+
+        if out is not None and out.shape == self._background.shape:
+            frame = out
+        else:
+            frame = np.empty_like(self._background)
+        if self.noise:
+            jitter = self._rng.integers(-self.noise, self.noise + 1, size=frame.shape[:2], dtype=np.int16)
+            noisy = self._background.astype(np.int16) + jitter[:, :, None]
+            np.clip(noisy, 0, 255, out=noisy)
+            frame[...] = noisy
+        else:
+            np.copyto(frame, self._background)
+
+        boxes = []
+        for (x, y), s in zip(self._pos.astype(int), self._size.astype(int)):
+            # Cross-shaped silhouette, roughly quadcopter-like at this scale
+            cx, cy = x + s // 2, y + s // 2
+            cv2.line(frame, (x, y), (x + s, y + s), (30, 30, 30), max(2, s // 8))
+            cv2.line(frame, (x + s, y), (x, y + s), (30, 30, 30), max(2, s // 8))
+            cv2.circle(frame, (cx, cy), max(2, s // 5), (20, 20, 20), -1)
+            boxes.append((x, y, x + s, y + s))
+        self.targets = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+        self._step()
+        self.frame_index += 1
+        return True, frame, time.monotonic()
+
+
+# --- FACTORY ---
+def open_source(spec=0, realtime=True, loop=False, width=VIDEO_WIDTH, height=VIDEO_HEIGHT, lores_size=None):
+    """
+    Builds a FrameSource from a CLI-style spec:
+      0, "1"            -> camera index (picamera2, else picamzero, else OpenCV)
+      "synthetic[:N]"   -> SyntheticSource with N targets
+      "fakepicam[:N]"   -> Picamera2Source on a FakePicamera2 with N targets
+      "path/clip.mp4"   -> VideoFileSource
+    lores_size=(w, h) asks picamera2 sources for a low-resolution inference stream.
+    """
+    if isinstance(spec, str) and spec.isdigit():
+        spec = int(spec)
+
+    if isinstance(spec, int):
+        if HAS_PICAMERA2 and platform.system() != 'Windows':
+            try:
+                return Picamera2Source(width, height, lores_size)
+            except Exception as e:
+                print(f"[ERROR] Picamera2 init failed: {e}. Trying picamzero / OpenCV.")
+        if HAS_PICAMZERO and platform.system() != 'Windows':
+            try:
+                return PicamSource()
+            except Exception as e:
+                print(f"[ERROR] Picamzero init failed: {e}. Falling back to OpenCV.")
+        return OpenCVSource(spec, width, height)
+
+    if spec.startswith("fakepicam"):
+        _, _, count = spec.partition(":")
+        return Picamera2Source(width, height, lores_size, camera=FakePicamera2(realtime, int(count or 1)))
+
+    if spec.startswith("synthetic"):
+        _, _, count = spec.partition(":")
+        return SyntheticSource(width, height, num_targets=int(count or 1), realtime=realtime)
+
+    return VideoFileSource(spec, realtime=realtime, loop=loop)
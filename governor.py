@@ -0,0 +1,223 @@
+import json
+import threading
+import time
+from collections import deque
+
+from evaluation import percentile
+from metrics import METRICS
+
+SIZES = (256, 320, 416)
+INTERVALS = (0.0, 0.1, 0.25, 0.5, 1.0)  # minimum seconds between inference runs
+
+
+class Governor:
+    """
+    Keeps detection latency inside a budget by changing settings at runtime.
+
+    Every `period` seconds it looks at the p95 of recent inference latencies
+    and at the SoC temperature / throttle state (METRICS.system()):
+
+    - over budget, too hot or throttled: step down one rung, in this order:
+      smaller imgsz, then a slower inference cadence, then a lighter model.
+    - comfortably under budget (p95 < headroom * budget) and cool: step back
+      up one rung, undoing the last step down first.
+
+    One step per period at most, so the effect of a change is measured before
+    the next one. Every decision is printed, kept in self.decisions and
+    optionally appended to a JSON-lines log for auditing.
+
+    `variants` are model files ordered from most to least accurate; the first
+    one is where the governor starts.
+
+    A new model or imgsz takes effect only once the caller has loaded it:
+    until confirm() no further decisions are made (the latencies would still
+    be the old model's), and reject() reverts to the running settings and
+    never offers that model / size again.
+    """
+    def __init__(self, budget_ms=400.0, imgsz=320, sizes=SIZES, intervals=INTERVALS, variants=('yolov8n.pt',),
+                 temp_limit=75.0, temp_hysteresis=5.0, headroom=0.6, period=5.0, window=20, log_path=None):
+        self.budget = budget_ms / 1000.0
+        self.sizes = sorted(set(sizes) | {imgsz})
+        self.intervals = tuple(intervals)
+        self.variants = tuple(variants)
+        self.temp_limit = temp_limit
+        self.temp_hysteresis = temp_hysteresis
+        self.headroom = headroom
+        self.period = period
+        self.log_path = log_path
+
+        self._size = self.sizes.index(imgsz)
+        self._interval = 0
+        self._variant = 0
+        self._latencies = deque(maxlen=window)
+        self._last_decision = time.monotonic()
+        self._running = (self.model_name, self.imgsz)  # what the caller's model actually is
+        self._rejected = set()  # (model, imgsz or None = every size) that failed to load
+        self.decisions = []
+        self._publish()
+
+    @property
+    def imgsz(self):
+        return self.sizes[self._size]
+
+    @property
+    def interval(self):
+        return self.intervals[self._interval]
+
+    @property
+    def model_name(self):
+        return self.variants[self._variant]
+
+    @property
+    def pending(self):
+        """True while the chosen model / imgsz has not been confirmed as running."""
+        return (self.model_name, self.imgsz) != self._running
+
+    def confirm(self, model_name, imgsz, now=None):
+        """The caller now runs `model_name` at `imgsz`; measure it from scratch."""
+        self._running = (model_name, imgsz)
+        self._latencies.clear()
+        self._last_decision = time.monotonic() if now is None else now
+
+    def reject(self, model_name, imgsz=None):
+        """`model_name` (at `imgsz`, or at any size) could not be loaded: go back to the running settings."""
+        self._rejected.add((model_name, imgsz))
+        name, size = self._running
+        self._variant = self.variants.index(name)
+        self._size = self.sizes.index(size)
+        self._decide('load_failed', None, None, False)
+
+    def _is_rejected(self):
+        return (self.model_name, self.imgsz) in self._rejected or (self.model_name, None) in self._rejected
+
+    def settings(self):
+        return {'imgsz': self.imgsz, 'interval_s': self.interval, 'model': self.model_name}
+
+    def record(self, seconds):
+        self._latencies.append(seconds)
+
+    def _step_down(self):
+        if self._size > 0:
+            self._size -= 1
+        elif self._interval < len(self.intervals) - 1:
+            self._interval += 1
+        elif self._variant < len(self.variants) - 1:
+            self._variant += 1
+        else:
+            return False
+        return True
+
+    def _step_up(self):
+        if self._variant > 0:
+            self._variant -= 1
+        elif self._interval > 0:
+            self._interval -= 1
+        elif self._size < len(self.sizes) - 1:
+            self._size += 1
+        else:
+            return False
+        return True
+
+    def update(self, now=None):
+        """Call after each inference; returns the decision dict when settings changed, else None."""
+        now = time.monotonic() if now is None else now
+        if self.pending or now - self._last_decision < self.period or \
+                len(self._latencies) < self._latencies.maxlen // 2:
+            return None
+        self._last_decision = now
+
+        p95 = percentile(list(self._latencies), 95)
+        system = METRICS.system()
+        temp = system.get('soc_temperature_celsius')
+        throttled = bool(system.get('throttled') or system.get('freq_capped') or system.get('soft_temp_limit'))
+        hot = temp is not None and temp >= self.temp_limit
+        cool = temp is None or temp < self.temp_limit - self.temp_hysteresis
+
+        if throttled or hot or p95 > self.budget:
+            reason = 'throttled' if throttled else 'hot' if hot else 'over_budget'
+            step = self._step_down
+        elif p95 < self.headroom * self.budget and cool:
+            reason = 'headroom'
+            step = self._step_up
+        else:
+            return None
+        state = (self._size, self._interval, self._variant)
+        changed = step()
+        while changed and self._is_rejected():
+            changed = step()  # skip rungs that failed to load
+        if not changed:
+            self._size, self._interval, self._variant = state
+            return None
+        return self._decide(reason, p95, temp, throttled)
+
+    def _decide(self, reason, p95, temp, throttled):
+        self._latencies.clear()  # measure the new settings from scratch
+        decision = {'time': time.time(), 'reason': reason, 'p95_ms': None if p95 is None else p95 * 1000.0,
+                    'budget_ms': self.budget * 1000.0, 'temp_c': temp, 'throttled': throttled}
+        decision.update(self.settings())
+        self.decisions.append(decision)
+        self._publish()
+        p95_text = 'n/a' if p95 is None else f"{decision['p95_ms']:.0f}ms"
+        print(f"[GOV] {reason}: p95={p95_text} temp={temp} -> imgsz={self.imgsz} "
+              f"interval={self.interval}s model={self.model_name}")
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(decision) + "\n")
+        return decision
+
+    def _publish(self):
+        METRICS.set_gauge('governor_imgsz', self.imgsz)
+        METRICS.set_gauge('governor_interval_seconds', self.interval)
+        METRICS.set_gauge('governor_model_index', self._variant)
+
+    def summary(self):
+        return {'decisions': self.decisions, 'final': self.settings()}
+
+
+class ModelPool:
+    """
+    Detectors keyed by (model, imgsz), loaded in a background thread so a
+    governor change never stalls the inference loop: get() returns None until
+    the requested model is ready, and the caller keeps using the old one.
+
+    PyTorch models take any imgsz, so only exported backends load one model
+    per size (each export is cached on disk by detector_backend).
+    """
+    def __init__(self, loader, backend='torch'):
+        self.loader = loader  # loader(model_name, backend, imgsz) -> model
+        self.backend = backend
+        self._models = {}
+        self._loading = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def _key(self, model_name, imgsz):
+        return (model_name, None if self.backend == 'torch' else imgsz)
+
+    def put(self, model_name, imgsz, model):
+        self._models[self._key(model_name, imgsz)] = model
+
+    def get(self, model_name, imgsz):
+        key = self._key(model_name, imgsz)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            if key in self._loading or key in self._failed:
+                return None
+            self._loading.add(key)
+        threading.Thread(target=self._load, args=(key, model_name, imgsz), daemon=True).start()
+        return None
+
+    def failed(self, model_name, imgsz):
+        return self._key(model_name, imgsz) in self._failed
+
+    def _load(self, key, model_name, imgsz):
+        try:
+            self._models[key] = self.loader(model_name, self.backend, imgsz)
+        except Exception as e:
+            print(f"[WARN] Could not load {model_name} at imgsz={imgsz}: {e}")
+            self._failed.add(key)
+        finally:
+            with self._lock:
+                self._loading.discard(key)
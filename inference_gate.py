@@ -0,0 +1,78 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class InferenceGate:
+    """
+    Decides, before model(...), whether a frame is worth running YOLO on.
+
+    - A frame (sequence number) that was already processed is always skipped.
+    - The frame is shrunk to a tiny grayscale thumbnail and compared against a
+      running-average background; if too few pixels changed, it is skipped.
+    - While the previous inference still saw targets, every frame runs, so a
+      hovering drone is never gated out.
+    - A full inference is forced every refresh_interval seconds regardless.
+    """
+    def __init__(self, motion_threshold=0.002, pixel_delta=12, thumb_width=96,
+                 refresh_interval=2.0, background_alpha=0.05):
+        self.motion_threshold = motion_threshold  # fraction of thumbnail pixels that must change
+        self.pixel_delta = pixel_delta            # gray-level difference counted as change
+        self.thumb_width = thumb_width
+        self.refresh_interval = refresh_interval
+        self.background_alpha = background_alpha
+
+        self._background = None
+        self._last_seq = 0
+        self._last_run = 0.0
+        self._targets_active = False
+        self.last_motion = 0.0
+        self.counters = {'run': 0, 'forced': 0, 'skipped_duplicate': 0, 'skipped_static': 0}
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.thumb_width, max(1, int(h * self.thumb_width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def _motion(self, thumb):
+        if self._background is None or self._background.shape != thumb.shape:
+            self._background = thumb.copy()
+            return 1.0
+        changed = np.count_nonzero(cv2.absdiff(thumb, self._background) > self.pixel_delta)
+        cv2.accumulateWeighted(thumb, self._background, self.background_alpha)
+        return changed / float(thumb.size)
+
+    def check(self, seq, frame, now=None):
+        """Returns (run, reason). reason is one of the counter names."""
+        if seq <= self._last_seq:
+            self.counters['skipped_duplicate'] += 1
+            return False, 'skipped_duplicate'
+        self._last_seq = seq
+
+        now = time.monotonic() if now is None else now
+        self.last_motion = self._motion(self._thumbnail(frame))
+
+        if self._targets_active or self.last_motion >= self.motion_threshold:
+            reason = 'run'
+        elif now - self._last_run >= self.refresh_interval:
+            reason = 'forced'
+        else:
+            self.counters['skipped_static'] += 1
+            return False, 'skipped_static'
+
+        self._last_run = now
+        self.counters[reason] += 1
+        return True, reason
+
+    def mark_result(self, has_targets):
+        """Feed back whether the last inference found targets."""
+        self._targets_active = bool(has_targets)
+
+    def stats(self):
+        skipped = self.counters['skipped_duplicate'] + self.counters['skipped_static']
+        ran = self.counters['run'] + self.counters['forced']
+        return dict(self.counters, total_run=ran, total_skipped=skipped)
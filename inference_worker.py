@@ -0,0 +1,205 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detector_backend import cached_artifact
+
+MAX_DET = 100  # rows per result record; YOLO nano rarely gets close on sky footage
+
+
+def _worker_main(worker_id, artifact, backend, imgsz, conf, iou, threads, frame_names, result_names, tasks, results):
+    # Runs in a spawned process: own interpreter, own GIL, own copy of the model.
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from detector_backend import load_detector
+    from postprocess import boxes_from_results
+
+    frames = [shared_memory.SharedMemory(name=n) for n in frame_names]
+    outs = [shared_memory.SharedMemory(name=n) for n in result_names]
+    try:
+        try:
+            model = load_detector(artifact, backend, imgsz, artifact=artifact)
+        except Exception as e:
+            results.put(('failed', worker_id, f"{type(e).__name__}: {e}"))  # start() raises on this at once
+            return
+        results.put(('ready', worker_id, os.getpid()))
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            job_id, slot, shape = task
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=frames[slot].buf)
+            out = np.ndarray((MAX_DET, 6), dtype=np.float32, buffer=outs[slot].buf)
+            start = time.monotonic()
+            try:
+                res = model(frame, imgsz=imgsz, conf=conf, verbose=False, iou=iou)
+                data = boxes_from_results(res)
+                count = min(len(data), MAX_DET)
+                out[:count] = data[:count]
+                results.put(('done', job_id, slot, count, time.monotonic() - start, worker_id))
+            except Exception as e:
+                results.put(('error', job_id, slot, 0, time.monotonic() - start, f"{type(e).__name__}: {e}"))
+    finally:
+        for shm in frames + outs:
+            shm.close()
+
+
+class ProcessDetector:
+    """
+    YOLO in one or more worker processes, so inference does not share the GIL
+    with capture, drawing and imshow.
+
+    Each slot is a pair of shared-memory blocks: one frame (written once by
+    submit()) and one fixed-size (MAX_DET, 6) float32 result record. Only
+    (job id, slot, count) tuples cross the process boundary through queues.
+    With workers > 1 consecutive frames are pipelined across cores, and
+    collect() can return jobs out of submission order.
+
+    Each worker has its own task queue, so when one dies mid-run (OOM killer,
+    a crash in torch) collect() knows which jobs went with it: they are failed
+    and their slots reused, and the other workers carry on.
+    """
+    def __init__(self, model_name, imgsz=320, conf=0.5, iou=0.45, workers=1, slots=None,
+                 frame_shape=(480, 640, 3), backend='torch'):
+        self.workers = max(1, workers)
+        self.slots = slots or self.workers + 1
+        self.frame_bytes = int(np.prod(frame_shape))
+        self._ctx = mp.get_context('spawn')  # forking a process with torch threads is not safe
+        self._tasks = [self._ctx.Queue() for _ in range(self.workers)]
+        self._results = self._ctx.Queue()
+        self._frames = [shared_memory.SharedMemory(create=True, size=self.frame_bytes) for _ in range(self.slots)]
+        self._outs = [shared_memory.SharedMemory(create=True, size=MAX_DET * 6 * 4) for _ in range(self.slots)]
+        self._free = list(range(self.slots))
+        self._jobs = {}  # job_id -> (slot, submit_time, meta, worker_id)
+        self._alive = set(range(self.workers))
+        self._next_job = 1
+        self.errors = 0
+        self.busy_seconds = [0.0] * self.workers
+
+        threads = max(1, (os.cpu_count() or 4) // self.workers)
+        # Export (if needed) once here, not concurrently in every worker
+        artifact = cached_artifact(model_name, backend, imgsz)
+        self._procs = [
+            self._ctx.Process(target=_worker_main, daemon=True,
+                              args=(i, artifact, backend, imgsz, conf, iou, threads,
+                                    [s.name for s in self._frames], [s.name for s in self._outs],
+                                    self._tasks[i], self._results))
+            for i in range(self.workers)
+        ]
+
+    def start(self, timeout=120.0):
+        for p in self._procs:
+            p.start()
+        ready = 0
+        deadline = time.monotonic() + timeout
+        try:
+            while ready < self.workers:
+                try:
+                    msg = self._results.get(timeout=0.5)
+                except queue.Empty:
+                    # A worker that died before reporting (crash, killed) never sends anything
+                    dead = [(i, p.exitcode) for i, p in enumerate(self._procs) if not p.is_alive()]
+                    if dead:
+                        raise RuntimeError(f"Inference worker {dead[0][0]} exited during start-up "
+                                           f"(exit code {dead[0][1]})")
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Only {ready}/{self.workers} inference workers started")
+                    continue
+                if msg[0] == 'failed':
+                    raise RuntimeError(f"Inference worker {msg[1]} could not load the model: {msg[2]}")
+                if msg[0] == 'ready':
+                    ready += 1
+                    print(f"[INIT] Inference worker {msg[1]} ready (pid {msg[2]})")
+        except RuntimeError:
+            self.stop()  # don't leave the other workers or the shared memory behind
+            raise
+        return self
+
+    def free_slots(self):
+        return len(self._free)
+
+    def pending(self):
+        return len(self._jobs)
+
+    def submit(self, frame, meta=None):
+        """Copies frame into a free slot and queues it. Returns the job id, or None if all slots are busy."""
+        if not self._free:
+            return None
+        if frame.nbytes > self.frame_bytes or frame.dtype != np.uint8:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not fit a {self.frame_bytes} byte slot")
+        if not self._alive:
+            raise RuntimeError("No inference workers left")
+        slot = self._free.pop()
+        np.copyto(np.ndarray(frame.shape, dtype=np.uint8, buffer=self._frames[slot].buf), frame)
+        job_id = self._next_job
+        self._next_job += 1
+        # The least busy live worker
+        load = {w: 0 for w in self._alive}
+        for job in self._jobs.values():
+            if job[3] in load:
+                load[job[3]] += 1
+        worker = min(load, key=load.get)
+        self._jobs[job_id] = (slot, time.monotonic(), meta, worker)
+        self._tasks[worker].put((job_id, slot, frame.shape))
+        return job_id
+
+    def _reap(self):
+        # A dead worker never answers its jobs; fail them and take their slots back
+        # (it can no longer write to them). Raises once no worker is left.
+        for i in [i for i in self._alive if not self._procs[i].is_alive()]:
+            self._alive.discard(i)
+            lost = [job_id for job_id, job in self._jobs.items() if job[3] == i]
+            for job_id in lost:
+                self._free.append(self._jobs.pop(job_id)[0])
+            self.errors += len(lost)
+            print(f"[ERROR] Inference worker {i} died (exit code {self._procs[i].exitcode}), "
+                  f"{len(lost)} job(s) lost; {len(self._alive)} worker(s) left")
+        if not self._alive:
+            raise RuntimeError("All inference workers died")
+
+    def collect(self, timeout=0.0):
+        """
+        Finished jobs as [(job_id, meta, detections (N, 6))]. Waits up to
+        timeout for the first one, then drains whatever else is ready.
+        """
+        self._reap()
+        done = []
+        block = timeout > 0
+        while self._jobs:
+            try:
+                msg = self._results.get(timeout=timeout) if block else self._results.get_nowait()
+            except queue.Empty:
+                break
+            block = False
+            kind, job_id, slot, count = msg[:4]
+            if job_id not in self._jobs:
+                continue  # answered by a worker that died right after; _reap() already failed it
+            meta = self._jobs.pop(job_id)[2]
+            if kind == 'done':
+                self.busy_seconds[msg[5]] += msg[4]
+                out = np.ndarray((MAX_DET, 6), dtype=np.float32, buffer=self._outs[slot].buf)
+                done.append((job_id, meta, out[:count].copy()))
+            else:
+                self.errors += 1
+                print(f"[ERROR] Inference worker failed on job {job_id}: {msg[5]}")
+            self._free.append(slot)
+        return done
+
+    def stop(self):
+        for tasks in self._tasks:
+            tasks.put(None)
+        for p in self._procs:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        for shm in self._frames + self._outs:
+            shm.close()
+            shm.unlink()
@@ -1,157 +1,126 @@
 
-import os
 import sys
 import subprocess
 import time
 import math
-import threading
+import argparse
+
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 # --- AUTO-INSTALL DEPENDENCIES ---
 def install(package):
     print(f"[INFO] Installing {package}...")
     subprocess.check_call([sys.executable, "-m", "pip", "install", package])
 
-required_packages = ["opencv-python", "ultralytics", "winsound"] # winsound is windows only, handle gracefully
-for package in required_packages:
-    try:
-        if package == "opencv-python":
-            import cv2
-        elif package == "ultralytics":
-            from ultralytics import YOLO
-        elif package == "winsound":
-            if os.name == 'nt':
-                 import winsound
-    except ImportError:
+# Only *locate* the packages (find_spec): importing ultralytics/torch just to check
+# costs seconds at every start, and pip only needs to run when one is missing.
+required_packages = {"opencv-python": "cv2", "ultralytics": "ultralytics"} # winsound is part of Windows Python
+for package, module in required_packages.items():
+    if importlib.util.find_spec(module) is None:
         try:
-            if package == "winsound" and os.name != 'nt':
-                continue # Skip winsound on RPi
             install(package)
         except Exception as e:
             print(f"[WARN] Failed to install {package}: {e}")
 
-# Re-import after install
 import cv2
-from ultralytics import YOLO
-
-# Handle Platform Specifics
-IS_WINDOWS = os.name == 'nt'
-if IS_WINDOWS:
-    import winsound
 
 # --- CONFIGURATION (RPi Optimized) ---
 MODEL_NAME = 'yolov8n.pt' # Nano model is invalid for RPi, best speed/acc tradeoff
 INFERENCE_SIZE = 320     # 320x320 for max FPS. 640 is too slow on RPi 4 CPU.
 CONF_THRESHOLD = 0.5     # High confidence to avoid false positives
+MAX_STALENESS_MS = 1000  # Frames older than this when the model is free are dropped (0 = never)
+STREAM_PORT = 8080       # --headless: annotated video as MJPEG on http://127.0.0.1:8080/
+EVENTS_PATH = "events/events.db"   # Alert log (see event_store.py)
+SNAPSHOT_DIR = "events/snapshots"
 
 # --- CAMERA STREAM (Threaded) ---
-class CameraStream:
-    def __init__(self, src=0):
-        # Linux/RPi usually works best with default
-        self.stream = cv2.VideoCapture(src)
-        if IS_WINDOWS:
-            self.stream = cv2.VideoCapture(src, cv2.CAP_DSHOW)
-            
-        # Set resolution to reasonable default (e.g. 640x480)
-        self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        
-        (self.grabbed, self.frame) = self.stream.read()
-        self.stopped = False
-
-    def start(self):
-        threading.Thread(target=self.update, args=()).start()
-        return self
-
-    def update(self):
-        while True:
-            if self.stopped:
-                self.stream.release()
-                return
-
-            (grabbed, frame) = self.stream.read()
-            if not grabbed:
-                self.stop()
-                return
-            
-            self.grabbed = grabbed
-            self.frame = frame
-
-    def read(self):
-        return self.frame
-
-    def stop(self):
-        self.stopped = True
+from camera_stream import CameraStream
+from postprocess import CONF, CLS, process_results
+from stream_server import MjpegStreamer
+from overlay import SpriteCache, blit, blit_text
+from event_store import EventStore
+from postprocess import AEROPLANE
+from alert_dispatch import AlertDispatcher, BellChannel, WebhookChannel, print_stats
+from pipeline import BLOCK, DROP_OLDEST, BoundedQueue, Pipeline, Stage, print_pipeline_stats, ring_source
+
+# Labels and banners are rendered once and then blitted (see overlay.py)
+SPRITES = SpriteCache()
 
 # --- ALERT SYSTEM (Simplified) ---
 class AlertSystem:
-    def __init__(self):
-        self.alert_active = False
+    def __init__(self, events=None, dispatcher=None):
+        self.events = events
+        self.dispatcher = dispatcher # Bell / webhook delivery on worker threads (alert_dispatch.py)
+        self.last_alert = 0
+        self.episode_gap = 2.0 # Seconds without a drone before the next sighting is logged as a new alert
 
     def trigger_visual_alert(self, img, text="DRONE DETECTED"):
         h, w, _ = img.shape
-        cv2.rectangle(img, (0, 0), (w, 50), (0, 0, 255), -1)  # Red banner
-        cv2.putText(img, text, (int(w/2) - 150, 35), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        blit(img, SPRITES.banner(w, text, text_x=int(w/2) - 150), 0, 0)  # Red banner
         return img
 
-    def trigger_audio_alert(self):
-        if not self.alert_active:
-            self.alert_active = True
-            threading.Thread(target=self._play_sound).start()
+    def trigger_audio_alert(self, confidence=None):
+        # Queued, never blocks; repeats while the drone stays in view are coalesced by the dispatcher
+        if self.dispatcher is not None:
+            self.dispatcher.dispatch('drone', "DRONE DETECTED", conf=confidence)
 
-    def _play_sound(self):
-        try:
-            if IS_WINDOWS:
-                winsound.Beep(1000, 500)
-            else:
-                # RPi / Linux Sound - requires a beep utility or just print
-                print('\a') # Terminal bell
-        except Exception as e:
-            print(f"[ERROR] Sound error: {e}")
-        self.alert_active = False
-
-    def log_alert(self, class_name, confidence):
+    def log_alert(self, class_name, confidence, box=None, frame=None):
         print(f"[ALERT] {class_name} detected with confidence {confidence}")
+        # One event (and snapshot) per sighting, not one per frame the drone stays in view
+        now = time.monotonic()
+        new_alert = now - self.last_alert > self.episode_gap
+        self.last_alert = now
+        if new_alert and self.events is not None and box is not None:
+            snapshot = frame.copy() if frame is not None else None
+            self.events.record('alert', AEROPLANE, confidence, box, frame=snapshot)
 
 # --- HELPER FUNCTIONS ---
 def draw_text_rect(img, text, pos, scale=1, thickness=1, colorT=(255, 255, 255), colorR=(255, 0, 255), offset=10):
     """
-    Replica of cvzone.putTextRect using pure cv2
+    Replica of cvzone.putTextRect using pure cv2 (box and text come from the sprite cache)
     """
     x, y = pos
-    (w, h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    sprite = SPRITES.label(text, colorT, scale, thickness, background=colorR, pad=offset)
+    blit_text(img, sprite, x - offset, y)
+    h, w = sprite.ascent - offset, sprite.alpha.shape[1] - 2 * offset
     x1, y1, x2, y2 = x - offset, y + offset, x + w + offset, y - h - offset
-    
-    cv2.rectangle(img, (x1, y1), (x2, y2), colorR, cv2.FILLED)
-    cv2.putText(img, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, colorT, thickness)
     return x1, y1, x2, y2
 
-def is_overlap(box1, box2):
-    x1_min, y1_min, x1_max, y1_max = box1
-    x2_min, y2_min, x2_max, y2_max = box2
-
-    inter_x_min = max(x1_min, x2_min)
-    inter_y_min = max(y1_min, y2_min)
-    inter_x_max = min(x1_max, x2_max)
-    inter_y_max = min(y1_max, y2_max)
-
-    if inter_x_max < inter_x_min or inter_y_max < inter_y_min:
-        return False
-
-    inter_area = (inter_x_max - inter_x_min) * (inter_y_max - inter_y_min)
-    box1_area = (x1_max - x1_min) * (y1_max - y1_min)
-
-    if box1_area == 0: return False
-    return (inter_area / box1_area) > 0.5
-
 # --- MAIN ---
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drone detection")
+    parser.add_argument("--headless", action="store_true",
+                        help="No OpenCV window; serve the annotated video on --stream-port instead")
+    parser.add_argument("--stream-port", type=int, default=STREAM_PORT, help="MJPEG stream port (0 = off)")
+    parser.add_argument("--stream-host", default="127.0.0.1", help="Stream bind address")
+    parser.add_argument("--stream-fps", type=float, default=5.0, help="Max stream FPS")
+    parser.add_argument("--stream-width", type=int, default=480, help="Stream frame width")
+    parser.add_argument("--no-events", action="store_true", help=f"Do not log alerts to {EVENTS_PATH}")
+    parser.add_argument("--max-staleness-ms", type=float, default=MAX_STALENESS_MS,
+                        help=f"Drop frames older than this before inference (default: {MAX_STALENESS_MS}, 0 = never)")
+    parser.add_argument("--webhook", help="Also POST alerts as JSON to this URL (see alert_dispatch.py)")
+    return parser.parse_args(argv)
+
+def main(args=None):
+    if args is None:
+        args = parse_args([])
     print("[INFO] Starting Drone Detection System (RPi Edition)...")
     
-    alert_sys = AlertSystem()
+    events = None if args.no_events else EventStore(EVENTS_PATH, snapshot_dir=SNAPSHOT_DIR).start()
+    channels = [BellChannel()] + ([WebhookChannel(args.webhook)] if args.webhook else [])
+    dispatcher = AlertDispatcher(channels).start()
+    alert_sys = AlertSystem(events, dispatcher)
     
     # Auto-download model if missing (Ultralytics handles this, but we ensure it's Nano)
+    # Loaded in the background (ultralytics import included) while the camera starts
     print(f"[INFO] Loading Model: {MODEL_NAME}...")
-    model = YOLO(MODEL_NAME) 
+    def load_model():
+        from ultralytics import YOLO
+        return YOLO(MODEL_NAME)
+    loader = ThreadPoolExecutor(max_workers=1)
+    loading = loader.submit(load_model)
+    loader.shutdown(wait=False)
 
     # Class names for COCO dataset
     classNames = ["person", "bicycle", "car", "motorbike", "aeroplane", "bus", "train", "truck", "boat",
@@ -165,63 +134,69 @@ def main():
                   "microwave", "oven", "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors",
                   "teddy bear", "hair drier", "toothbrush"]
 
-    screenClasses = ["tvmonitor", "laptop", "cell phone"]
-
     # Initialize Camera
     cap = CameraStream(0).start()
-    time.sleep(2.0) # Warmup
 
-    if not cap.stream.isOpened():
+    if not cap.is_opened():
         print("Error: Could not open webcam.")
         return
 
+    # Wait for the first real frame instead of a fixed warmup sleep
+    first = cap.wait_frame(0, timeout=10.0)
+    if first is None:
+        print("[WARN] No frame from the camera yet, continuing anyway.")
+    else:
+        cap.release(first)
+    model = loading.result()
+
+    streamer = None
+    if args.headless and args.stream_port:
+        streamer = MjpegStreamer(args.stream_port, args.stream_host, args.stream_fps, args.stream_width).start()
+
+    # capture -> preprocess -> infer -> postprocess on their own threads; alert / render here.
+    # Always the newest frame: a frame waiting for a busy stage is replaced by the next one.
+    def preprocess(packet):
+        packet.result = packet.data.frame.copy()  # annotated in place later
+        packet.release()  # ring slot free again
+        return packet
+
+    def infer(packet):
+        packet.result = (packet.result, model(packet.result, imgsz=INFERENCE_SIZE, conf=CONF_THRESHOLD))
+        return packet
+
+    def postprocess(packet):
+        # Post-process the whole boxes array at once (see postprocess.py)
+        img, results = packet.result
+        packet.result = (img,) + process_results(results, min_ratio=0.5)
+        return packet
+
+    max_age = args.max_staleness_ms / 1000.0 if args.max_staleness_ms else None
+    pipeline = Pipeline(ring_source(cap), output=BoundedQueue(1, DROP_OLDEST))
+    pipeline.add(Stage('preprocess', preprocess, 1, DROP_OLDEST))
+    pipeline.add(Stage('infer', infer, 1, DROP_OLDEST, max_age=max_age))
+    pipeline.add(Stage('postprocess', postprocess, 2, BLOCK))
+    pipeline.start()
+
     pTime = 0
 
     try:
         while True:
-            img = cap.read()
-            if img is None:
+            packet = pipeline.get(timeout=1.0)
+            if packet is None:
+                if cap.stopped:
+                    break
                 continue
-
-            # Inference
-            results = model(img, stream=True, imgsz=INFERENCE_SIZE, conf=CONF_THRESHOLD)
-
-            screen_boxes = []
-            target_detections = [] 
-
-            for r in results:
-                boxes = r.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0]
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    
-                    cls = int(box.cls[0])
-                    currentClass = classNames[cls]
-                    conf = math.ceil((box.conf[0] * 100)) / 100
-
-                    if currentClass in screenClasses:
-                        screen_boxes.append([x1, y1, x2, y2])
-
-                    elif currentClass in ["bird", "aeroplane"]:
-                        target_detections.append({
-                            "bbox": [x1, y1, x2, y2],
-                            "class": currentClass,
-                            "conf": conf
-                        })
+            img, targets, screens, on_screen_flags = packet.result
 
             # Logic
-            for target in target_detections:
-                t_bbox = target["bbox"]
-                t_cls = target["class"]
-                t_conf = target["conf"]
+            boxes = targets[:, :4].astype(int).tolist()
+            for t_bbox, conf, cls, on_screen in zip(boxes, targets[:, CONF].tolist(),
+                                                    targets[:, CLS].astype(int).tolist(),
+                                                    on_screen_flags.tolist()):
+                t_cls = classNames[cls]
+                t_conf = math.ceil(conf * 100) / 100
                 x1, y1, x2, y2 = t_bbox
                 
-                on_screen = False
-                for s_bbox in screen_boxes:
-                    if is_overlap(t_bbox, s_bbox):
-                        on_screen = True
-                        break
-                
                 if on_screen:
                     color = (255, 0, 0) # Blue
                     label = f"ON SCREEN ({t_cls})"
@@ -236,8 +211,8 @@ def main():
                     
                     elif t_cls == "aeroplane" and t_conf > 0.5:
                         color = (0, 0, 255) # Red
-                        alert_sys.log_alert("Drone", t_conf)
-                        alert_sys.trigger_audio_alert()
+                        alert_sys.log_alert("Drone", t_conf, t_bbox, img)
+                        alert_sys.trigger_audio_alert(t_conf)
                         img = alert_sys.trigger_visual_alert(img, "WARNING: DRONE DETECTED")
 
                         draw_text_rect(img, f'DRONE! {t_conf}', (max(0, x1), max(35, y1)), scale=1, thickness=1, colorR=color)
@@ -251,6 +226,11 @@ def main():
             pTime = cTime
             cv2.putText(img, f'FPS: {int(fps)}', (20, 50), cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
 
+            if streamer is not None:
+                streamer.publish(img)  # no-op unless a viewer is connected and a stream frame is due
+            if args.headless:
+                continue
+
             cv2.imshow("Drone Detection (RPi)", img)
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 cap.stop()
@@ -258,8 +238,17 @@ def main():
     except KeyboardInterrupt:
         pass
         
+    pipeline.stop()
     cap.stop()
-    cv2.destroyAllWindows()
+    print_pipeline_stats(pipeline.stats())
+    dispatcher.stop()
+    print_stats(dispatcher.stats())
+    if events is not None:
+        events.stop()
+    if streamer is not None:
+        streamer.stop()
+    if not args.headless:
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
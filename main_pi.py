@@ -4,12 +4,14 @@ import subprocess
 import time
 import threading
 import math
-import platform
+import argparse
+from collections import deque
 
 # --- 0. ENV AUTO-FIX (RESTART IN VENV) ---
 # If running in global python environment (e.g. /usr/bin/python3),
 # restart the script using the venv python interpreter.
-if sys.prefix == "/usr":
+# (Skipped inside spawned inference workers, where this module runs as __mp_main__.)
+if sys.prefix == "/usr" and __name__ == "__main__":
     venv_python = os.path.join(os.path.dirname(__file__), "venv", "bin", "python3")
     if os.path.exists(venv_python):
         print(f"[INFO] Detected System Python ({sys.prefix}).")
@@ -37,11 +39,15 @@ except ImportError:
 
 
 # --- 1. ENVIRONMENT CHECK & IMPORTS ---
+# ultralytics (and torch behind it) is only located here, not imported: it is
+# the slowest import by far and is loaded in a thread alongside camera start-up.
+import importlib.util
 try:
     import cv2
-    from ultralytics import YOLO
     import psutil
     import numpy
+    if importlib.util.find_spec("ultralytics") is None:
+        raise ImportError("No module named 'ultralytics'")
 except ImportError as e:
     import sys
     print("------------------------------------------------")
@@ -63,211 +69,767 @@ check_dependencies()
 # --- 2. CONFIGURATION ---
 # RPi 4 defaults
 MODEL_NAME = 'yolov8n.pt'  # Nano is best for RPi 4 CPU
+BACKEND = 'torch'          # torch / onnx / openvino / ncnn (exported once, cached in model_cache/)
 INFERENCE_SIZE = 320      # Lower ref allows faster inference (320 is good balance)
 CONF_THRESHOLD = 0.5      # Avoid false positives
 VIDEO_WIDTH = 640
 VIDEO_HEIGHT = 480
+MOTION_GATE = True        # Skip YOLO on frames where nothing moved
+MOTION_THRESHOLD = 0.002  # Fraction of (downscaled) pixels that must change
+GATE_REFRESH_S = 2.0      # Force a full inference at least this often
+TILE_SIZE = 320           # Tiled mode: tile edge in frame pixels (== INFERENCE_SIZE keeps native scale)
+TILE_OVERLAP = 0.2        # Fraction of overlap between neighbouring tiles
+ROI_SIZE = 192            # Tiled mode: crop edge around active targets
+LATENCY_BUDGET_MS = 400   # Tiled mode / governor: detection latency budget
+GOVERNOR_SIZES = (256, 320, 416)  # Governor: inference sizes it may step between
+TEMP_LIMIT_C = 75.0       # Governor: step down above this SoC temperature (firmware throttles at 80-85)
+METRICS_PORT = 9108       # Local Prometheus endpoint (127.0.0.1:9108/metrics), 0 disables it
+FIRST_FRAME_TIMEOUT = 10.0  # Seconds to wait for the camera's first frame before carrying on anyway
+STREAM_PORT = 8080        # Headless: MJPEG stream of the annotated video (0 disables it)
+STREAM_FPS = 5            # Headless: max stream frame rate (only encoded while someone watches)
+STREAM_WIDTH = 480        # Headless: stream frames are downscaled to this width
+EVENTS_PATH = "events/events.db"    # Detection / alert log (SQLite; a .jsonl path writes rotating JSON lines)
+SNAPSHOT_DIR = "events/snapshots"   # JPEG of the frame each alert fired on
+CLIP_DIR = "events/clips"  # --clips: video around each alert
+PRE_ROLL_S = 5.0           # --clips: seconds kept in memory before an alert
+POST_ROLL_S = 5.0          # --clips: seconds recorded after the (last) alert
+CLIP_FPS = 10              # --clips: frames per second kept / written
+CLIP_MAX_MB = 32           # --clips: hard cap on the in-memory JPEG ring
+EXCLUSION_MAP = "events/exclusion_map.npz"  # Screen zones learned from detections, kept between runs
+EXCLUSION_CELL = 16        # Exclusion map: cell edge in frame pixels
+EXCLUSION_MIN_HITS = 3     # Exclusion map: screen detections before a cell is excluded for good
+ALERT_WEBHOOK = None       # e.g. "http://127.0.0.1:8099/alert": alerts POSTed as JSON (see alert_dispatch.py)
+SIREN_PIN = None           # BCM pin of a siren / relay switched on for each alert (gpiozero)
+MAX_STALENESS_MS = 1000    # Frames older than this when the model gets to them are dropped (0 = never)
+PIPELINE_QUEUES = {        # Inference pipeline: stage -> (queue size, policy when full)
+    'preprocess': (1, 'drop-oldest'),   # newest frame only
+    'infer': (1, 'drop-oldest'),        # never more than one frame waiting for the model
+    'postprocess': (2, 'block'),        # results are never dropped
+}
+CLASSIFIER_SIZE = 128      # --classifier: crop classifier input size
+CLASSIFIER_CONF = 0.6      # --classifier: verdicts below this fall back to the detector's class
+HISTORY_MB = 2             # Recent detections kept in RAM for rates / queries (~60k rows, see detection_history.py)
 
 # --- 3. CLASSES ---
 from camera_stream import CameraStream
+from inference_gate import InferenceGate
+from postprocess import (AEROPLANE, SCREEN_CLASSES, TARGET_CLASSES, boxes_from_results, on_screen_mask,
+                         process_detections, split_detections)
+from inference_worker import ProcessDetector
+from tiling import TiledDetector
+from exclusion_map import ExclusionMap
+from crop_classifier import CropCascade, load_classifier
+from alert_dispatch import AlertDispatcher, BellChannel, GpioChannel, WebhookChannel, print_stats as print_alert_stats
+from preprocess import LetterboxDetector
+from pipeline import HISTORY, POLICIES, Pipeline, Stage, print_pipeline_stats, ring_source
+from tracker import Tracker
+from detection_history import DetectionHistory
+from evaluation import latency_summary
+from detector_backend import BACKENDS, load_detector
+from metrics import METRICS, JsonDumper, serve_metrics
+from governor import Governor, ModelPool
+from stream_server import MjpegStreamer
+from overlay import Compositor
+from event_store import EventStore, wall_time
+from clip_recorder import ClipRecorder
+from startup_profile import StartupProfiler
+from concurrent.futures import ThreadPoolExecutor
+
+def make_dispatcher(webhook=None, siren_pin=None):
+    # Bell always; webhook / siren when configured. Delivery runs on the dispatcher's worker threads.
+    channels = [BellChannel()]
+    if webhook:
+        channels.append(WebhookChannel(webhook))
+    if siren_pin is not None:
+        try:
+            channels.append(GpioChannel(siren_pin))
+        except Exception as e:
+            print(f"[WARN] Siren on GPIO {siren_pin} disabled: {e}")
+    print(f"[INFO] Alerts to: {', '.join(c.name for c in channels)}")
+    return AlertDispatcher(channels).start()
 
 class AlertSystem:
-    def __init__(self):
+    def __init__(self, recorder=None, dispatcher=None):
+        self.recorder = recorder # Optional ClipRecorder: video around each alert
+        self.dispatcher = dispatcher # Optional AlertDispatcher: bell / webhook / siren, never blocks
         self.last_alert_time = 0
         self.cooldown = 2.0 # Seconds between alerts
+        self.alerted_tracks = deque(maxlen=64) # Track IDs that already beeped
 
-    def trigger(self, frame, text="DRONE DETECTED"):
+    def trigger(self, scene, text="DRONE DETECTED", track_id=None, ts=None, **details):
+        # ts: capture time (monotonic) of the alert frame, so clips are cut around it, not display time
         current_time = time.time()
         
-        # Visual Alert (Always draw)
-        cv2.rectangle(frame, (0, 0), (frame.shape[1], 50), (0, 0, 255), -1)
-        cv2.putText(frame, text, (50, 35), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        # Visual Alert (Always draw): the compositor puts the red banner on the frame
+        scene['banner'] = text
         
-        # Audio Alert (with cooldown)
-        if current_time - self.last_alert_time > self.cooldown:
+        # Audio Alert: once per tracked drone, or with cooldown when untracked
+        if track_id is not None:
+            beep = track_id not in self.alerted_tracks
+            if beep:
+                self.alerted_tracks.append(track_id)
+        else:
+            beep = current_time - self.last_alert_time > self.cooldown
+        if beep:
             self.last_alert_time = current_time
-            threading.Thread(target=self._beep, daemon=True).start()
+            if self.dispatcher is not None:
+                self.dispatcher.dispatch('drone', text, track_id=track_id, **details)
+            if self.recorder is not None:
+                self.recorder.trigger(ts)
         
-        return frame
-
-    def _beep(self):
-        # Portable beep
-        try:
-            if platform.system() == "Windows":
-                import winsound
-                winsound.Beep(1000, 500)
-            else:
-                # Linux/RPi method 1: Terminal bell
-                print('\a') 
-                # Linux/RPi method 2: beep command (if installed)
-                # os.system('beep -f 1000 -l 500') 
-        except:
-            pass
+        return scene
 
 # --- 4. MAIN LOGIC ---
 
-def is_overlap(box1, box2):
-    # Simple IoU or overlap check
-    x1_min, y1_min, x1_max, y1_max = box1
-    x2_min, y2_min, x2_max, y2_max = box2
-    
-    inter_x_min = max(x1_min, x2_min)
-    inter_y_min = max(y1_min, y2_min)
-    inter_x_max = min(x1_max, x2_max)
-    inter_y_max = min(y1_max, y2_max)
-    
-    if inter_x_max < inter_x_min or inter_y_max < inter_y_min:
-        return False
-        
-    return True
+def build_run_report(stats, elapsed):
+    # Repeatable numbers for headless / recorded runs (see benchmark.py)
+    elapsed = max(elapsed, 1e-6)
+    seen = stats['inferred_frames'] + stats.get('gate', {}).get('skipped_static', 0)
+    report = {
+        'elapsed_s': elapsed,
+        'frames_captured': stats['captured'],
+        'frames_displayed': stats['displayed'],
+        'inferences': stats['inferences'],
+        'capture_fps': stats['captured'] / elapsed,
+        'display_fps': stats['displayed'] / elapsed,
+        'inference_fps': stats['inferences'] / elapsed,
+        # Captured frames the inference side never looked at (it was busy with an older one)
+        'frames_dropped': max(0, stats['captured'] - seen),
+        'alerts': stats['alerts'],
+        'capture_to_result': latency_summary(stats['latencies']),
+        'capture_to_alert': latency_summary(stats['alert_latencies']),
+    }
+    for key in ('startup', 'gate', 'tiles', 'exclusion', 'classifier', 'stale', 'governor', 'overlay', 'events', 'clips',
+                'alert_delivery', 'pipeline', 'history'):
+        if key in stats:
+            report[key] = stats[key]
+    report['stages'] = METRICS.snapshot()['stages']
+    return report
+
+def print_run_summary(report):
+    r = report
+    print("------------------------------------------------")
+    print(f"[STATS] Run time:        {r['elapsed_s']:.1f}s")
+    print(f"[STATS] Frames captured: {r['frames_captured']} ({r['capture_fps']:.1f} FPS), "
+          f"not inferred: {r['frames_dropped']}")
+    print(f"[STATS] Frames shown:    {r['frames_displayed']} ({r['display_fps']:.1f} FPS)")
+    print(f"[STATS] Inferences:      {r['inferences']} ({r['inference_fps']:.2f} FPS)")
+    if r.get('startup', {}).get('marks', {}).get('first_result') is not None:
+        print(f"[STATS] Time to first detection: {r['startup']['marks']['first_result']:.2f}s from process start")
+    if r.get('gate'):
+        g = r['gate']
+        print(f"[STATS] Gate: run={g['run']} forced={g['forced']} "
+              f"skipped_static={g['skipped_static']} skipped_duplicate={g['skipped_duplicate']}")
+    if r.get('tiles'):
+        t = r['tiles']
+        print(f"[STATS] Inference modes: full={t['full']} tiles={t['tiles']} roi={t['roi']}, "
+              f"{t.get('skipped_regions', 0)} excluded tiles/crops skipped")
+    if r.get('exclusion'):
+        x = r['exclusion']
+        print(f"[STATS] Exclusion map: {x['excluded_cells']}/{x['cells']} cells in {x['zones']} zone(s), "
+              f"learned from {x['observations']} results")
+    if r.get('classifier'):
+        c = r['classifier']
+        print(f"[STATS] Crop classifier: {c['classified']} crops in {c['calls']} calls ({c['mean_ms']:.1f}ms each), "
+              f"{c['reused']} cached verdicts reused, {c['overridden']} detector classes overridden {c['verdicts']}")
+    if r.get('pipeline'):
+        print_pipeline_stats(r['pipeline'])
+    if r.get('history', {}).get('appended'):
+        h = r['history']
+        print(f"[STATS] History: {h['appended']} detections, last {h['rows']} kept ({h['span_s']:.0f}s, "
+              f"{h['bytes'] / 1e6:.1f} MB), peak {h['per_minute_peak']}/min, by class {h['by_class']}")
+    if r.get('stale'):
+        print(f"[STATS] Out-of-order results dropped: {r['stale']}")
+    if r.get('overlay', {}).get('composited'):
+        o = r['overlay']
+        print(f"[STATS] Overlay: {o['composited']} frames, mean={o['mean_ms']:.2f}ms p95={o['p95_ms']:.2f}ms, "
+              f"dropped={o['dropped']}, sprite cache {o['cache_hits']} hits / {o['cache_misses']} misses")
+    if r.get('events'):
+        e = r['events']
+        print(f"[STATS] Events: {e['written']} written to {e['path']}, {e['snapshots']} snapshots, "
+              f"{e['dropped']} dropped")
+    if r.get('clips'):
+        c = r['clips']
+        print(f"[STATS] Clips: {c['clips']} saved ({c['merged_alerts']} alerts merged), ring "
+              f"{c['ring']['bytes'] / 1e6:.1f}/{c['max_bytes'] / 1e6:.0f} MB ({c['ring']['seconds']:.1f}s), "
+              f"written {c['bytes_written'] / 1e6:.1f} MB at {c['write_mb_s']:.1f} MB/s, {c['frames_dropped']} dropped")
+    if r.get('alert_delivery'):
+        print_alert_stats(r['alert_delivery'])
+    if r.get('governor'):
+        g = r['governor']
+        print(f"[STATS] Governor: {len(g['decisions'])} change(s), final {g['final']}")
+    for name in ('capture_to_result', 'capture_to_alert'):
+        lat = r[name]
+        print(f"[STATS] {name.replace('_', ' ')} ms: p50={lat['p50_ms']:.1f} p95={lat['p95_ms']:.1f} "
+              f"p99={lat['p99_ms']:.1f} max={lat['max_ms']:.1f} (n={lat['count']})")
+    print("------------------------------------------------")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Raspberry Pi drone detection")
+    parser.add_argument("--source", default="0",
+                        help="Camera index, video file path, 'synthetic[:N]' or 'fakepicam[:N]' (default: 0)")
+    parser.add_argument("--max-staleness-ms", type=float, default=MAX_STALENESS_MS,
+                        help=f"Drop frames older than this before inference (default: {MAX_STALENESS_MS}, 0 = never)")
+    parser.add_argument("--queue", action="append", default=[], metavar="STAGE=POLICY[:SIZE]",
+                        help="Queue policy of an inference stage (preprocess, infer, postprocess): "
+                             f"{', '.join(POLICIES)}, e.g. --queue infer=drop-newest:2")
+    parser.add_argument("--no-lores", action="store_true",
+                        help="Letterbox the full frame for inference instead of the camera's low-resolution stream")
+    parser.add_argument("--fast", action="store_true",
+                        help="Replay files / synthetic frames as fast as possible instead of in real time")
+    parser.add_argument("--loop", action="store_true", help="Loop video file sources")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run without an OpenCV window; the annotated video is served on --stream-port")
+    parser.add_argument("--events", default=EVENTS_PATH,
+                        help=f"Detection/alert event log, .db (SQLite) or .jsonl (default: {EVENTS_PATH})")
+    parser.add_argument("--no-events", action="store_true", help="Do not record events or snapshots")
+    parser.add_argument("--exclusion-map", default=EXCLUSION_MAP,
+                        help=f"Learned screen exclusion zones, loaded and saved here (default: {EXCLUSION_MAP})")
+    parser.add_argument("--webhook", default=ALERT_WEBHOOK, help="POST alerts as JSON to this URL")
+    parser.add_argument("--siren-pin", type=int, default=SIREN_PIN, help="Switch a siren on this GPIO pin per alert")
+    parser.add_argument("--classifier",
+                        help="Drone/bird/plane crop classifier (YOLO -cls weights) run once per track to confirm targets")
+    parser.add_argument("--classifier-conf", type=float, default=CLASSIFIER_CONF,
+                        help=f"Minimum classifier confidence to override the detector (default: {CLASSIFIER_CONF})")
+    parser.add_argument("--history-mb", type=float, default=HISTORY_MB,
+                        help=f"Memory ceiling of the in-RAM detection history (default: {HISTORY_MB})")
+    parser.add_argument("--no-exclusion-map", action="store_true",
+                        help="Check targets against the screens of each result instead of learned zones")
+    parser.add_argument("--clips", action="store_true",
+                        help=f"Save video from {PRE_ROLL_S:.0f}s before to {POST_ROLL_S:.0f}s after each alert in {CLIP_DIR}/")
+    parser.add_argument("--pre-roll", type=float, default=PRE_ROLL_S, help="Clip seconds before an alert")
+    parser.add_argument("--post-roll", type=float, default=POST_ROLL_S, help="Clip seconds after an alert")
+    parser.add_argument("--clip-max-mb", type=float, default=CLIP_MAX_MB,
+                        help=f"Memory cap of the pre-roll ring in MB (default: {CLIP_MAX_MB})")
+    parser.add_argument("--render", action="store_true",
+                        help="Draw overlays even when headless and nobody is watching (benchmark.py uses this)")
+    parser.add_argument("--stream-port", type=int, default=STREAM_PORT,
+                        help=f"Headless MJPEG stream port (default: {STREAM_PORT}, 0 = off)")
+    parser.add_argument("--stream-host", default="127.0.0.1",
+                        help="Stream bind address (0.0.0.0 to watch from another machine)")
+    parser.add_argument("--stream-fps", type=float, default=STREAM_FPS, help=f"Max stream FPS (default: {STREAM_FPS})")
+    parser.add_argument("--stream-width", type=int, default=STREAM_WIDTH,
+                        help=f"Stream frame width (default: {STREAM_WIDTH})")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop after N captured frames (0 = unlimited)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after N seconds (0 = unlimited)")
+    parser.add_argument("--no-motion-gate", action="store_true", help="Run YOLO on every new frame")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run YOLO in N worker processes (0 = inference thread in this process)")
+    parser.add_argument("--imgsz", type=int, default=INFERENCE_SIZE, help=f"Inference size (default: {INFERENCE_SIZE})")
+    parser.add_argument("--conf", type=float, default=CONF_THRESHOLD, help=f"Confidence threshold (default: {CONF_THRESHOLD})")
+    parser.add_argument("--backend", default=BACKEND, choices=sorted(BACKENDS),
+                        help=f"Inference runtime (default: {BACKEND})")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help=f"Serve Prometheus metrics on 127.0.0.1:PORT (default: {METRICS_PORT}, 0 = off)")
+    parser.add_argument("--metrics-json", help="Also dump metrics as JSON to this file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=30.0, help="Seconds between JSON dumps")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Tiled / ROI inference for small distant targets (within --budget-ms)")
+    parser.add_argument("--budget-ms", type=float, default=LATENCY_BUDGET_MS,
+                        help=f"Detection latency budget for --tiles and --governor (default: {LATENCY_BUDGET_MS})")
+    parser.add_argument("--governor", action="store_true",
+                        help="Adapt imgsz, inference cadence and model at runtime to stay within --budget-ms")
+    parser.add_argument("--governor-models", nargs="+", default=[],
+                        help="Lighter models the governor may fall back to, most accurate first")
+    parser.add_argument("--governor-log", help="Append every governor decision to this JSON-lines file")
+    args = parser.parse_args(argv)
+    # PIPELINE_QUEUES with the --queue overrides applied
+    args.queues = dict(PIPELINE_QUEUES)
+    for spec in args.queue:
+        name, _, value = spec.partition('=')
+        policy, _, size = value.partition(':')
+        if name not in args.queues or policy not in POLICIES or not (not size or size.isdigit() and int(size) > 0):
+            parser.error(f"--queue {spec}: expected STAGE=POLICY[:SIZE] with STAGE in "
+                         f"{', '.join(args.queues)} and POLICY in {', '.join(POLICIES)}")
+        args.queues[name] = (int(size) if size else args.queues[name][0], policy)
+    return args
+
+def main(args=None):
+    if args is None:
+        args = parse_args([])
+    # Process start -> first detection, by phase (printed once the first result is in)
+    profiler = StartupProfiler()
+    profiler.mark('main')
 
-def main():
     print("------------------------------------------------")
     print("   RASPBERRY PI 4 DRONE DETECTION LAUNCHER      ")
     print("------------------------------------------------")
-    print("[INIT] initializing camera...")
-    
-    # 1. Start Camera
-    cam = CameraStream(0).start()
-    time.sleep(2.0) # Warmup
+    print(f"[INIT] initializing camera (source: {args.source})...")
     
-    # 2. Load Model
-    print(f"[INIT] Loading YOLO model ({MODEL_NAME})...")
-    # This automatically downloads 'yolov8n.pt' if not present
-    model = YOLO(MODEL_NAME)
+    # 0. Metrics (per-stage timings, FPS, CPU / RSS / SoC temperature / throttling)
+    METRICS.reset()
+    for name in ('frames_captured', 'inferences', 'frames_displayed'):
+        METRICS.track_rate(name)
+    metrics_server = None
+    if args.metrics_port:
+        try:
+            metrics_server = serve_metrics(args.metrics_port)
+        except OSError as e:
+            print(f"[WARN] Metrics endpoint disabled: {e}")
+    dumper = JsonDumper(args.metrics_json, args.metrics_interval).start() if args.metrics_json else None
+    streamer = None
+    if args.headless and args.stream_port:
+        try:
+            streamer = MjpegStreamer(args.stream_port, args.stream_host, args.stream_fps, args.stream_width).start()
+        except OSError as e:
+            print(f"[WARN] Video stream disabled: {e}")
+
+    # 1. Load Model (in-process) in the background, at the same time as the camera starts
+    # (ultralytics import, weights, warmup inference)
+    model = None
+    detector = None
+    loading = None
+    if args.workers == 0:
+        print(f"[INIT] Loading YOLO model ({MODEL_NAME}, {args.backend}) in the background...")
+
+        def load_model():
+            with profiler.phase('model_load'):
+                # This automatically downloads 'yolov8n.pt' if not present
+                loaded = load_detector(MODEL_NAME, args.backend, args.imgsz)
+            profiler.mark('model_ready')
+            return loaded
+
+        loader_pool = ThreadPoolExecutor(max_workers=1)
+        loading = loader_pool.submit(load_model)
+        loader_pool.shutdown(wait=False)
+
+    classifier_loading = None
+    if args.classifier:
+        classifier_pool = ThreadPoolExecutor(max_workers=1)
+        classifier_loading = classifier_pool.submit(load_classifier, args.classifier, args.backend, CLASSIFIER_SIZE)
+        classifier_pool.shutdown(wait=False)
+
+    # 2. Start Camera, wait for the first real frame (no fixed warmup sleep)
+    # Pi cameras also deliver a small YUV420 stream at the model's width for full-frame inference
+    # (the largest size the governor may pick, so it is never upscaled)
+    lores_size = None
+    if not (args.tiles or args.workers > 0 or args.no_lores):
+        lores_width = max(GOVERNOR_SIZES + (args.imgsz,)) if args.governor else args.imgsz
+        lores_size = (lores_width, int(lores_width * VIDEO_HEIGHT / VIDEO_WIDTH) // 2 * 2)
+    with profiler.phase('camera_open'):
+        # Ring slots: 2 + every frame that can be pinned at once (display, clips, classifier, and the
+        # pipeline's preprocess / infer queues plus the frame each of those stages is working on)
+        slots = 7 + args.queues['preprocess'][0] + args.queues['infer'][0]
+        cam = CameraStream(args.source, realtime=not args.fast, loop=args.loop, ring_slots=slots,
+                           lores_size=lores_size).start()
+    with profiler.phase('first_frame'):
+        first = cam.wait_frame(0, timeout=FIRST_FRAME_TIMEOUT)
+    if first is not None:
+        profiler.mark('first_frame')
+        shape = first.frame.shape
+        cam.release(first)
+    else:
+        print(f"[WARN] No frame from {args.source} after {FIRST_FRAME_TIMEOUT:.0f}s, continuing anyway.")
+        shape = (VIDEO_HEIGHT, VIDEO_WIDTH, 3)
+
+    if args.workers > 0:
+        print(f"[INIT] Starting {args.workers} inference worker process(es) ({MODEL_NAME})...")
+        # Shared-memory slots are sized from the first frame
+        with profiler.phase('workers_start'):
+            detector = ProcessDetector(MODEL_NAME, imgsz=args.imgsz, conf=args.conf, iou=0.45,
+                                       workers=args.workers, frame_shape=shape, backend=args.backend).start()
+        profiler.mark('model_ready')
+        if args.tiles:
+            print("[WARN] --tiles is not supported with --workers, using full-frame inference.")
+            args.tiles = False
+    else:
+        with profiler.phase('model_wait'):
+            model = loading.result()
+    classifier = None
+    if classifier_loading is not None:
+        try:
+            with profiler.phase('classifier_wait'):
+                classifier = classifier_loading.result()
+        except Exception as e:
+            print(f"[WARN] Crop classifier disabled, could not load {args.classifier}: {e}")
     
     # 3. Setup
-    alert_sys = AlertSystem()
+    recorder = None
+    if args.clips:
+        recorder = ClipRecorder(cam, CLIP_DIR, args.pre_roll, args.post_roll, fps=CLIP_FPS,
+                                max_bytes=int(args.clip_max_mb * 1024 * 1024)).start()
+    dispatcher = make_dispatcher(args.webhook, args.siren_pin)
+    alert_sys = AlertSystem(recorder, dispatcher)
+    events = None
+    if not args.no_events:
+        events = EventStore(args.events, snapshot_dir=SNAPSHOT_DIR).start()
+    # Overlays are drawn from cached sprites on their own thread; finished frames go to the stream
+    compositor = Compositor(sinks=[streamer.publish] if streamer is not None else []).start()
     
     # Shared state for threading
-    latest_frame = None
-    latest_results = ([], [])
+    # Frames are shared through cam.ring (sequence numbered, no copies);
+    # only the parsed results need a lock.
+    # (targets (N, 6), screens (M, 4), on_screen (N,)) - see postprocess.py
+    latest_results = process_detections(boxes_from_results([]))
+    # Targets carried between inference runs, extrapolated for display frames
+    tracker = Tracker()
     lock = threading.Lock()
+    # What was detected recently (appended by the inference side only, read without locks)
+    history = DetectionHistory(max_bytes=int(args.history_mb * 1024 * 1024))
     running = True
+    stats = {'captured': 0, 'displayed': 0, 'inferences': 0, 'inferred_frames': 0,
+             'alerts': 0, 'latencies': deque(maxlen=HISTORY), 'alert_latencies': deque(maxlen=HISTORY)}
+    gate = None
+    if MOTION_GATE and not args.no_motion_gate:
+        gate = InferenceGate(motion_threshold=MOTION_THRESHOLD, refresh_interval=GATE_REFRESH_S)
+    feeder = LetterboxDetector(conf=args.conf, iou=0.45)
+    exclusion = None
+    if not args.no_exclusion_map:
+        exclusion = ExclusionMap(shape, args.exclusion_map, cell=EXCLUSION_CELL, min_hits=EXCLUSION_MIN_HITS)
+    tiled = None
+    if args.tiles:
+        tiled = TiledDetector(model, imgsz=args.imgsz, conf=args.conf, iou=0.45,
+                              tile_size=TILE_SIZE, overlap=TILE_OVERLAP, roi_size=ROI_SIZE,
+                              budget_ms=args.budget_ms,
+                              max_batch=None if args.backend == 'torch' else 1, exclusion=exclusion)
+    governor = None
+    pool = None
+    if args.governor:
+        if detector is not None:
+            # imgsz and model are fixed inside the worker processes; only the cadence adapts
+            governor = Governor(args.budget_ms, args.imgsz, sizes=(args.imgsz,), temp_limit=TEMP_LIMIT_C,
+                                log_path=args.governor_log)
+        else:
+            variants = [MODEL_NAME] + [m for m in args.governor_models if m != MODEL_NAME]
+            governor = Governor(args.budget_ms, args.imgsz, sizes=GOVERNOR_SIZES, variants=variants,
+                                temp_limit=TEMP_LIMIT_C, log_path=args.governor_log)
+            pool = ModelPool(load_detector, args.backend)
+            pool.put(MODEL_NAME, args.imgsz, model)
+        print(f"[INFO] Governor on: budget {args.budget_ms:.0f}ms, starting at {governor.settings()}")
+
+    cascade = None
+    if classifier is not None:
+        def tracks_at(ts):
+            with lock:
+                return tracker.predict(ts)
+
+        cascade = CropCascade(classifier, cam, tracks_at, min_conf=args.classifier_conf,
+                              max_batch=None if args.backend == 'torch' else 1).start()
+        print(f"[INFO] Crop classifier on ({args.classifier}): targets are confirmed per track before alerting")
 
-    # Classes config
-    SCREEN_CLASSES = [62, 63, 67] # TV, Laptop, Cell phone (COCO IDs)
-    TARGET_CLASSES = [4, 14]      # Aeroplane, Bird (COCO IDs)
-    # COCO Class reference: https://docs.ultralytics.com/datasets/detect/coco/
-    
     # --- INFERENCE THREAD ---
-    def inference_loop():
-        nonlocal latest_results, running
+    def publish(data, frame_ts, mode='full'):
+        # Parse results immediately to save main thread work:
+        # class masks + screen-overlap matrix on the whole boxes array at once
+        nonlocal latest_results
+        start = time.perf_counter()
+        if exclusion is not None:
+            # Screens feed the learned map; targets are a mask lookup, not a target x screen overlap check
+            targets, screens = split_detections(data, TARGET_CLASSES, SCREEN_CLASSES)
+            if mode == 'roi':
+                screens = latest_results[1]  # crops only cover the targets
+            else:
+                exclusion.observe(screens, full_frame=mode == 'full')
+                screens = screens.astype('int32')
+            parsed = (targets, screens, exclusion.on_screen(targets))
+        elif mode == 'roi':
+            # Crops only cover the targets; screens don't move, keep the last ones seen
+            targets = process_detections(data, target_classes=TARGET_CLASSES, screen_classes=SCREEN_CLASSES)[0]
+            screens = latest_results[1]
+            parsed = (targets, screens, on_screen_mask(targets, screens))
+        else:
+            parsed = process_detections(data, target_classes=TARGET_CLASSES, screen_classes=SCREEN_CLASSES)
+        
+        with lock:
+            latest_results = parsed
+            live = tracker.update(parsed[0], parsed[2], frame_ts)
+        seen = [track for track in live if track.last_seen == frame_ts]  # in this result, not just carried over
+        history.append_tracks(seen, frame_ts)
+        # Rows are per track per result: count each drone once, not once per inference
+        METRICS.set_gauge('drones_per_minute', history.distinct_tracks(frame_ts - 60.0, frame_ts, cls=AEROPLANE,
+                                                                       on_screen=False))
+        if events is not None:
+            ts = wall_time(frame_ts)
+            for track in seen:
+                events.record('detection', track.cls, track.conf, track.box, track.id, track.on_screen, ts,
+                              source=str(args.source))
+        if gate is not None:
+            gate.mark_result(len(parsed[0]))
+        METRICS.observe('postprocess', time.perf_counter() - start)
+        if profiler.mark('first_result'):
+            print(f"[BOOT] Guarding: first detection result {profiler.marks['first_result']:.2f}s after process start")
+            profiler.print_report()
+        METRICS.inc('inferences')
+        stats['inferences'] += 1
+        stats['latencies'].append(time.monotonic() - frame_ts)
+
+    def gate_allows(ref):
+        # Static sky: skip the model, keep the previous results. Checked once the model is free,
+        # so the gate sees frames at inference rate (its background blends per checked frame).
+        if gate is not None:
+            with METRICS.time('gate'):
+                if not gate.check(ref.seq, ref.frame)[0]:
+                    return False
+        stats['inferred_frames'] += 1
+        return True
+
+    def next_frame(last_seq, timeout):
+        # Block until the camera has a frame we have not processed yet.
+        # The slot stays pinned (unchanged by the capture thread) until released.
+        ref = cam.wait_frame(last_seq, timeout=timeout)
+        if ref is None:
+            return None, last_seq
+        if not gate_allows(ref):
+            cam.release(ref)
+            return None, ref.seq
+        return ref, ref.seq
+
+    def govern(seconds):
+        if governor is not None:
+            governor.record(seconds)
+            governor.update()
+
+    # capture -> preprocess (cadence) -> infer (motion gate, model) -> postprocess, one thread per stage.
+    # Queue sizes / policies come from PIPELINE_QUEUES (--queue); frames older than --max-staleness-ms
+    # when the model is free are dropped unrun.
+    active = {'model': model, 'name': MODEL_NAME, 'imgsz': args.imgsz, 'last_run': 0.0}
+
+    def preprocess(packet):
+        # Cadence: leave at least governor.interval between runs
+        if governor is not None and time.monotonic() - active['last_run'] < governor.interval:
+            return None
+        return packet
+
+    def infer(packet):
+        ref = packet.data
+        if not gate_allows(ref):
+            return None
+        # Switch once the model for the governor's settings has loaded (keep the old one meanwhile);
+        # the governor waits for the switch, or goes back if the model could not be loaded
+        if governor is not None and governor.pending:
+            ready = pool.get(governor.model_name, governor.imgsz)
+            if ready is not None:
+                active.update(model=ready, name=governor.model_name, imgsz=governor.imgsz)
+                if tiled is not None:
+                    tiled.model, tiled.imgsz = ready, governor.imgsz
+                governor.confirm(active['name'], active['imgsz'])
+            elif pool.failed(governor.model_name, governor.imgsz):
+                governor.reject(governor.model_name, None if args.backend == 'torch' else governor.imgsz)
+
+        # Run YOLO (CPU bound)
+        mode = 'full'
+        active['last_run'] = time.monotonic()
+        start = time.perf_counter()
+        try:
+            if tiled is not None:
+                with lock:
+                    boxes = [box for track, box in tracker.predict(packet.capture_ts) if not track.on_screen]
+                data, mode = tiled.detect(ref.frame, boxes)
+            else:
+                data = feeder.detect(active['model'], ref.frame, active['imgsz'], ref.lores)
+        finally:
+            packet.release()  # the frame is not needed past this point
+        elapsed = time.perf_counter() - start
+        METRICS.observe('inference', elapsed)
+        packet.result = (data, mode, elapsed)
+        return packet
+
+    def postprocess(packet):
+        data, mode, elapsed = packet.result
+        publish(data, packet.capture_ts, mode)
+        govern(elapsed)
+        return packet
+
+    def process_inference_loop():
+        # Frames go to worker processes through shared memory. Keep every worker
+        # busy with the newest frame; with several workers results may come back
+        # out of order, older ones are dropped.
+        last_seq = 0
+        newest_ts = 0.0
+        last_submit = 0.0
         while running:
-            if latest_frame is None:
-                time.sleep(0.01)
-                continue
-                
-            # Copy frame for inference to avoid tearing
-            frame_to_process = latest_frame.copy()
-            
-            # Run YOLO (CPU bound)
-            # stream=True is efficient, verbose=False reduces terminal spam
-            results = model(frame_to_process, imgsz=INFERENCE_SIZE, conf=CONF_THRESHOLD, verbose=False, iou=0.45)
-            
-            # Parse results immediately to save main thread work
-            parsed_targets = []
-            parsed_screens = []
-            
-            for r in results:
-                for box in r.boxes:
-                    cls_id = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    xyxy = box.xyxy[0].cpu().numpy().astype(int)
-                    
-                    if cls_id in SCREEN_CLASSES:
-                        parsed_screens.append(xyxy)
-                    elif cls_id in TARGET_CLASSES:
-                        parsed_targets.append({'box': xyxy, 'conf': conf, 'id': cls_id})
-            
-            with lock:
-                latest_results = (parsed_targets, parsed_screens)
-            
-            # RPi 4 might handle 2-5 FPS inference. 
-            # We sleep slightly to give CPU back to video thread if needed, 
-            # though YOLO usually maxes out a core.
-            time.sleep(0.001)
+            paced = governor is not None and time.monotonic() - last_submit < governor.interval
+            if detector.free_slots() and not paced:
+                ref, last_seq = next_frame(last_seq, 0.005 if detector.pending() else 0.5)
+                if ref is not None:
+                    last_submit = time.monotonic()
+                    try:
+                        detector.submit(ref.frame, ref.timestamp)
+                    finally:
+                        cam.release(ref)
+            if paced:
+                timeout = 0.01
+                if not detector.pending():
+                    time.sleep(timeout)  # nothing to collect, wait for the next submit to be due
+            else:
+                timeout = 0.0 if detector.free_slots() else 0.5
+            for _, frame_ts, data in detector.collect(timeout=timeout):
+                if frame_ts < newest_ts:
+                    stats['stale'] = stats.get('stale', 0) + 1
+                    continue
+                newest_ts = frame_ts
+                elapsed = time.monotonic() - frame_ts  # incl. queueing in workers
+                METRICS.observe('inference', elapsed)
+                publish(data, frame_ts)
+                govern(elapsed)
 
-    # Start Inference Thread
-    inf_thread = threading.Thread(target=inference_loop, daemon=True)
-    inf_thread.start()
+    # Start Inference
+    pipeline = None
+    if detector is not None:
+        inf_thread = threading.Thread(target=process_inference_loop, daemon=True)
+        inf_thread.start()
+    else:
+        max_age = args.max_staleness_ms / 1000.0 if args.max_staleness_ms else None
+        pipeline = Pipeline(ring_source(cam), name='inference')
+        for name, fn in (('preprocess', preprocess), ('infer', infer), ('postprocess', postprocess)):
+            size, policy = args.queues[name]
+            pipeline.add(Stage(name, fn, size, policy, max_age=max_age if name == 'infer' else None))
+        pipeline.start()
 
-    print("[INFO] System Ready. Press 'q' to exit.")
+    if args.headless:
+        print("[INFO] System Ready (headless). Press Ctrl+C to exit.")
+    else:
+        print("[INFO] System Ready. Press 'q' to exit.")
 
     # --- MAIN VIDEO LOOP ---
+    start_time = time.monotonic()
     try:
         p_time = 0
+        last_seq = 0
+        shown_seq = 0
         while True:
+            if cam.stopped:
+                print("[INFO] Frame source finished.")
+                break
+            if args.duration and time.monotonic() - start_time >= args.duration:
+                break
+            if args.max_frames and cam.frame_count >= args.max_frames:
+                break
+
             # 1. Get Visual Frame (High FPS)
-            frame = cam.read()
-            if frame is None: 
+            # Blocks until a new frame arrives. The compositor draws on it, so take
+            # a private copy; the inference thread may be reading the same ring slot.
+            # Headless with no stream viewer due: alerts only, nothing is drawn.
+            ref = cam.wait_frame(last_seq, timeout=0.5)
+            if ref is None:
                 continue
-            
-            # Update shared state for inference thread
-            latest_frame = frame 
+            last_seq = ref.seq
+            frame_ts = ref.timestamp
+            METRICS.observe('display_age', time.monotonic() - frame_ts)  # capture -> display staleness
+            render = args.render or not args.headless or (streamer is not None and streamer.wanted())
+            frame = ref.frame.copy() if render else None
             
             # 2. Get Recent Detections (Thread Safe)
             with lock:
-                curr_targets, curr_screens = latest_results
-                
-            # 3. Draw Detections
-            # Draw Screens (Blue)
-            for box in curr_screens:
-                x1, y1, x2, y2 = box
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                cv2.putText(frame, "SCREEN", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
-
-            # Check logic
-            for target in curr_targets:
-                t_box = target['box']
-                t_conf = target['conf']
-                t_id = target['id']
+                curr_screens = latest_results[1]
+                curr_tracks = tracker.predict(frame_ts)
                 
-                # Check Overlap
-                on_screen = False
-                for s_box in curr_screens:
-                    if is_overlap(t_box, s_box):
-                        on_screen = True
-                        break
-                
-                x1, y1, x2, y2 = t_box
+            # 3. Describe the overlay (drawn by the compositor thread)
+            # Screens (Blue): the learned zones, or the screens of the latest result
+            screens = [] if not render else exclusion.zones() if exclusion is not None else curr_screens.tolist()
+            scene = {'screens': screens, 'boxes': [], 'banner': None}
+
+            # Check logic per track (overlap already resolved in the inference thread),
+            # boxes extrapolated to this frame's capture time
+            for track, t_box in curr_tracks:
+                t_conf = track.conf
                 
-                if on_screen:
+                if track.on_screen:
                     # Ignore or mark safe
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2) # Blue
-                    cv2.putText(frame, f"Safe {t_conf:.2f}", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+                    scene['boxes'].append((t_box, f"Safe {t_conf:.2f}", (255, 0, 0))) # Blue
                 else:
-                    # REAL DETECTION
-                    if t_id == 4: # Aeroplane/Drone
+                    # REAL DETECTION (confirmed by the crop classifier when it is on)
+                    if cascade is not None:
+                        kind = cascade.kind(track)
+                    else:
+                        kind = 'drone' if track.cls == AEROPLANE else 'bird'
+                    if kind == 'drone': # Aeroplane/Drone
                         color = (0, 0, 255) # Red
                         label = "DRONE"
-                        alert_sys.trigger(frame, f"WARNING: {label}")
+                        if track.id not in alert_sys.alerted_tracks:
+                            # Capture of the frame the drone was first detected in -> alert
+                            stats['alerts'] += 1
+                            stats['alert_latencies'].append(time.monotonic() - track.first_seen)
+                            if events is not None:
+                                events.record('alert', track.cls, t_conf, t_box, track.id, ts=wall_time(frame_ts),
+                                              frame=ref.frame.copy(), source=str(args.source))
+                        alert_sys.trigger(scene, f"WARNING: {label}", track_id=track.id, ts=frame_ts,
+                                          conf=round(t_conf, 3), box=t_box, source=str(args.source))
+                    elif kind == 'pending': # Waiting for the classifier's first verdict
+                        color = (0, 255, 255) # Yellow
+                        label = "CHECKING"
+                    elif kind == 'plane': # Real aircraft, no alert
+                        color = (255, 255, 0) # Cyan
+                        label = "PLANE"
                     else: # Bird
                         color = (0, 255, 0) # Green
                         label = "BIRD"
                         
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(frame, f"{label} {t_conf:.2f}", (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+                    scene['boxes'].append((t_box, f"{label} #{track.id} {t_conf:.2f}", color))
+
+            cam.release(ref)  # held until here for alert snapshots
 
             # 4. FPS Calculation (Video FPS, not Inference FPS)
-            c_time = time.time()
-            fps = 1 / (c_time - p_time) if c_time > p_time else 0
-            p_time = c_time
-            cv2.putText(frame, f"FPS: {int(fps)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            if render:
+                c_time = time.time()
+                scene['fps'] = int(1 / (c_time - p_time)) if c_time > p_time else 0
+                p_time = c_time
+                compositor.submit(last_seq, frame, scene)
+
+            METRICS.inc('frames_displayed')
+            stats['displayed'] += 1
+            if args.headless:
+                continue
 
-            # 5. Show
-            cv2.imshow("RPi Drone Guard", frame)
+            # 5. Show the newest composited frame
+            with METRICS.time('display'):
+                shown_seq, shown = compositor.latest(shown_seq)
+                if shown is not None:
+                    cv2.imshow("RPi Drone Guard", shown)
+                key = cv2.waitKey(1) & 0xFF
             
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if key == ord('q'):
                 break
                 
     except KeyboardInterrupt:
         pass
     finally:
         running = False
+        stats['captured'] = cam.frame_count
+        if detector is not None:
+            inf_thread.join(timeout=1.0)
+            detector.stop()
+        if pipeline is not None:
+            pipeline.stop()
+            stats['pipeline'] = pipeline.stats()
+        if gate is not None:
+            stats['gate'] = gate.stats()
+        if tiled is not None:
+            stats['tiles'] = dict(tiled.scheduler.counts, skipped_regions=tiled.skipped)
+        if exclusion is not None:
+            exclusion.save()
+            stats['exclusion'] = exclusion.stats()
+        if governor is not None:
+            stats['governor'] = governor.summary()
+        stats['history'] = history.stats()
+        if cascade is not None:
+            cascade.stop()
+            stats['classifier'] = cascade.stats()
+        stats['startup'] = profiler.report()
         cam.stop()
-        cv2.destroyAllWindows()
+        if dumper is not None:
+            dumper.stop()
+        compositor.stop()
+        stats['overlay'] = compositor.stats()
+        if events is not None:
+            events.stop()
+            stats['events'] = events.stats()
+        if recorder is not None:
+            recorder.stop()
+            stats['clips'] = recorder.stats()
+        dispatcher.stop()
+        stats['alert_delivery'] = dispatcher.stats()
+        if streamer is not None:
+            streamer.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        if not args.headless:
+            cv2.destroyAllWindows()
+        report = build_run_report(stats, time.monotonic() - start_time)
+        print_run_summary(report)
         print("[INFO] Exiting...")
+    return report
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
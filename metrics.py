@@ -0,0 +1,263 @@
+import bisect
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psutil
+
+# Seconds; covers a cvtColor (~1 ms) up to a throttled YOLO run (seconds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+THERMAL_ZONE = "/sys/class/thermal/thermal_zone0/temp"
+
+# vcgencmd get_throttled bits (current state)
+THROTTLE_FLAGS = {
+    0x1: 'under_voltage',
+    0x2: 'freq_capped',
+    0x4: 'throttled',
+    0x8: 'soft_temp_limit',
+}
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect plus two additions and takes
+    no lock: each stage is observed from a single thread, and a scrape that
+    races an observe() is off by one sample at worst.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-quantile (Prometheus-style estimate)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return float('inf')
+
+
+class RateMeter:
+    """Events per second over a sliding window, for the FPS gauges."""
+    def __init__(self, window=5.0, capacity=4096):
+        self.window = window
+        self._events = deque(maxlen=capacity)
+
+    def mark(self, now=None):
+        self._events.append(time.monotonic() if now is None else now)
+
+    def rate(self, now=None):
+        cutoff = (time.monotonic() if now is None else now) - self.window
+        recent = 0
+        for t in reversed(list(self._events)):
+            if t < cutoff:
+                break
+            recent += 1
+        return recent / self.window
+
+
+def read_soc_temperature():
+    try:
+        with open(THERMAL_ZONE) as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def read_throttle_state():
+    """Raw get_throttled bitmask, or None when vcgencmd is not available (non-Pi hosts)."""
+    try:
+        out = subprocess.check_output(["vcgencmd", "get_throttled"], stderr=subprocess.DEVNULL, timeout=1.0)
+        return int(out.decode().strip().split("=")[1], 16)
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return None
+
+
+class Metrics:
+    """Registry of per-stage latency histograms, counters, FPS meters and system gauges."""
+    def __init__(self, prefix="drone"):
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.rates = {}
+        self.gauges = {}
+        self._process = psutil.Process()
+        self._process.cpu_percent(None)
+        self._system_cache = (0.0, {})
+
+    # --- hot path ---
+    def observe(self, stage, seconds):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            hist = self.histograms.setdefault(stage, Histogram())
+        hist.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        meter = self.rates.get(name)
+        if meter is not None:
+            meter.mark()
+
+    def track_rate(self, name, window=5.0):
+        """Also expose <name>_fps, the per-second rate of the counter over `window` seconds."""
+        self.rates.setdefault(name, RateMeter(window))
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.rates.clear()
+        self.gauges.clear()
+
+    # --- scrape side ---
+    def system(self, max_age=2.0):
+        # vcgencmd forks a process, so system stats are cached between scrapes
+        stamp, cached = self._system_cache
+        if time.monotonic() - stamp < max_age:
+            return cached
+        mem = self._process.memory_info()
+        stats = {
+            'process_cpu_percent': self._process.cpu_percent(None),
+            'process_rss_bytes': mem.rss,
+            'system_cpu_percent': psutil.cpu_percent(None),
+        }
+        temp = read_soc_temperature()
+        if temp is not None:
+            stats['soc_temperature_celsius'] = temp
+        throttle = read_throttle_state()
+        if throttle is not None:
+            stats['throttle_bits'] = throttle
+            for bit, name in THROTTLE_FLAGS.items():
+                stats[name] = 1 if throttle & bit else 0
+        self._system_cache = (time.monotonic(), stats)
+        return stats
+
+    def snapshot(self):
+        stages = {}
+        for name, h in list(self.histograms.items()):
+            stages[name] = {
+                'count': h.count,
+                'mean_ms': h.sum / h.count * 1000.0 if h.count else 0.0,
+                'p50_ms': h.quantile(0.5) * 1000.0,
+                'p95_ms': h.quantile(0.95) * 1000.0,
+                'p99_ms': h.quantile(0.99) * 1000.0,
+            }
+        return {
+            'timestamp': time.time(),
+            'stages': stages,
+            'counters': dict(self.counters),
+            'fps': {name: meter.rate() for name, meter in list(self.rates.items())},
+            'gauges': dict(self.gauges),
+            'system': self.system(),
+        }
+
+    def prometheus(self):
+        p = self.prefix
+        lines = [f"# TYPE {p}_stage_seconds histogram"]
+        for name, h in list(self.histograms.items()):
+            running = 0
+            for bound, n in zip(h.buckets, h.counts):
+                running += n
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {running}')
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {h.count}')
+        for name, value in list(self.counters.items()):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+        for name, meter in list(self.rates.items()):
+            lines.append(f"# TYPE {p}_{name}_fps gauge")
+            lines.append(f"{p}_{name}_fps {meter.rate():.3f}")
+        for name, value in list(self.gauges.items()) + list(self.system().items()):
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the pipeline modules
+METRICS = Metrics()
+
+
+# --- EXPORTERS ---
+class _Handler(BaseHTTPRequestHandler):
+    metrics = METRICS
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(self.metrics.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = self.metrics.prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # keep scrapes out of the console
+
+
+def serve_metrics(port, host="127.0.0.1", metrics=METRICS):
+    """Prometheus text on /metrics, JSON on /metrics.json, in a daemon thread. Returns the server."""
+    handler = type("MetricsHandler", (_Handler,), {'metrics': metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Metrics on http://{host}:{port}/metrics")
+    return server
+
+
+class JsonDumper:
+    """Writes metrics.snapshot() to `path` every `interval` seconds (atomic replace)."""
+    def __init__(self, path, interval=30.0, metrics=METRICS):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.metrics.snapshot(), f)
+        os.replace(tmp, self.path)
+
+    def stop(self):
+        self._stop.set()
+        self.dump()
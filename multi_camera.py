@@ -0,0 +1,352 @@
+"""
+Several cameras in one process: one shared YOLO model, one batched call per
+round across the streams that have a new frame.
+
+    python3 multi_camera.py --sources 0 1 2
+    python3 multi_camera.py --sources synthetic:2 synthetic:3 clips/sky.mp4 --duration 60 --baseline
+
+Each source keeps its own frame ring, motion gate, tracker, alerts, metrics
+(<name>_inferences, <name>_capture_to_result) and optional MJPEG stream
+(--stream-port P serves camera i on P + i). The scheduler is round-robin: a
+round takes the newest unseen frame of up to --max-batch streams, starting
+after the last stream served, so a busy camera cannot starve the others.
+
+--baseline also runs every source as its own single-camera process
+(benchmark.py, concurrently) for the same duration and prints both, to check
+that one batched process beats N independent ones.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import main_pi
+from camera_stream import CameraStream
+from detector_backend import BACKENDS, load_detector
+from evaluation import latency_summary
+from event_store import EventStore, wall_time
+from inference_gate import InferenceGate
+from metrics import METRICS, serve_metrics
+from overlay import Compositor
+from pipeline import HISTORY
+from alert_dispatch import print_stats as print_alert_stats
+from postprocess import AEROPLANE, SCREEN_CLASSES, TARGET_CLASSES, boxes_from_results, process_detections
+from stream_server import MjpegStreamer
+from tracker import Tracker
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stream:
+    """Per-camera state: frame ring, motion gate, tracker, alerts and counters."""
+    def __init__(self, name, spec, cam, gate=None, dispatcher=None):
+        self.name = name
+        self.spec = spec
+        self.cam = cam
+        self.gate = gate
+        self.tracker = Tracker()
+        self.alerts = main_pi.AlertSystem(dispatcher=dispatcher)
+        self.lock = threading.Lock()
+        self.screens = process_detections(boxes_from_results([]))[1]
+        self.last_seq = 0
+        self.compositor = None
+        self.streamer = None
+        self.stats = {'inferences': 0, 'skipped_static': 0, 'alerts': 0,
+                      'latencies': deque(maxlen=HISTORY), 'alert_latencies': deque(maxlen=HISTORY)}
+        METRICS.track_rate(f"{name}_inferences")
+
+    def publish(self, data, frame_ts, events=None):
+        targets, screens, on_screen = process_detections(data, target_classes=TARGET_CLASSES,
+                                                         screen_classes=SCREEN_CLASSES)
+        with self.lock:
+            self.screens = screens
+            live = self.tracker.update(targets, on_screen, frame_ts)
+        if self.gate is not None:
+            self.gate.mark_result(len(targets))
+        if events is not None:
+            ts = wall_time(frame_ts)
+            for track in live:
+                if track.last_seen == frame_ts:
+                    events.record('detection', track.cls, track.conf, track.box, track.id, track.on_screen, ts,
+                                  source=self.name)
+        latency = time.monotonic() - frame_ts
+        METRICS.inc(f"{self.name}_inferences")
+        METRICS.observe(f"{self.name}_capture_to_result", latency)
+        self.stats['inferences'] += 1
+        self.stats['latencies'].append(latency)
+
+
+class RoundRobinScheduler:
+    """
+    gather() returns [(stream, pinned FrameRef)] for up to max_batch streams
+    with an unseen frame that passes their motion gate, starting after the
+    stream served last. The caller must release the refs.
+    """
+    def __init__(self, streams, max_batch):
+        self.streams = streams
+        self.max_batch = max_batch
+        self._cursor = 0
+
+    def gather(self):
+        picked = []
+        last = None
+        n = len(self.streams)
+        for k in range(n):
+            i = (self._cursor + k) % n
+            stream = self.streams[i]
+            ref = stream.cam.wait_frame(stream.last_seq, timeout=0)
+            if ref is None:
+                continue
+            stream.last_seq = ref.seq
+            if stream.gate is not None:
+                with METRICS.time('gate'):
+                    run = stream.gate.check(ref.seq, ref.frame)[0]
+                if not run:
+                    stream.cam.release(ref)
+                    stream.stats['skipped_static'] += 1
+                    continue
+            picked.append((stream, ref))
+            last = i
+            if len(picked) == self.max_batch:
+                break
+        if last is not None:
+            self._cursor = (last + 1) % n
+        return picked
+
+
+def detect_batch(model, frames, imgsz, conf):
+    """One model call over all frames; (N, 6) detections per frame, in order."""
+    results = model(frames, imgsz=imgsz, conf=conf, verbose=False, iou=0.45)
+    return [boxes_from_results([r]) for r in results]
+
+
+def run_baseline(args):
+    """Every source as an independent benchmark.py process, all at once; returns the summed numbers."""
+    out_dir = tempfile.mkdtemp(prefix="multicam-baseline-")
+    procs, outs = [], []
+    for i, spec in enumerate(args.sources):
+        out = os.path.join(out_dir, f"{i}.json")
+        cmd = [sys.executable, os.path.join(HERE, "benchmark.py"), "--clips", spec, "--out", out,
+               "--duration", str(args.duration), "--imgsz", str(args.imgsz), "--conf", str(args.conf),
+               "--backend", args.backend, "--no-render"]
+        if args.fast:
+            cmd.append("--fast")
+        if args.no_motion_gate:
+            cmd.append("--no-motion-gate")
+        procs.append(subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.DEVNULL))
+        outs.append(out)
+    print(f"[INFO] Baseline: {len(procs)} independent processes for {args.duration:.0f}s...")
+    for p in procs:
+        p.wait()
+    runs = []
+    for out in outs:
+        with open(out) as f:
+            runs.append(json.load(f)['runs'][0])
+    return {
+        'processes': len(runs),
+        'inference_fps': sum(r['inference_fps'] for r in runs),
+        'capture_to_result_p95_ms': max(r['capture_to_result']['p95_ms'] for r in runs),
+        'rss_mb_max': sum(r['resources']['rss_mb_max'] for r in runs),
+        'cpu_percent_mean': sum(r['resources']['cpu_percent_mean'] for r in runs),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", nargs="+", required=True,
+                        help="Camera indexes, video files or 'synthetic[:N]', one per stream")
+    parser.add_argument("--imgsz", type=int, default=main_pi.INFERENCE_SIZE)
+    parser.add_argument("--conf", type=float, default=main_pi.CONF_THRESHOLD)
+    parser.add_argument("--backend", default=main_pi.BACKEND, choices=sorted(BACKENDS))
+    parser.add_argument("--max-batch", type=int, default=0,
+                        help="Frames per model call (default: all streams; 1 for exported static-batch models)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop after N seconds (0 = until Ctrl+C)")
+    parser.add_argument("--fast", action="store_true", help="Replay files / synthetic frames as fast as possible")
+    parser.add_argument("--loop", action="store_true", help="Loop video file sources")
+    parser.add_argument("--no-motion-gate", action="store_true")
+    parser.add_argument("--events", default=main_pi.EVENTS_PATH)
+    parser.add_argument("--no-events", action="store_true")
+    parser.add_argument("--webhook", default=main_pi.ALERT_WEBHOOK, help="POST alerts as JSON to this URL")
+    parser.add_argument("--siren-pin", type=int, default=main_pi.SIREN_PIN, help="Switch a siren on this GPIO pin")
+    parser.add_argument("--stream-port", type=int, default=0,
+                        help="Serve camera i as MJPEG on port STREAM_PORT + i (0 = off)")
+    parser.add_argument("--metrics-port", type=int, default=main_pi.METRICS_PORT)
+    parser.add_argument("--json", help="Write the run report to this JSON file")
+    parser.add_argument("--baseline", action="store_true",
+                        help="Afterwards run the sources as independent processes and compare (needs --duration)")
+    return parser.parse_args(argv)
+
+
+def main(args):
+    METRICS.reset()
+    METRICS.track_rate('inferences')
+    metrics_server = None
+    if args.metrics_port:
+        try:
+            metrics_server = serve_metrics(args.metrics_port)
+        except OSError as e:
+            print(f"[WARN] Metrics endpoint disabled: {e}")
+
+    # One dispatcher (bell / webhook / siren workers) for all cameras
+    dispatcher = main_pi.make_dispatcher(args.webhook, args.siren_pin)
+    streams = []
+    for i, spec in enumerate(args.sources):
+        cam = CameraStream(spec, realtime=not args.fast, loop=args.loop).start()
+        gate = None
+        if main_pi.MOTION_GATE and not args.no_motion_gate:
+            gate = InferenceGate(motion_threshold=main_pi.MOTION_THRESHOLD, refresh_interval=main_pi.GATE_REFRESH_S)
+        stream = Stream(f"cam{i}", spec, cam, gate, dispatcher)
+        if args.stream_port:
+            stream.streamer = MjpegStreamer(args.stream_port + i, max_fps=main_pi.STREAM_FPS,
+                                            width=main_pi.STREAM_WIDTH).start()
+            stream.compositor = Compositor(sinks=[stream.streamer.publish]).start()
+        streams.append(stream)
+        print(f"[INIT] {stream.name}: {spec}")
+
+    max_batch = args.max_batch or (len(streams) if args.backend == 'torch' else 1)
+    print(f"[INIT] Loading one shared YOLO model ({main_pi.MODEL_NAME}, {args.backend}), batch <= {max_batch}...")
+    model = load_detector(main_pi.MODEL_NAME, args.backend, args.imgsz)
+    events = None if args.no_events else EventStore(args.events, snapshot_dir=main_pi.SNAPSHOT_DIR).start()
+    scheduler = RoundRobinScheduler(streams, max_batch)
+    batches = batched_frames = 0
+    batch_seconds = deque(maxlen=HISTORY)
+    running = True
+
+    def inference_loop():
+        nonlocal batches, batched_frames
+        while running:
+            picked = scheduler.gather()
+            if not picked:
+                time.sleep(0.002)
+                continue
+            stamps = [ref.timestamp for _, ref in picked]
+            start = time.perf_counter()
+            try:
+                detections = detect_batch(model, [ref.frame for _, ref in picked], args.imgsz, args.conf)
+            finally:
+                for stream, ref in picked:
+                    stream.cam.release(ref)
+            elapsed = time.perf_counter() - start
+            METRICS.observe('inference', elapsed)
+            METRICS.inc('inferences', len(picked))
+            batches += 1
+            batched_frames += len(picked)
+            batch_seconds.append(elapsed)
+            for (stream, _), frame_ts, data in zip(picked, stamps, detections):
+                stream.publish(data, frame_ts, events)
+
+    inf_thread = threading.Thread(target=inference_loop, daemon=True)
+    inf_thread.start()
+    print(f"[INFO] {len(streams)} streams ready. Press Ctrl+C to exit.")
+
+    # Alerts (and optional MJPEG overlays) per stream, at ~20 Hz
+    start_time = time.monotonic()
+    try:
+        while True:
+            if all(s.cam.stopped for s in streams):
+                print("[INFO] All frame sources finished.")
+                break
+            if args.duration and time.monotonic() - start_time >= args.duration:
+                break
+            now = time.monotonic()
+            for stream in streams:
+                with stream.lock:
+                    tracks = stream.tracker.predict(now)
+                    screens = stream.screens
+                render = stream.streamer is not None and stream.streamer.wanted()
+                scene = {'screens': screens.tolist() if render else [], 'boxes': [], 'banner': None}
+                for track, box in tracks:
+                    if track.on_screen:
+                        scene['boxes'].append((box, f"Safe {track.conf:.2f}", (255, 0, 0)))
+                        continue
+                    if track.cls == AEROPLANE:
+                        if track.id not in stream.alerts.alerted_tracks:
+                            stream.stats['alerts'] += 1
+                            stream.stats['alert_latencies'].append(now - track.first_seen)
+                            print(f"[ALERT] {stream.name}: drone #{track.id} ({track.conf:.2f})")
+                            if events is not None:
+                                events.record('alert', track.cls, track.conf, box, track.id, ts=wall_time(now),
+                                              frame=stream.cam.read(), source=stream.name)
+                        stream.alerts.trigger(scene, f"WARNING: DRONE ({stream.name})", track_id=track.id,
+                                              conf=round(track.conf, 3), box=box, source=stream.name)
+                        scene['boxes'].append((box, f"DRONE #{track.id} {track.conf:.2f}", (0, 0, 255)))
+                    else:
+                        scene['boxes'].append((box, f"BIRD #{track.id} {track.conf:.2f}", (0, 255, 0)))
+                if render:
+                    frame = stream.cam.read()
+                    if frame is not None:
+                        stream.compositor.submit(stream.cam.frame_count, frame, scene)
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        running = False
+        inf_thread.join(timeout=2.0)
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        for stream in streams:
+            stream.cam.stop()
+            if stream.compositor is not None:
+                stream.compositor.stop()
+                stream.streamer.stop()
+        dispatcher.stop()
+        if events is not None:
+            events.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+
+    report = {
+        'elapsed_s': elapsed,
+        'streams': len(streams),
+        'max_batch': max_batch,
+        'batches': batches,
+        'mean_batch': batched_frames / batches if batches else 0.0,
+        'batch_latency': latency_summary(batch_seconds),
+        'inference_fps': batched_frames / elapsed,
+        'rss_mb': METRICS.system(max_age=0)['process_rss_bytes'] / 1e6,
+        'per_stream': {s.name: {
+            'source': s.spec,
+            'frames_captured': s.cam.frame_count,
+            'inferences': s.stats['inferences'],
+            'inference_fps': s.stats['inferences'] / elapsed,
+            'skipped_static': s.stats['skipped_static'],
+            'alerts': s.stats['alerts'],
+            'capture_to_result': latency_summary(s.stats['latencies']),
+            'capture_to_alert': latency_summary(s.stats['alert_latencies']),
+        } for s in streams},
+        'alert_delivery': dispatcher.stats(),
+    }
+    print("------------------------------------------------")
+    print(f"[STATS] {report['streams']} streams, {report['batches']} batches (mean size {report['mean_batch']:.2f}), "
+          f"{report['inference_fps']:.2f} frames/s inferred, RSS {report['rss_mb']:.0f} MB")
+    for name, r in report['per_stream'].items():
+        lat = r['capture_to_result']
+        print(f"[STATS] {name}: {r['inferences']} inferences ({r['inference_fps']:.2f}/s), "
+              f"capture->result p50={lat['p50_ms']:.0f}ms p95={lat['p95_ms']:.0f}ms, alerts={r['alerts']}")
+    print_alert_stats(report['alert_delivery'])
+
+    if args.baseline and args.duration:
+        report['baseline'] = run_baseline(args)
+        b = report['baseline']
+        print(f"[STATS] {b['processes']} independent processes: {b['inference_fps']:.2f} frames/s inferred, "
+              f"RSS {b['rss_mb_max']:.0f} MB, worst p95 {b['capture_to_result_p95_ms']:.0f}ms")
+        print(f"[STATS] Shared batched model: {report['inference_fps'] / max(b['inference_fps'], 1e-6):.2f}x "
+              f"throughput, {report['rss_mb'] / max(b['rss_mb_max'], 1e-6):.2f}x memory")
+    elif args.baseline:
+        print("[WARN] --baseline needs --duration")
+    print("------------------------------------------------")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.json}")
+    return report
+
+
+if __name__ == "__main__":
+    main(parse_args())
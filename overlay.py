@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import cv2
+import numpy as np
+
+from evaluation import latency_summary
+from metrics import METRICS
+
+HISTORY = 10000  # draw timings kept for the run summary
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# image: BGR pixels, alpha: uint8 coverage, ascent: baseline offset from the top, opaque: alpha is all 255
+Sprite = namedtuple('Sprite', ['image', 'alpha', 'ascent', 'opaque'])
+
+
+def _render_label(text, color, scale, thickness, background, pad):
+    (w, h), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+    if background is not None:
+        # Same box as the old draw_text_rect: text height plus pad on each side, fully opaque
+        image = np.empty((h + 2 * pad, w + 2 * pad, 3), dtype=np.uint8)
+        image[:] = background
+        cv2.putText(image, text, (pad, pad + h), FONT, scale, color, thickness, cv2.LINE_AA)
+        alpha = np.full(image.shape[:2], 255, dtype=np.uint8)
+        return Sprite(image, alpha, pad + h, True)
+    # Text only: solid colour, the glyph coverage is the alpha mask
+    shape = (h + baseline + 2 * pad, w + 2 * pad)
+    image = np.empty(shape + (3,), dtype=np.uint8)
+    image[:] = color
+    alpha = np.zeros(shape, dtype=np.uint8)
+    cv2.putText(alpha, text, (pad, pad + h), FONT, scale, 255, thickness, cv2.LINE_AA)
+    return Sprite(image, alpha, pad + h, False)
+
+
+def _render_banner(width, height, text, color, text_color, text_x, scale, thickness):
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = color
+    cv2.putText(image, text, (text_x, int(height * 0.7)), FONT, scale, text_color, thickness, cv2.LINE_AA)
+    return Sprite(image, np.full((height, width), 255, dtype=np.uint8), 0, True)
+
+
+class SpriteCache:
+    """
+    Pre-rendered text sprites keyed by text, colours and font settings.
+
+    getTextSize/putText run once per distinct label; after that a label is a
+    blit. Labels that carry a confidence change often, so this is an LRU.
+    """
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, render, *args):
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = self._sprites[key] = render(*args)
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def label(self, text, color, scale=0.5, thickness=1, background=None, pad=0):
+        key = ('label', text, color, scale, thickness, background, pad)
+        return self._get(key, _render_label, text, color, scale, thickness, background, pad)
+
+    def banner(self, width, text, height=50, color=(0, 0, 255), text_color=(255, 255, 255), text_x=50,
+               scale=1, thickness=2):
+        key = ('banner', width, height, text, color, text_color, text_x, scale, thickness)
+        return self._get(key, _render_banner, width, height, text, color, text_color, text_x, scale, thickness)
+
+    def __len__(self):
+        return len(self._sprites)
+
+
+def blit(frame, sprite, x, y):
+    """Composites `sprite` onto `frame` with its top-left corner at (x, y), clipped to the frame."""
+    h, w = sprite.alpha.shape
+    fx1, fy1 = max(x, 0), max(y, 0)
+    fx2, fy2 = min(x + w, frame.shape[1]), min(y + h, frame.shape[0])
+    if fx1 >= fx2 or fy1 >= fy2:
+        return
+    sx, sy = fx1 - x, fy1 - y
+    src = sprite.image[sy:sy + fy2 - fy1, sx:sx + fx2 - fx1]
+    roi = frame[fy1:fy2, fx1:fx2]
+    if sprite.opaque:
+        roi[:] = src
+        return
+    a = sprite.alpha[sy:sy + fy2 - fy1, sx:sx + fx2 - fx1, None].astype(np.uint16)
+    roi[:] = (src * a + roi * (255 - a) + 127) // 255
+
+
+def blit_text(frame, sprite, x, y):
+    """Like cv2.putText: (x, y) is the left end of the text baseline."""
+    blit(frame, sprite, x, y - sprite.ascent)
+
+
+def draw_scene(frame, scene, sprites):
+    """
+    Draws one display scene in place:
+      scene['screens']: [(x1, y1, x2, y2)] drawn blue with a SCREEN label
+      scene['boxes']:   [((x1, y1, x2, y2), label, color)]
+      scene['banner']:  alert text for the full-width red banner, or None
+      scene['fps']:     display FPS shown in the corner
+    """
+    for x1, y1, x2, y2 in scene.get('screens', ()):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+        blit_text(frame, sprites.label("SCREEN", (255, 0, 0)), x1, y1 - 10)
+    if scene.get('banner'):
+        blit(frame, sprites.banner(frame.shape[1], scene['banner']), 0, 0)
+    for (x1, y1, x2, y2), label, color in scene.get('boxes', ()):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        blit_text(frame, sprites.label(label, color), x1, y1 - 10)
+    if 'fps' in scene:
+        blit_text(frame, sprites.label(f"FPS: {scene['fps']}", (0, 255, 0), scale=1, thickness=2), 10, 30)
+    return frame
+
+
+class Compositor:
+    """
+    Draws overlays on its own thread, so annotation never holds up the
+    display loop, capture or the inference result handoff.
+
+    submit() never blocks: a frame that is still waiting to be drawn is
+    replaced by the newer one (counted as dropped). Finished frames are passed
+    to each of `sinks` (e.g. the MJPEG streamer) on this thread and can be
+    fetched with latest() (e.g. for cv2.imshow on the main thread).
+    """
+    def __init__(self, sprites=None, sinks=()):
+        self.sprites = sprites or SpriteCache()
+        self.sinks = list(sinks)
+        self.composited = 0
+        self.dropped = 0
+        self.durations = deque(maxlen=HISTORY)
+        self._pending = None
+        self._latest = (0, None)
+        self._running = False
+        self._cond = threading.Condition()
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def submit(self, seq, frame, scene):
+        """Queue a frame the caller no longer touches, plus its scene, for drawing."""
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (seq, frame, scene)
+            self._cond.notify_all()
+
+    def latest(self, after_seq=0):
+        """(seq, frame) of the newest composited frame, or (after_seq, None) if nothing newer."""
+        seq, frame = self._latest
+        return (seq, frame) if seq > after_seq else (after_seq, None)
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait(0.5)
+                job, self._pending = self._pending, None
+            if job is None:
+                continue
+            seq, frame, scene = job
+            start = time.perf_counter()
+            draw_scene(frame, scene, self.sprites)
+            elapsed = time.perf_counter() - start
+            METRICS.observe('overlay', elapsed)
+            self.durations.append(elapsed)
+            self.composited += 1
+            self._latest = (seq, frame)
+            for sink in self.sinks:
+                sink(frame)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def stats(self):
+        stats = {'composited': self.composited, 'dropped': self.dropped, 'cache_hits': self.sprites.hits,
+                 'cache_misses': self.sprites.misses, 'cached_sprites': len(self.sprites)}
+        stats.update(latency_summary(self.durations))
+        return stats
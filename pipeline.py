@@ -0,0 +1,266 @@
+"""
+Small staged pipeline runtime: a source thread feeds packets through stages
+that each run on their own thread, connected by bounded queues.
+
+    pipe = Pipeline(source=ring_source(cam))
+    pipe.add(Stage('infer', run_model, maxsize=1, policy=DROP_OLDEST, max_age=1.0))
+    pipe.add(Stage('postprocess', parse, maxsize=4, policy=BLOCK))
+    pipe.start()
+    packet = pipe.get(timeout=0.5)   # output of the last stage (optional, see `output`)
+
+Every packet carries the capture timestamp of its frame and a stamp per
+stage, so end-to-end staleness is measured for each frame and a stage with
+`max_age` drops packets that are already too old before doing any work.
+Per queue, `policy` says what happens when it is full:
+  drop-oldest  the queued packet is dropped for the new one (always the newest frame)
+  drop-newest  the new packet is dropped (keep what is queued)
+  block        the producer waits for room (nothing is dropped)
+A dropped packet is released (e.g. its camera ring slot unpinned) and counted.
+"""
+import threading
+import time
+from collections import deque
+
+from evaluation import latency_summary
+from metrics import METRICS
+
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+HISTORY = 10000  # timings kept per stage for the run summary
+
+
+class Packet:
+    """One frame's trip through the pipeline. `release` frees what it holds (called at most once)."""
+    __slots__ = ("seq", "capture_ts", "data", "result", "stamps", "_release")
+
+    def __init__(self, seq, capture_ts, data=None, release=None):
+        self.seq = seq
+        self.capture_ts = capture_ts  # time.monotonic() of the capture
+        self.data = data
+        self.result = None
+        self.stamps = []  # [(stage, monotonic time it finished)]
+        self._release = release
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.capture_ts
+
+    def stamp(self, stage):
+        self.stamps.append((stage, time.monotonic()))
+
+    def release(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class BoundedQueue:
+    """Queue of at most `maxsize` packets with a drop / block policy (see module docstring)."""
+    def __init__(self, maxsize=1, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', choose from {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, packet, timeout=None):
+        """False if `packet` (or, drop-oldest, an older one) was dropped to make room."""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    packet.release()
+                    return False
+                if self.policy == DROP_OLDEST:
+                    self.dropped += 1
+                    self._items.popleft()[0].release()
+                else:
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self.dropped += 1
+                            packet.release()
+                            return False
+                        self._cond.wait(remaining)
+            if self._closed:
+                packet.release()
+                return False
+            self._items.append((packet, time.monotonic()))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """(packet, seconds it waited in the queue), or (None, 0) on timeout / close."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None, 0.0
+            packet, queued = self._items.popleft()
+            self._cond.notify_all()
+            return packet, time.monotonic() - queued
+
+    def __len__(self):
+        return len(self._items)
+
+    def close(self):
+        """Wakes everyone up and releases whatever is still queued."""
+        with self._cond:
+            self._closed = True
+            while self._items:
+                self._items.popleft()[0].release()
+            self._cond.notify_all()
+
+
+class Stage:
+    """
+    `fn(packet)` on its own thread for every packet from its input queue.
+    fn returns the packet to pass on (usually the same one, with .result set)
+    or None when the packet ends here (filtered out); it may release the
+    packet early once it no longer needs the frame.
+    """
+    def __init__(self, name, fn, maxsize=1, policy=DROP_OLDEST, max_age=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = BoundedQueue(maxsize, policy)
+        self.max_age = max_age
+        self.next = None
+        self.processed = 0
+        self.filtered = 0
+        self.stale = 0
+        self.errors = 0
+        self.waits = deque(maxlen=HISTORY)
+        self.durations = deque(maxlen=HISTORY)
+
+    def _run(self, pipeline):
+        while pipeline.running:
+            packet, waited = self.inbox.get(timeout=0.5)
+            if packet is None:
+                continue
+            self.waits.append(waited)
+            if self.max_age is not None and packet.age() > self.max_age:
+                self.stale += 1
+                METRICS.inc(f"{self.name}_stale")
+                packet.release()
+                continue
+            start = time.perf_counter()
+            try:
+                out = self.fn(packet)
+            except Exception as e:
+                self.errors += 1
+                print(f"[WARN] Pipeline stage {self.name} failed on frame {packet.seq}: {e}")
+                packet.release()
+                continue
+            self.durations.append(time.perf_counter() - start)
+            self.processed += 1
+            if out is None:
+                self.filtered += 1
+                packet.release()
+                continue
+            out.stamp(self.name)
+            if self.next is not None:
+                self.next.put(out)
+            else:
+                pipeline._finish(out)
+
+    def stats(self):
+        return {'processed': self.processed, 'filtered': self.filtered, 'dropped': self.inbox.dropped,
+                'stale': self.stale, 'errors': self.errors, 'policy': self.inbox.policy,
+                'queue_wait': latency_summary(self.waits), 'run': latency_summary(self.durations)}
+
+
+class Pipeline:
+    """
+    source(timeout) -> Packet or None is polled on its own thread; its packets
+    go to the first stage. Packets leaving the last stage are released, or,
+    with `output` (a BoundedQueue), handed to whoever calls get().
+    """
+    def __init__(self, source, name='pipeline', output=None):
+        self.source = source
+        self.name = name
+        self.output = output
+        self.stages = []
+        self.running = False
+        self._threads = []
+        self.produced = 0
+        self.completed = 0
+        self.end_to_end = deque(maxlen=HISTORY)
+
+    def add(self, stage):
+        if self.stages:
+            self.stages[-1].next = stage.inbox
+        self.stages.append(stage)
+        return self
+
+    def start(self):
+        self.running = True
+        self._threads = [threading.Thread(target=self._feed, daemon=True)]
+        self._threads += [threading.Thread(target=s._run, args=(self,), daemon=True) for s in self.stages]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _feed(self):
+        while self.running:
+            packet = self.source(0.5)
+            if packet is None:
+                continue
+            packet.stamp('capture')
+            self.produced += 1
+            self.stages[0].inbox.put(packet)
+
+    def _finish(self, packet):
+        age = packet.age()
+        self.completed += 1
+        self.end_to_end.append(age)
+        METRICS.observe(f"{self.name}_e2e", age)
+        if self.output is not None:
+            self.output.put(packet)
+        else:
+            packet.release()
+
+    def get(self, timeout=None):
+        """Next packet out of the last stage (needs `output`); the caller releases it."""
+        return self.output.get(timeout)[0]
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        for stage in self.stages:
+            stage.inbox.close()
+        if self.output is not None:
+            self.output.close()
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self):
+        return {'produced': self.produced, 'completed': self.completed,
+                'end_to_end': latency_summary(self.end_to_end),
+                'stages': {s.name: s.stats() for s in self.stages}}
+
+
+def ring_source(cam):
+    """Source over a CameraStream: every new frame, as a packet pinning its ring slot until released."""
+    last_seq = [0]
+
+    def source(timeout):
+        ref = cam.wait_frame(last_seq[0], timeout=timeout)
+        if ref is None:
+            return None
+        last_seq[0] = ref.seq
+        return Packet(ref.seq, ref.timestamp, ref, release=lambda: cam.release(ref))
+    return source
+
+
+def print_pipeline_stats(stats):
+    e2e = stats['end_to_end']
+    print(f"[STATS] Pipeline: {stats['produced']} frames in, {stats['completed']} out, "
+          f"capture->out p50={e2e['p50_ms']:.1f}ms p95={e2e['p95_ms']:.1f}ms")
+    for name, s in stats['stages'].items():
+        print(f"[STATS]   {name:<12} {s['processed']} run ({s['run']['mean_ms']:.1f}ms), {s['filtered']} skipped, "
+              f"{s['dropped']} dropped ({s['policy']}), {s['stale']} stale, "
+              f"queue wait p95={s['queue_wait']['p95_ms']:.1f}ms")
@@ -0,0 +1,85 @@
+import numpy as np
+
+# COCO class IDs, see https://docs.ultralytics.com/datasets/detect/coco/
+AEROPLANE = 4   # treated as "drone"
+BIRD = 14
+SCREEN_CLASSES = (62, 63, 67)  # TV, Laptop, Cell phone
+TARGET_CLASSES = (AEROPLANE, BIRD)
+
+# Column layout of a detection row, same as ultralytics `boxes.data`
+X1, Y1, X2, Y2, CONF, CLS = range(6)
+
+
+def boxes_to_array(boxes):
+    """
+    One (N, 6) float32 array [x1, y1, x2, y2, conf, cls] from an ultralytics
+    Boxes object (or anything with the same layout) in a single device->host copy.
+    """
+    data = getattr(boxes, 'data', boxes)
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    return np.asarray(data, dtype=np.float32).reshape(-1, 6)
+
+
+def split_detections(data, target_classes=TARGET_CLASSES, screen_classes=SCREEN_CLASSES):
+    """Returns (targets (N, 6), screens (M, 4)) selected with class-ID masks."""
+    cls = data[:, CLS].astype(np.int32)
+    targets = data[np.isin(cls, target_classes)]
+    screens = data[np.isin(cls, screen_classes), :4]
+    return targets, screens
+
+
+def overlap_matrix(targets, screens):
+    """
+    (N, M) matrix of intersection area / target area between every target box
+    and every screen box. Only the first four columns of each input are used.
+    """
+    t = np.asarray(targets, dtype=np.float32)[:, None, :4]
+    s = np.asarray(screens, dtype=np.float32)[None, :, :4]
+    iw = np.minimum(t[..., 2], s[..., 2]) - np.maximum(t[..., 0], s[..., 0])
+    ih = np.minimum(t[..., 3], s[..., 3]) - np.maximum(t[..., 1], s[..., 1])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    area = (t[..., 2] - t[..., 0]) * (t[..., 3] - t[..., 1])
+    return np.divide(inter, area, out=np.zeros_like(inter), where=area > 0)
+
+
+def on_screen_mask(targets, screens, min_ratio=None):
+    """
+    (N,) bool: target overlaps at least one screen.
+
+    min_ratio=None means any contact counts (main_pi behaviour);
+    min_ratio=0.5 means more than half the target lies on the screen (main.py behaviour).
+    """
+    n = len(targets)
+    if n == 0 or len(screens) == 0:
+        return np.zeros(n, dtype=bool)
+    if min_ratio is not None:
+        return (overlap_matrix(targets, screens) > min_ratio).any(axis=1)
+
+    t = np.asarray(targets, dtype=np.float32)[:, None, :4]
+    s = np.asarray(screens, dtype=np.float32)[None, :, :4]
+    touch_x = np.minimum(t[..., 2], s[..., 2]) >= np.maximum(t[..., 0], s[..., 0])
+    touch_y = np.minimum(t[..., 3], s[..., 3]) >= np.maximum(t[..., 1], s[..., 1])
+    return (touch_x & touch_y).any(axis=1)
+
+
+def process_detections(data, min_ratio=None, target_classes=TARGET_CLASSES, screen_classes=SCREEN_CLASSES):
+    """
+    Post-processing of an (N, 6) detection array.
+
+    Returns (targets (N, 6) float32, screens (M, 4) int32, on_screen (N,) bool).
+    """
+    targets, screens = split_detections(data, target_classes, screen_classes)
+    on_screen = on_screen_mask(targets, screens, min_ratio)
+    return targets, screens.astype(np.int32), on_screen
+
+
+def boxes_from_results(results):
+    """All boxes of one model call (a list of ultralytics Results) as one (N, 6) array."""
+    arrays = [boxes_to_array(r.boxes) for r in results]
+    return np.concatenate(arrays) if arrays else np.zeros((0, 6), dtype=np.float32)
+
+
+def process_results(results, min_ratio=None, target_classes=TARGET_CLASSES, screen_classes=SCREEN_CLASSES):
+    """Whole post-processing step for one model call, see process_detections()."""
+    return process_detections(boxes_from_results(results), min_ratio, target_classes, screen_classes)
@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+from metrics import METRICS
+from postprocess import boxes_from_results
+
+
+def _into(view, result):
+    # cv2 writes into dst= only when it is contiguous with the right shape; otherwise copy once
+    if result is not view:
+        view[...] = result
+
+
+class Letterbox:
+    """
+    Letterboxes frames into one preallocated imgsz x imgsz canvas and the
+    (1, 3, imgsz, imgsz) float32 RGB tensor the detector takes.
+
+    The scale and offsets are computed once per source shape and the padding
+    is written once, so each call is a single resize (or colour conversion)
+    into the canvas plus a normalise of the image area only. Accepts BGR
+    frames or planar YUV420 ('lores') frames from picamera2.
+    """
+    def __init__(self, imgsz=320, pad_value=114):
+        self.imgsz = imgsz
+        self.pad_value = pad_value
+        self.canvas = np.full((imgsz, imgsz, 3), pad_value, dtype=np.uint8)
+        self.tensor = np.full((1, 3, imgsz, imgsz), pad_value / 255.0, dtype=np.float32)
+        self.source_shape = None
+        self.scale = 1.0
+        self.size = (imgsz, imgsz)  # (w, h) of the image area
+        self.top = self.left = 0
+        self._bgr = None
+
+    def _fit(self, h, w):
+        if self.source_shape == (h, w):
+            return
+        scale = min(self.imgsz / h, self.imgsz / w)
+        nh, nw = int(round(h * scale)), int(round(w * scale))
+        self.scale, self.size = scale, (nw, nh)
+        self.top, self.left = (self.imgsz - nh) // 2, (self.imgsz - nw) // 2
+        self.canvas[:] = self.pad_value
+        self.tensor[:] = self.pad_value / 255.0
+        self.source_shape = (h, w)
+
+    def __call__(self, frame, yuv420=False):
+        """Returns self.tensor holding `frame` (BGR, or YUV420 of shape (h * 3 / 2, w)); reused on the next call."""
+        h, w = (frame.shape[0] * 2 // 3, frame.shape[1]) if yuv420 else frame.shape[:2]
+        self._fit(h, w)
+        nw, nh = self.size
+        view = self.canvas[self.top:self.top + nh, self.left:self.left + nw]
+        if yuv420:
+            if (nw, nh) == (w, h):
+                _into(view, cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420, dst=view))
+            else:
+                self._bgr = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420, dst=self._bgr)
+                _into(view, cv2.resize(self._bgr, (nw, nh), dst=view, interpolation=cv2.INTER_LINEAR))
+        elif (nw, nh) == (w, h):
+            view[:] = frame
+        else:
+            _into(view, cv2.resize(frame, (nw, nh), dst=view, interpolation=cv2.INTER_LINEAR))
+        # HWC BGR uint8 -> CHW RGB float in [0, 1]; the padding around it never changes
+        region = self.tensor[0, :, self.top:self.top + nh, self.left:self.left + nw]
+        np.multiply(view[:, :, ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=region, casting='unsafe')
+        return self.tensor
+
+    def to_frame(self, data, frame_shape):
+        """Maps (N, 6) detections from canvas pixels to a frame of `frame_shape` with the same field of view."""
+        if not len(data):
+            return data
+        h, w = self.source_shape
+        fh, fw = frame_shape[:2]
+        out = data.copy()
+        out[:, [0, 2]] = np.clip((out[:, [0, 2]] - self.left) / self.scale * (fw / w), 0, fw)
+        out[:, [1, 3]] = np.clip((out[:, [1, 3]] - self.top) / self.scale * (fh / h), 0, fh)
+        return out
+
+
+def _model_input(letterbox):
+    try:
+        import torch
+    except ImportError:
+        # Already imgsz x imgsz, so ultralytics' own letterbox is a no-op resize
+        return letterbox.canvas
+    # Shares memory with letterbox.tensor; ultralytics skips its preprocessing for tensors
+    return torch.from_numpy(letterbox.tensor)
+
+
+class LetterboxDetector:
+    """
+    Runs an ultralytics model on a preprocessed tensor instead of the frame.
+
+    With a lores frame (FrameRef.lores) at least imgsz wide the model input
+    is built from that, so the full-resolution frame is never resized for
+    inference; otherwise (no lores, or one that would have to be upscaled)
+    the frame is letterboxed once into a reused buffer. Either way results
+    come back as (N, 6) detections in full-frame coordinates.
+    """
+    def __init__(self, conf=0.5, iou=0.45, pad_value=114):
+        self.conf = conf
+        self.iou = iou
+        self.pad_value = pad_value
+        self._letterboxes = {}
+
+    def detect(self, model, frame, imgsz, lores=None):
+        letterbox = self._letterboxes.get(imgsz)
+        if letterbox is None:
+            letterbox = self._letterboxes[imgsz] = Letterbox(imgsz, self.pad_value)
+        with METRICS.time('preprocess'):
+            if lores is not None and lores.shape[1] >= imgsz:
+                letterbox(lores, yuv420=True)
+            else:
+                letterbox(frame)
+            source = _model_input(letterbox)
+        results = model(source, imgsz=imgsz, conf=self.conf, iou=self.iou, verbose=False)
+        return letterbox.to_frame(boxes_from_results(results), frame.shape)
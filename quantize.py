@@ -0,0 +1,139 @@
+"""
+INT8 static quantization of MODEL_NAME, calibrated on our own sky footage.
+
+    python3 quantize.py --clips clips/dawn.mp4 clips/overcast.mp4 --eval-clip clips/drone_pass.mp4
+
+1. Exports (or reuses) the FP32 ONNX model from model_cache/.
+2. Samples --calib-frames frames evenly across the clips, letterboxed exactly
+   like the detector input, and runs ONNX Runtime static (QDQ) quantization.
+   The detection head is left in FP32 by default; quantizing the box/score
+   outputs costs the most accuracy for the least speed.
+3. Stores the result as the 'onnx-int8' backend (main_pi.py --backend onnx-int8).
+4. With --eval-clip, reports latency and bird / aeroplane recall of FP32 ONNX
+   and INT8 against the PyTorch reference, so the trade-off is known before
+   the INT8 model is enabled in the field.
+"""
+import argparse
+import json
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from compare_backends import compare, print_report
+from detector_backend import CACHE_DIR, cache_dir_for, cached_artifact
+from frame_source import VideoFileSource
+from preprocess import Letterbox
+
+MODEL_NAME = 'yolov8n.pt'
+HEAD_PREFIX = '/model.22/'  # YOLOv8 Detect head node names in the exported graph
+
+
+def letterbox(frame, imgsz, pad_value=114):
+    """BGR frame -> (1, 3, imgsz, imgsz) float32 RGB tensor in [0, 1], aspect kept, padded centred."""
+    # Same preprocessing as the live detector (preprocess.LetterboxDetector); copied since the buffer is reused
+    return Letterbox(imgsz, pad_value)(frame).copy()
+
+
+def sample_frames(clips, count):
+    """`count` frames spread evenly over all clips (by frame index)."""
+    per_clip = max(1, count // len(clips))
+    frames = []
+    for path in clips:
+        source = VideoFileSource(path, realtime=False)
+        total = int(source.stream.get(cv2.CAP_PROP_FRAME_COUNT)) or per_clip
+        wanted = set(np.linspace(0, total - 1, per_clip).astype(int).tolist())
+        index = 0
+        while len(wanted):
+            grabbed, frame, _ = source.read()
+            if not grabbed:
+                break
+            if index in wanted:
+                frames.append(frame)
+                wanted.discard(index)
+            index += 1
+        source.release()
+    print(f"[INFO] {len(frames)} calibration frames from {len(clips)} clip(s)")
+    return frames
+
+
+class FrameCalibrationReader:
+    """onnxruntime CalibrationDataReader over letterboxed footage frames."""
+    def __init__(self, frames, input_name, imgsz):
+        self._batches = iter([{input_name: letterbox(f, imgsz)} for f in frames])
+
+    def get_next(self):
+        return next(self._batches, None)
+
+
+def quantize(clips, model_name=MODEL_NAME, imgsz=320, calib_frames=300, per_channel=True,
+             keep_head_fp32=True, cache_dir=CACHE_DIR):
+    """Builds the INT8 model and returns its path."""
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    fp32_path = cached_artifact(model_name, 'onnx', imgsz, cache_dir)
+    graph = onnx.load(fp32_path).graph
+    input_name = graph.input[0].name
+    exclude = [n.name for n in graph.node if n.name.startswith(HEAD_PREFIX)] if keep_head_fp32 else []
+
+    frames = sample_frames(clips, calib_frames)
+    if not frames:
+        raise ValueError("No calibration frames could be read from the clips")
+
+    out_dir = cache_dir_for(model_name, 'onnx-int8', imgsz, cache_dir)
+    staging = out_dir + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    out_path = os.path.join(staging, os.path.basename(fp32_path).replace(".onnx", "_int8.onnx"))
+
+    print(f"[INFO] Quantizing {fp32_path} ({len(exclude)} head nodes kept in FP32)...")
+    quantize_static(fp32_path, out_path, FrameCalibrationReader(frames, input_name, imgsz),
+                    quant_format=QuantFormat.QDQ, per_channel=per_channel,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=exclude)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(staging, out_dir)
+    final = os.path.join(out_dir, os.path.basename(out_path))
+    print(f"[INFO] INT8 model: {final}")
+    return final
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", nargs="+", required=True, help="Recorded sky footage used for calibration")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--calib-frames", type=int, default=300)
+    parser.add_argument("--per-tensor", action="store_true", help="Per-tensor instead of per-channel weights")
+    parser.add_argument("--quantize-head", action="store_true", help="Also quantize the detection head")
+    parser.add_argument("--eval-clip", help="Clip for the accuracy-vs-latency report (not one of the calibration clips)")
+    parser.add_argument("--eval-frames", type=int, default=300)
+    parser.add_argument("--json", help="Write the evaluation report to this JSON file")
+    args = parser.parse_args()
+
+    int8_path = quantize(args.clips, args.model, args.imgsz, args.calib_frames,
+                         per_channel=not args.per_tensor, keep_head_fp32=not args.quantize_head)
+    if not args.eval_clip:
+        return
+
+    report = compare(args.eval_clip, ['onnx'], args.model, args.imgsz, max_frames=args.eval_frames,
+                     artifacts={'onnx-int8': ('onnx-int8', int8_path)})
+    print_report(report)
+    fp32, int8 = report['onnx'], report['onnx-int8']
+    speedup = fp32['latency']['p50_ms'] / max(int8['latency']['p50_ms'], 1e-6)
+    print(f"[INFO] INT8 vs FP32 ONNX: {speedup:.2f}x faster (p50)")
+    for label in ('aeroplane', 'bird'):
+        before = fp32['agreement_by_class'][label]['recall']
+        after = int8['agreement_by_class'][label]['recall']
+        n = int8['agreement_by_class'][label]['reference_boxes']
+        print(f"[INFO] {label:<9} recall vs PyTorch: FP32 {before:.3f} -> INT8 {after:.3f} ({n} reference boxes)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,4 +8,4 @@ source venv/bin/activate
 
 # Run the main script
 # Run the main script using the venv python explicitly
-./venv/bin/python3 main_pi.py
+./venv/bin/python3 main_pi.py "$@"
@@ -0,0 +1,58 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+
+def process_start():
+    """time.monotonic() value of when this process was created (before the interpreter and imports)."""
+    age = time.time() - psutil.Process().create_time()
+    return time.monotonic() - max(0.0, age)
+
+
+class StartupProfiler:
+    """
+    Phases from process start to the first detection result.
+
+    Phases can overlap: the model loads in a thread while the camera starts,
+    so each phase is reported with its start offset and duration, and the
+    marks (first_frame, model_ready, first_result, ...) give the critical path.
+    """
+    def __init__(self, t0=None):
+        self.t0 = process_start() if t0 is None else t0
+        self.phases = []
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.t0
+
+    @contextmanager
+    def phase(self, name):
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start, self.elapsed() - start))
+
+    def mark(self, name):
+        """Records the first time `name` happens; returns True that first time."""
+        with self._lock:
+            if name in self.marks:
+                return False
+            self.marks[name] = self.elapsed()
+            return True
+
+    def report(self):
+        with self._lock:
+            phases = [{'name': n, 'start_s': s, 'duration_s': d} for n, s, d in sorted(self.phases, key=lambda p: p[1])]
+            return {'phases': phases, 'marks': dict(self.marks)}
+
+    def print_report(self):
+        r = self.report()
+        for p in r['phases']:
+            print(f"[BOOT] {p['name']:<16} +{p['start_s']:6.2f}s  {p['duration_s']:6.2f}s")
+        for name, t in sorted(r['marks'].items(), key=lambda m: m[1]):
+            print(f"[BOOT] {name:<16} at {t:6.2f}s")
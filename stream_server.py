@@ -0,0 +1,139 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from metrics import METRICS
+
+BOUNDARY = b"frame"
+PAGE = b"""<html><head><title>RPi Drone Guard</title></head>
+<body style="margin:0;background:#000"><img src="/stream.mjpg" style="width:100%"></body></html>"""
+
+
+class MjpegStreamer:
+    """
+    Serves the annotated video as MJPEG over HTTP (/stream.mjpg, / for a page).
+
+    publish(frame) only hands the frame to an encoder thread, and only when a
+    client is connected and the next stream frame is due (max_fps). The encoder
+    downscales to `width`, JPEG-encodes once, and every client sends the same
+    bytes. With nobody watching nothing is encoded, and wanted() lets the
+    caller skip drawing altogether.
+    """
+    def __init__(self, port=8080, host="127.0.0.1", max_fps=5.0, width=480, quality=70):
+        self.port = port
+        self.host = host
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.width = width
+        self.quality = quality
+
+        self.clients = 0
+        self.encoded = 0
+        self._pending = None
+        self._jpeg = None
+        self._seq = 0
+        self._last_publish = 0.0
+        self._running = False
+        self._cond = threading.Condition()
+        self._server = None
+
+    def start(self):
+        streamer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/stream.mjpg"):
+                    streamer._serve_client(self)
+                elif self.path == "/":
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(PAGE)))
+                    self.end_headers()
+                    self.wfile.write(PAGE)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._running = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+        print(f"[INFO] Video stream on http://{self.host}:{self.port}/")
+        return self
+
+    def wanted(self, now=None):
+        """True when a client is connected and a new stream frame is due."""
+        if not self.clients:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - self._last_publish >= self.interval
+
+    def publish(self, frame):
+        """Offer an annotated frame. The caller must not modify it afterwards."""
+        now = time.monotonic()
+        if not self.wanted(now):
+            return False
+        self._last_publish = now
+        with self._cond:
+            self._pending = frame  # a newer frame replaces one the encoder has not picked up yet
+            self._cond.notify_all()
+        return True
+
+    def _encode_loop(self):
+        while self._running:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait(0.5)
+                frame, self._pending = self._pending, None
+            if frame is None:
+                continue
+            with METRICS.time('stream_encode'):
+                h, w = frame.shape[:2]
+                if w > self.width:
+                    frame = cv2.resize(frame, (self.width, int(h * self.width / w)), interpolation=cv2.INTER_AREA)
+                ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            self.encoded += 1
+            with self._cond:
+                self._jpeg = buf.tobytes()
+                self._seq += 1
+                self._cond.notify_all()
+
+    def _serve_client(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=" + BOUNDARY.decode())
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+        with self._cond:
+            self.clients += 1
+            seen = self._seq
+        METRICS.set_gauge('stream_clients', self.clients)
+        try:
+            while self._running:
+                with self._cond:
+                    while self._seq == seen and self._running:
+                        self._cond.wait(1.0)
+                    jpeg, seen = self._jpeg, self._seq
+                if jpeg is None:
+                    continue
+                handler.wfile.write(b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                                    + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._cond:
+                self.clients -= 1
+            METRICS.set_gauge('stream_clients', self.clients)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,177 @@
+import time
+
+import numpy as np
+
+from postprocess import CLS, CONF, boxes_from_results, boxes_to_array
+
+
+def make_tiles(width, height, tile_size=320, overlap=0.2):
+    """Overlapping square tiles [(x0, y0, x1, y1)] covering the whole frame."""
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        step = max(1, int(tile_size * (1 - overlap)))
+        out = list(range(0, length - tile_size + 1, step))
+        if out[-1] != length - tile_size:
+            out.append(length - tile_size)
+        return out
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def roi_crops(boxes, width, height, crop_size=192, max_crops=4):
+    """Square crops centred on each box (grown to fit it), clipped to the frame."""
+    crops = []
+    for x1, y1, x2, y2 in list(boxes)[:max_crops]:
+        side = int(max(crop_size, 2 * (x2 - x1), 2 * (y2 - y1)))
+        side = min(side, width, height)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        x0 = int(min(max(cx - side / 2, 0), width - side))
+        y0 = int(min(max(cy - side / 2, 0), height - side))
+        crops.append((x0, y0, x0 + side, y0 + side))
+    return crops
+
+
+def nms(data, threshold=0.45, metric='iou'):
+    """
+    Class-aware greedy NMS over (N, 6) detection rows.
+
+    metric='ios' compares intersection over the *smaller* box, which also
+    removes the partial box a tile border leaves next to the full one.
+    """
+    if len(data) < 2:
+        return data
+    order = np.argsort(-data[:, CONF])
+    data = data[order]
+    x1, y1, x2, y2 = data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+    area = (x2 - x1) * (y2 - y1)
+    keep = np.ones(len(data), dtype=bool)
+    for i in range(len(data)):
+        if not keep[i]:
+            continue
+        rest = np.nonzero(keep[i + 1:])[0] + i + 1
+        rest = rest[data[rest, CLS] == data[i, CLS]]
+        if not len(rest):
+            continue
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        if metric == 'ios':
+            denom = np.minimum(area[i], area[rest])
+        else:
+            denom = area[i] + area[rest] - inter
+        ratio = np.divide(inter, denom, out=np.zeros_like(inter), where=denom > 0)
+        keep[rest[ratio > threshold]] = False
+    return data[keep]
+
+
+class TileScheduler:
+    """
+    Picks 'full', 'tiles' or 'roi' for the next frame against a latency budget.
+
+    Keeps an exponential moving average of measured latency per mode. With live
+    targets it crops around them ('roi') when that fits the budget, re-checking
+    the whole frame every full_every runs so new targets are still found.
+    Otherwise it searches with 'tiles' if affordable and falls back to 'full'.
+    Every reprobe_every decisions an over-budget mode is tried again, since
+    latency on the Pi changes with temperature and load.
+    """
+    def __init__(self, budget_ms=400.0, full_every=5, smoothing=0.3, reprobe_every=100):
+        self.budget = budget_ms / 1000.0
+        self.full_every = full_every
+        self.smoothing = smoothing
+        self.reprobe_every = reprobe_every
+        self.latency = {'full': None, 'tiles': None, 'roi': None}
+        self.counts = {'full': 0, 'tiles': 0, 'roi': 0}
+        self._since_search = 0
+        self._decisions = 0
+
+    def _affordable(self, mode):
+        est = self.latency[mode]
+        return est is None or est <= self.budget  # unknown: try once to measure it
+
+    def choose(self, has_targets):
+        self._decisions += 1
+        if self._decisions % self.reprobe_every == 0:
+            self.latency['tiles'] = self.latency['roi'] = None
+        if has_targets and self._since_search < self.full_every and self._affordable('roi'):
+            return 'roi'
+        return 'tiles' if self._affordable('tiles') else 'full'
+
+    def record(self, mode, seconds):
+        prev = self.latency[mode]
+        self.latency[mode] = seconds if prev is None else prev + self.smoothing * (seconds - prev)
+        self.counts[mode] += 1
+        self._since_search = self._since_search + 1 if mode == 'roi' else 0
+
+
+class TiledDetector:
+    """
+    Runs the model on the full frame, on overlapping tiles, or on crops around
+    active targets, and returns (N, 6) detections in full-frame coordinates.
+
+    Tiles / crops go through the model as one batch and are merged with NMS.
+    Small targets keep their native pixel size in a tile instead of shrinking
+    with the whole frame to imgsz. With an `exclusion` map (ExclusionMap),
+    tiles and crops lying entirely inside a learned screen zone are skipped.
+    """
+    def __init__(self, model, imgsz=320, conf=0.5, iou=0.45, tile_size=320, overlap=0.2,
+                 roi_size=192, budget_ms=400.0, max_batch=None, exclusion=None):
+        self.model = model
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.roi_size = roi_size
+        self.max_batch = max_batch  # exported models with a static batch dimension need 1
+        self.scheduler = TileScheduler(budget_ms)
+        self.exclusion = exclusion
+        self.skipped = 0
+        self._tiles = None
+        self._tiles_shape = None
+
+    def _run_batch(self, frame, regions):
+        crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in regions]
+        step = self.max_batch or len(crops)
+        results = []
+        for i in range(0, len(crops), step):
+            results.extend(self.model(crops[i:i + step], imgsz=self.imgsz, conf=self.conf,
+                                      verbose=False, iou=self.iou))
+        merged = []
+        for (x0, y0, _, _), r in zip(regions, results):
+            data = boxes_to_array(r.boxes)
+            if len(data):
+                data[:, [0, 2]] += x0
+                data[:, [1, 3]] += y0
+                merged.append(data)
+        if not merged:
+            return np.zeros((0, 6), dtype=np.float32)
+        return nms(np.concatenate(merged), threshold=0.6, metric='ios')
+
+    def detect(self, frame, active_boxes=()):
+        """Returns (detections (N, 6), mode)."""
+        h, w = frame.shape[:2]
+        mode = self.scheduler.choose(len(active_boxes) > 0)
+        start = time.monotonic()
+
+        if mode == 'full':
+            results = self.model(frame, imgsz=self.imgsz, conf=self.conf, verbose=False, iou=self.iou)
+            data = boxes_from_results(results)
+        else:
+            if mode == 'tiles':
+                if self._tiles_shape != (h, w):
+                    self._tiles = make_tiles(w, h, self.tile_size, self.overlap)
+                    self._tiles_shape = (h, w)
+                regions = self._tiles
+            else:
+                regions = roi_crops(active_boxes, w, h, self.roi_size)
+            if self.exclusion is not None:
+                kept = [r for r in regions if not self.exclusion.covers(r)]
+                self.skipped += len(regions) - len(kept)
+                regions = kept
+            data = self._run_batch(frame, regions) if regions else np.zeros((0, 6), dtype=np.float32)
+
+        self.scheduler.record(mode, time.monotonic() - start)
+        return data, mode
@@ -0,0 +1,97 @@
+import numpy as np
+
+from postprocess import CLS, CONF
+
+
+def iou_matrix(a, b):
+    """(N, M) intersection-over-union between xyxy boxes a (N, >=4) and b (M, >=4)."""
+    a = np.asarray(a, dtype=np.float32)[:, None, :4]
+    b = np.asarray(b, dtype=np.float32)[None, :, :4]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+class Track:
+    __slots__ = ("id", "box", "velocity", "cls", "conf", "on_screen", "first_seen", "last_seen", "hits", "verdict")
+
+    def __init__(self, track_id, row, on_screen, timestamp):
+        self.id = track_id
+        self.box = row[:4].astype(np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # px / second for x1, y1, x2, y2
+        self.cls = int(row[CLS])
+        self.conf = float(row[CONF])
+        self.on_screen = bool(on_screen)
+        self.first_seen = timestamp  # capture time of the frame that started the track
+        self.last_seen = timestamp
+        self.hits = 1
+        self.verdict = None  # (kind, confidence) from the crop classifier, see crop_classifier.py
+
+    def predict(self, timestamp, max_extrapolation):
+        dt = min(max(timestamp - self.last_seen, 0.0), max_extrapolation)
+        return self.box + self.velocity * dt
+
+
+class Tracker:
+    """
+    Keeps persistent IDs for targets between (slow) inference runs.
+
+    update() is fed every inference result with the capture timestamp of the
+    frame it ran on; detections are matched to tracks greedily by IoU against
+    the tracks' predicted positions. predict() returns constant-velocity
+    extrapolated boxes for any later timestamp, so the display can move boxes
+    at camera rate while YOLO runs at 2-5 FPS.
+    """
+    def __init__(self, iou_threshold=0.2, max_age=1.0, velocity_smoothing=0.5, max_extrapolation=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age                    # seconds a track survives without a detection
+        self.velocity_smoothing = velocity_smoothing
+        self.max_extrapolation = max_extrapolation
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections, on_screen, timestamp):
+        """detections: (N, 6) rows from postprocess; on_screen: (N,) bool. Returns the live tracks."""
+        matched_dets = set()
+        if len(self.tracks) and len(detections):
+            predicted = np.array([t.predict(timestamp, self.max_extrapolation) for t in self.tracks])
+            iou = iou_matrix(predicted, detections)
+            while iou.size:
+                ti, di = np.unravel_index(np.argmax(iou), iou.shape)
+                if iou[ti, di] < self.iou_threshold:
+                    break
+                self._correct(self.tracks[ti], detections[di], on_screen[di], timestamp)
+                matched_dets.add(int(di))
+                iou[ti, :] = -1
+                iou[:, di] = -1
+
+        for di in range(len(detections)):
+            if di not in matched_dets:
+                self.tracks.append(Track(self._next_id, detections[di], on_screen[di], timestamp))
+                self._next_id += 1
+
+        self.tracks = [t for t in self.tracks if timestamp - t.last_seen <= self.max_age]
+        return self.tracks
+
+    def _correct(self, track, row, on_screen, timestamp):
+        box = row[:4].astype(np.float32)
+        dt = timestamp - track.last_seen
+        if dt > 0:
+            measured = (box - track.box) / dt
+            a = self.velocity_smoothing
+            track.velocity = a * measured + (1 - a) * track.velocity
+        track.box = box
+        track.cls = int(row[CLS])
+        track.conf = float(row[CONF])
+        track.on_screen = bool(on_screen)
+        track.last_seen = timestamp
+        track.hits += 1
+
+    def predict(self, timestamp):
+        """[(track, int box [x1, y1, x2, y2])] for every live track at `timestamp`."""
+        return [(t, t.predict(timestamp, self.max_extrapolation).astype(int).tolist())
+                for t in self.tracks if timestamp - t.last_seen <= self.max_age]